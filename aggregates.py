@@ -0,0 +1,127 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+GRAINS = ('day', 'month')
+STATS = ('sum', 'count', 'max')
+
+
+def period_keys(times, grain):
+    if grain == 'day':
+        return times.dt.normalize()
+    if grain == 'month':
+        return times.dt.to_period('M').dt.start_time
+    raise ValueError(f"Unknown grain: {grain}")
+
+
+def _reduce(df, keys, columns):
+    # Readings may be float32; accumulate in float64 so long sums stay exact
+    grouped = df[columns].astype('float64').groupby(keys.rename('period'), sort=True)
+    return pd.concat({'sum': grouped.sum(), 'count': grouped.count(), 'max': grouped.max()}, axis=1)
+
+
+class AggregateCube:
+    """Per-city daily and monthly sum/count/max of every pollutant.
+
+    Means are derived as sum / count, so new rows can be folded in without
+    touching the hourly history.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._cells = {grain: {} for grain in GRAINS}
+
+    def add(self, city, df):
+        columns = [col for col in self.columns if col in df.columns]
+        if df.empty or not columns:
+            return
+        for grain in GRAINS:
+            partial = _reduce(df, period_keys(df['time'], grain), columns)
+            partial = partial.reindex(columns=pd.MultiIndex.from_product([STATS, self.columns]))
+            partial['count'] = partial['count'].fillna(0)
+            current = self._cells[grain].get(city)
+            self._cells[grain][city] = partial if current is None else self._merge(current, partial)
+
+    @staticmethod
+    def _merge(current, partial):
+        # Only the periods touched by the new rows are recombined
+        overlap = partial.index.intersection(current.index)
+        if len(overlap):
+            current = current.copy()
+            old, new = current.loc[overlap], partial.loc[overlap]
+            current.loc[overlap, 'sum'] = (old['sum'].fillna(0) + new['sum'].fillna(0)).values
+            current.loc[overlap, 'count'] = (old['count'] + new['count']).values
+            current.loc[overlap, 'max'] = np.fmax(old['max'].values, new['max'].values)
+        fresh = partial.index.difference(current.index)
+        if len(fresh):
+            current = pd.concat([current, partial.loc[fresh]]).sort_index()
+        return current
+
+    def discard(self, city):
+        for cells in self._cells.values():
+            cells.pop(city, None)
+
+    def snapshot(self):
+        # Cells are replaced on every merge, never updated in place, so copying the dicts is enough
+        frozen = copy.copy(self)
+        frozen._cells = {grain: dict(cells) for grain, cells in self._cells.items()}
+        return frozen
+
+    def cities(self):
+        return list(self._cells['day'])
+
+    def _frame(self, city, grain):
+        return self._cells[grain].get(city)
+
+    def stat(self, city, grain, stat, columns=None):
+        cells = self._frame(city, grain)
+        if cells is None:
+            return pd.DataFrame(columns=columns or self.columns)
+        if stat == 'mean':
+            # count == 0 means every reading in the period was missing
+            result = cells['sum'] / cells['count'].where(cells['count'] > 0)
+        else:
+            result = cells[stat]
+        return result if columns is None else result[columns]
+
+    def daily(self, city, stat='mean', columns=None):
+        return self.stat(city, 'day', stat, columns)
+
+    def monthly(self, city, stat='mean', columns=None):
+        return self.stat(city, 'month', stat, columns)
+
+    def city_means(self, columns=None):
+        # Mean of every reading per city, rebuilt from the monthly sums and counts
+        columns = columns or self.columns
+        rows = {}
+        for city, cells in self._cells['month'].items():
+            total = cells['sum'][columns].sum()
+            count = cells['count'][columns].sum()
+            rows[city] = total / count.where(count > 0)
+        return pd.DataFrame.from_dict(rows, orient='index', columns=columns).rename_axis('City')
+
+
+DAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def weekly_matrix(dates, values):
+    """Lay daily values out as a weekday x week-starting-Monday grid.
+
+    Returns (z, mondays, cell_dates) where z[weekday, week] is the value for
+    that day (NaN where there is none) and cell_dates holds each cell's date.
+    """
+    dates = pd.DatetimeIndex(dates).normalize()
+    values = np.asarray(values, dtype=float)
+    keep = ~np.isnan(values)
+    dates, values = dates[keep], values[keep]
+    weekday = dates.weekday.to_numpy()
+    week_start = dates - pd.to_timedelta(weekday, unit='D')
+    mondays = week_start.unique().sort_values()
+    week = mondays.get_indexer(week_start)
+
+    z = np.full((7, len(mondays)), np.nan)
+    z[weekday, week] = values
+    cell_dates = mondays.to_numpy()[None, :] + np.arange(7)[:, None].astype('timedelta64[D]')
+    return z, mondays, cell_dates
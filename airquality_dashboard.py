@@ -1,56 +1,78 @@
+import functools
+import os
+import signal
+
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash import ClientsideFunction, ctx, dcc, html
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-
-# Load city datasets
-city_data = {
-    "Colombo": pd.read_csv("/Users//Hehe/Data Science/HND/Dashboard Building/DashApp/data/Colombo.csv"),
-    "Kandy": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Kandy.csv"),
-    "Jaffna": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Jaffna.csv"),
-    "Trincomalee": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Trincomalee.csv"),
-    "Gampaha": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Gampaha.csv"),
-    "Galle": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Galle.csv"),
-    "Kalutara": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Kalutara.csv"),
-    "Kurunegala": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Kurunegala.csv"),
-    "Matara": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Matara.csv"),
-    "NuwaraEliya": pd.read_csv("/Users//Desktop/Hehe/Data Science/HND/Dashboard Building/DashApp/data/Nuwaraeliya.csv"),
-}
-
-months = ['September', 'October', 'November', 'December']
-
-# Process UV index data
-processed_city_data = {}
-for city, df in city_data.items():
-    df['time'] = pd.to_datetime(df['time'])
-    df['date'] = df['time'].dt.date
-    df['daily_mean_uv'] = df.groupby('date')['uv_index ()'].transform('mean')
-    df['city'] = city
-    processed_city_data[city] = df[['date', 'city', 'pm10 (μg/m³)', 'pm2_5 (μg/m³)', 'daily_mean_uv','time', 'carbon_monoxide (μg/m³)', 'carbon_dioxide (ppm)', 'nitrogen_dioxide (μg/m³)', 'sulphur_dioxide (μg/m³)', 'dust (μg/m³)', 'uv_index ()']].drop_duplicates().reset_index(drop=True)
-    combined_uv_index = pd.concat(processed_city_data.values(), ignore_index=True)
-
+from flask import jsonify
+from plotly.colors import hex_to_rgb
+
+from aggregates import DAYS_ORDER
+from alerts import ALERT_RULES
+from aqi import AQI_CATEGORIES, CATEGORY_COLORS, CATEGORY_NAMES, category_of, compute_aqi
+from data_store import (DATA_DIR, POLLUTANTS, RELOAD_INTERVAL_S, DataStore, StationFrames, date_range_bounds,
+                        month_bounds, month_label)
+from downsample import downsample_series, is_autorange, zoom_range
+from figure_cache import FIGURE_CACHE_MB, WARM_FIGURE_CACHE, FigureCache
+from instrumentation import instrument, phase, record_cache_access
+from outliers import OUTLIER_METHODS, method_labels, methods_mask
+from pyramid import LEVEL_TITLES
+from rolling import ROLLING_WINDOWS, rolling_column
+from scatter_density import correlation_scatter
+from serialization import compact_response, enable_compression, payload_stats
+from shared_data import attach_frames, published_sources, shared_data_name
+from storage import STORAGE_BACKEND, open_storage
+from streaming import STREAM_INTERVAL_S, StreamingIngestor
 
 #------------------------
 # Load Data
-cities = ['Colombo', 'Kandy', 'Anuradhapura', 'Galle', 'Jaffna', 'Nuwaraeliya', 
-          'Kurunegala', 'Gampaha', 'Trincomalee', 'Matara', 'Kalutara']
-dataframes = {}
-for city in cities:
-    # Read each CSV file
-    try:
-        dat = pd.read_csv(f"data/{city}.csv")
-        dat['City'] = city  # Add city name to a new column
-        dataframes[city] = dat
-    except Exception as e:
-        print(f"Error loading data for {city}: {e}")
+# Every station is read once; callbacks only take read-only views from the store.
+# Stations are parsed in parallel, and with AQ_LAZY_LOAD=1 in the background
+# while the app already serves (see /ready).
+# Under gunicorn (see gunicorn.conf.py) the master loads the data into shared
+# memory and each worker attaches to it instead of keeping its own copy; with
+# a database backend (AQ_STORAGE) they open the master's database read-only.
+SHARED_DATA_NAME = shared_data_name()
+if SHARED_DATA_NAME:
+    store = DataStore.from_frames(attach_frames(SHARED_DATA_NAME), read_only=True,
+                                  sources=published_sources(SHARED_DATA_NAME))
+elif STORAGE_BACKEND != 'pandas' and os.environ.get('AQ_STORAGE_READ_ONLY') == '1':
+    store = DataStore.from_storage(open_storage(POLLUTANTS, DATA_DIR, read_only=True))
+else:
+    store = DataStore()
+
+# Under gunicorn the master owns the data and reloads it (see gunicorn.conf.py).
+# Its workers count dataset versions from scratch, so the release it started
+# them on is part of the version clients see.
+MASTER_PID = int(os.environ.get('AQ_MASTER_PID', '0'))
+DATA_RELEASE = os.environ.get('AQ_DATA_RELEASE', '')
+
+
+def data_version():
+    return f"{DATA_RELEASE}:{store.snapshot().version}"
 
-# Combine all city data into a single DataFrame
-combined_data = pd.concat(dataframes.values(), ignore_index=True)
 
+def month_options():
+    # Year-aware months present in the data, e.g. 'September 2024' -> '2024-09'
+    return [{'label': month_label(start), 'value': start.strftime('%Y-%m')} for start in store.months()]
 
 
+# Only the first station is waited for here; with lazy loading the others
+# join the month pickers as they arrive
+first_months = store.months(store.cities[0]) if store.cities else []
+default_month = first_months[0].strftime('%Y-%m') if first_months else None
+months = month_options()
+
+# Month clicks on City Trends are rendered in the browser from a per-city
+# payload (assets/city_trends.js) instead of calling the server
+CLIENTSIDE_MONTHS = os.environ.get('AQ_CLIENTSIDE_MONTHS', '0') == '1'
+
 
 #--------------------------
 
@@ -58,12 +80,81 @@ combined_data = pd.concat(dataframes.values(), ignore_index=True)
 # Initialize Dash app
 app = dash.Dash(__name__)
 app.title = 'Air Quality Dashboard'
+server = app.server
+
+# Every callback registered below is timed; see /metrics
+instrument(app)
+enable_compression(app)
+
+# Rendered callback responses, tagged with the version of the station they
+# show (or of the whole dataset) in the snapshot the request reads, so a
+# streamed reading only invalidates its own station's figures; figures are
+# stored already converted to typed arrays
+figure_cache = FigureCache(int(FIGURE_CACHE_MB * 1024 * 1024),
+                           stamp_fn=lambda city=None: store.snapshot().stamp(city), on_lookup=record_cache_access, transform=compact_response)
+
+# Clients poll for new dataset versions while stations load, and for as long
+# as streaming or reloading can produce them
+POLL_INTERVAL_S = min([interval for interval in (STREAM_INTERVAL_S, RELOAD_INTERVAL_S) if interval] or [1])
+POLL_FOREVER = bool(STREAM_INTERVAL_S or RELOAD_INTERVAL_S)
+
+
+@app.server.before_request
+def pin_snapshot():
+    # Each request reads one dataset version from start to finish, even if a
+    # reload or streamed rows publish a newer one meanwhile
+    store.pin()
+
+
+@app.server.teardown_request
+def unpin_snapshot(exc):
+    store.unpin()
+
+
+@app.server.route('/cache-stats')
+def cache_stats():
+    return jsonify(figure_cache.stats())
+
+
+@app.server.route('/payload-stats')
+def payload_sizes():
+    return jsonify(payload_stats.report())
+
+
+@app.server.route('/ready')
+def ready():
+    # 503 until every station has loaded (or failed to)
+    status = store.load_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@app.server.route('/memory-report')
+def memory_report():
+    return jsonify(store.memory_report().to_dict(orient='records'))
+
+
+@app.server.route('/reload', methods=['POST'])
+def reload_data():
+    # Re-reads changed CSVs in the background; 202 once started, 409 if one is already running.
+    # A gunicorn worker asks the master, which reloads and restarts every worker on the result.
+    if store.read_only and MASTER_PID:
+        os.kill(MASTER_PID, signal.SIGHUP)
+        return jsonify({'started': True, 'master': MASTER_PID}), 202
+    if store.read_only:
+        return jsonify({'error': 'read-only store'}), 409
+    started = store.reload()
+    return jsonify({'started': started, 'version': data_version()}), 202 if started else 409
 
 # App Layout
 app.layout = html.Div([
-    dcc.Tabs([
+    # Bumped whenever streamed readings or lazily loaded stations change the
+    # dataset; every figure listens to it
+    dcc.Store(id='data-version', data=data_version()),
+    dcc.Interval(id='stream-interval', interval=POLL_INTERVAL_S * 1000,
+                 disabled=not POLL_FOREVER and store.ready),
+    dcc.Tabs(id='main-tabs', value='overview', children=[
         # Tab 1: Overview
-        dcc.Tab(label='Overview', children=[
+        dcc.Tab(label='Overview', value='overview', children=[
             html.Div([
                 html.H3("Air Quality Overview", style={'font-size': '25px', 'text-align': 'center', 'margin-bottom': '20px'}),
                 
@@ -73,7 +164,7 @@ app.layout = html.Div([
                         html.Label("Select a City:", style={'font-weight': 'bold', 'margin-bottom': '5px'}),
                         dcc.Dropdown(
                             id='overview-city-dropdown',
-                            options=[{'label': city, 'value': city} for city in city_data.keys()],
+                            options=[{'label': city, 'value': city} for city in store.cities],
                             value='Colombo'
                         )
                     ], style={'flex': '1', 'margin-right': '10px'}),  # Styling for the first dropdown
@@ -82,10 +173,19 @@ app.layout = html.Div([
                         html.Label("Select a Month:", style={'font-weight': 'bold', 'margin-bottom': '5px'}),
                         dcc.Dropdown(
                             id='month-dropdown',
-                            options=[{'label': month, 'value': idx+9} for idx, month in enumerate(months)],
-                            value=9
+                            options=months,
+                            value=default_month
+                        )
+                    ], style={'flex': '1', 'margin-right': '10px'}),  # Styling for the second dropdown
+
+                    html.Div([
+                        html.Label("Or a Date Range:", style={'font-weight': 'bold', 'margin-bottom': '5px'}),
+                        dcc.DatePickerRange(
+                            id='overview-date-range',
+                            clearable=True,
+                            display_format='YYYY-MM-DD'
                         )
-                    ], style={'flex': '1'})  # Styling for the second dropdown
+                    ], style={'flex': '1'})  # Custom range overrides the month
                 ], style={
                     'display': 'flex', 
                     'align-items': 'center', 
@@ -100,10 +200,10 @@ app.layout = html.Div([
         ]),
 
         # Tab 2: City Trends
-        dcc.Tab(label='City Trends', children=[
-            dcc.Tabs([
+        dcc.Tab(label='City Trends', value='city-trends', children=[
+            dcc.Tabs(id='city-trends-tabs', value='pm-trends', children=[
                 # Sub-Tab 1: Particulate Matter Trends
-                dcc.Tab(label='Particulate Matter Concentration', children=[
+                dcc.Tab(label='Particulate Matter Concentration', value='pm-trends', children=[
                     html.Div([
                         # Dropdown and Radio Items in the Same Line
                         html.Div([
@@ -111,7 +211,7 @@ app.layout = html.Div([
                                 html.Label("Select a City:", style={'font-weight': 'bold', 'margin-bottom': '5px'}),
                                 dcc.Dropdown(
                                     id='city-dropdown',
-                                    options=[{'label': city, 'value': city} for city in city_data.keys()],
+                                    options=[{'label': city, 'value': city} for city in store.cities],
                                     value='Colombo'
                                 )
                             ], style={'flex': '1', 'margin-right': '10px'}),  # City Dropdown
@@ -120,12 +220,21 @@ app.layout = html.Div([
                                 html.Label("Select a Month:", style={'font-weight': 'bold', 'margin-bottom': '5px'}),
                                 dcc.RadioItems(
                                     id='month-radio',
-                                    options=[{'label': month, 'value': month} for month in months],
-                                    value='September',
+                                    options=months,
+                                    value=default_month,
                                     inline=True,
                                     style={'padding': '10px'}
                                 )
-                            ], style={'flex': '1'})  # Month Radio Items
+                            ], style={'flex': '1', 'margin-right': '10px'}),  # Month Radio Items
+
+                            html.Div([
+                                html.Label("Or a Date Range:", style={'font-weight': 'bold', 'margin-bottom': '5px'}),
+                                dcc.DatePickerRange(
+                                    id='city-date-range',
+                                    clearable=True,
+                                    display_format='YYYY-MM-DD'
+                                )
+                            ], style={'flex': '1'})  # Custom range overrides the month
                         ], style={
                             'display': 'flex',
                             'align-items': 'center',
@@ -133,19 +242,20 @@ app.layout = html.Div([
                         }),
 
                         # Graph Container
-                        html.Div(id='city-graph-container')
+                        html.Div(id='city-graph-container', children=[dcc.Graph(id='city-graph')]),
+                        dcc.Store(id='city-payload')
                     ])
                 ]),
 
                 # Sub-Tab 2: Pollutant Analysis
-                dcc.Tab(label='Pollutant Analysis', children=[
+                dcc.Tab(label='Pollutant Analysis', value='pollutant-analysis', children=[
                     html.Div([
                         # Dropdown in Pollutant Analysis
                         html.Div([
                             html.Label("Select a City:", style={'font-weight': 'bold', 'margin-bottom': '5px'}),
                             dcc.Dropdown(
                                 id='pollutant-city-dropdown',
-                                options=[{'label': city, 'value': city} for city in city_data.keys()],
+                                options=[{'label': city, 'value': city} for city in store.cities],
                                 value='Colombo'
                             )
                         ], style={'margin-bottom': '20px'}),  # Add margin between dropdown and graphs
@@ -157,13 +267,30 @@ app.layout = html.Div([
                         # html.Label("UV Index Analysis:", style={'font-weight': 'bold', 'margin-top': '20px'}),
                         dcc.Graph(id='uv-heatmap')
                     ])
+                ]),
+
+                # Sub-Tab 3: Air Quality Index
+                dcc.Tab(label='Air Quality Index', value='aqi', children=[
+                    html.Div([
+                        html.Div([
+                            html.Label("Select a City:", style={'font-weight': 'bold', 'margin-bottom': '5px'}),
+                            dcc.Dropdown(
+                                id='aqi-city-dropdown',
+                                options=[{'label': city, 'value': city} for city in store.cities],
+                                value='Colombo'
+                            )
+                        ], style={'margin-bottom': '20px'}),
+
+                        dcc.Graph(id='aqi-timeseries'),
+                        dcc.Graph(id='aqi-distribution')
+                    ])
                 ])
             ])
 
         ]),
 
         # Tab 3: Air Quality Analysis
-        dcc.Tab(label="Air Quality Analysis", children=[
+        dcc.Tab(label="Air Quality Analysis", value='analysis', children=[
             # Section 1: Bar Chart
             html.Div([
                 html.H3("City Comparison (Bar Chart)", style={'font-size':'25' ,'text-align': 'center', 
@@ -176,7 +303,7 @@ app.layout = html.Div([
                         html.Label("Select Metric for Y-Axis:", style={'font-weight': 'bold'}),
                         dcc.Dropdown(
                             id="bar_x_axis",
-                            options=[{"label": col, "value": col} for col in combined_data.columns if col not in ["City", "time"]],
+                            options=[{"label": col, "value": col} for col in store.metrics],
                             value="pm10 (μg/m³)",
                             placeholder="Select Metric for Y-Axis"
                         )
@@ -204,7 +331,7 @@ app.layout = html.Div([
                         html.Label("Select Metric for X-Axis:", style={'font-weight': 'bold'}),
                         dcc.Dropdown(
                             id="scatter_x_axis",
-                            options=[{"label": col, "value": col} for col in combined_data.columns if col not in ["City", "time"]],
+                            options=[{"label": col, "value": col} for col in store.metrics],
                             value="pm10 (μg/m³)",
                             placeholder="Select Metric for X-Axis"
                         )
@@ -214,7 +341,7 @@ app.layout = html.Div([
                         html.Label("Select Metric for Y-Axis:", style={'font-weight': 'bold'}),
                         dcc.Dropdown(
                             id="scatter_y_axis",
-                            options=[{"label": col, "value": col} for col in combined_data.columns if col not in ["City", "time"]],
+                            options=[{"label": col, "value": col} for col in store.metrics],
                             value="pm2_5 (μg/m³)",
                             placeholder="Select Metric for Y-Axis"
                         )
@@ -224,12 +351,59 @@ app.layout = html.Div([
                     'align-items': 'center',
                     'margin-bottom': '20px'
                 }),
+                dcc.Checklist(
+                    id="scatter_options",
+                    options=[{"label": "Overlay city samples on density view", "value": "cities"}],
+                    value=[],
+                    inline=True,
+                    style={'padding': '10px'}
+                ),
                 dcc.Graph(id="scatter_plot")
             ]),
 
             html.Hr(),
 
-            # Section 3: Alerts and Outliers
+            # Section 3: Correlation Matrix
+            html.Div([
+                html.H3("Correlation Matrix", style={'font-size':'25', 'text-align': 'center', 
+                'background-color': '#f0f8ff',                    
+                'margin-bottom': '20px',
+                'padding': '10px',
+                'border-radius': '10px',}),
+                html.Div([
+                    html.Div([
+                        html.Label("Method:", style={'font-weight': 'bold'}),
+                        dcc.RadioItems(
+                            id="correlation_method",
+                            options=[{"label": "Pearson", "value": "pearson"},
+                                     {"label": "Spearman", "value": "spearman"}],
+                            value="pearson",
+                            inline=True,
+                            style={'padding': '10px'}
+                        )
+                    ], style={'flex': '1', 'margin-right': '10px'}),
+
+                    html.Div([
+                        html.Label("City:", style={'font-weight': 'bold'}),
+                        dcc.Dropdown(
+                            id="correlation_city",
+                            options=[{"label": "All cities", "value": "all"}] +
+                                    [{"label": city, "value": city} for city in store.cities],
+                            value="all",
+                            clearable=False
+                        )
+                    ], style={'flex': '1'})
+                ], style={
+                    'display': 'flex',
+                    'align-items': 'center',
+                    'margin-bottom': '20px'
+                }),
+                dcc.Graph(id="correlation_matrix")
+            ]),
+
+            html.Hr(),
+
+            # Section 4: Alerts and Outliers
             html.Div([
                 html.H3("Alerts and Outliers", style={'font-size':'25', 'text-align': 'center', 
                 'background-color': '#f0f8ff',                    
@@ -240,12 +414,7 @@ app.layout = html.Div([
                     html.Label("Thresholds:", style={'font-weight': 'bold', 'margin-right': '10px'}),
                     dcc.Checklist(
                         id="threshold_checklist",
-                        options=[
-                            {"label": "PM2.5 > 100 (μg/m³)", "value": "pm2_5 (μg/m³)"},
-                            {"label": "PM10 > 150 (μg/m³)", "value": "pm10 (μg/m³)"},
-                            {"label": "CO > 10 (μg/m³)", "value": "carbon_monoxide (μg/m³)"},
-                            {"label": "NO2 > 80 (μg/m³)", "value": "nitrogen_dioxide (μg/m³)"},
-                        ],
+                        options=[{"label": rule['label'], "value": rule['column']} for rule in ALERT_RULES],
                         value=["pm2_5 (μg/m³)", "pm10 (μg/m³)"],
                         inline=True,
                         style={'padding': '10px'}
@@ -258,7 +427,25 @@ app.layout = html.Div([
                     'border-radius': '10px',
                     'background-color': '#f0f8ff'
                 }),
-                dcc.Graph(id="alerts_outliers")
+                html.Div([
+                    html.Label("Outlier tests:", style={'font-weight': 'bold', 'margin-right': '10px'}),
+                    dcc.Checklist(
+                        id="outlier_methods",
+                        options=[{"label": label, "value": method} for method, (_, label) in OUTLIER_METHODS.items()],
+                        value=["zscore", "seasonal"],
+                        inline=True,
+                        style={'padding': '10px'}
+                    )
+                ], style={
+                    'display': 'flex',
+                    'align-items': 'center',
+                    'margin-bottom': '20px',
+                    'padding': '10px',
+                    'border-radius': '10px',
+                    'background-color': '#f0f8ff'
+                }),
+                dcc.Graph(id="alerts_outliers"),
+                html.Div(id="alert_counts")
             ]),
         ])
 
@@ -266,33 +453,102 @@ app.layout = html.Div([
 ])
 
 def get_air_quality_status(pm10, pm25, co):
-    if (pm10 <= 50 and pm25 <= 25 and co <= 4400):
-        return "Good", "green"
-    elif (pm10 <= 100 and pm25 <= 50 and co <= 9400):
-        return "Moderate", "yellow"
-    elif (pm10 <= 150 and pm25 <= 75 and co <= 12400):
-        return "Unhealthy for Sensitive Groups", "orange"
-    else:
-        return "Unhealthy", "red"
+    # EPA AQI of the period means; the worst sub-index sets the category
+    value, _ = compute_aqi({'pm10 (μg/m³)': [pm10], 'pm2_5 (μg/m³)': [pm25], 'carbon_monoxide (μg/m³)': [co]})
+    status, color = category_of(value[0])
+    if np.isnan(value[0]):
+        return status, color
+    return f"{status} (AQI {value[0]:.0f})", color
+
+def selected_period(month_key, start_date, end_date):
+    # A complete custom date range wins over the month selection
+    if start_date and end_date:
+        start, end = date_range_bounds(start_date, end_date)
+        return start, end, f"{start:%Y-%m-%d} to {end - pd.Timedelta(days=1):%Y-%m-%d}"
+    if month_key:
+        start, end = month_bounds(month_key)
+        return start, end, month_label(start)
+    return None, None, "All Data"
+
+
+def visible_only(*tabs):
+    # Callbacks of a tab that isn't showing are skipped, and run once it is
+    # opened: the Tabs values are their leading inputs. The values are not
+    # passed on, so they stay out of the figure cache key.
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            if tuple(args[:len(tabs)]) != tabs:
+                raise PreventUpdate
+            return fn(*args[len(tabs):])
+        return wrapper
+    return decorator
+
+
+@app.callback(
+    [Output('month-dropdown', 'options'),
+     Output('month-radio', 'options')],
+    [Input('data-version', 'data')]
+)
+
+def update_month_options(data_version):
+    # Streamed readings can open a new month
+    options = month_options()
+    return options, options
+
 
 # Callbacks for Tab 1
 @app.callback(
     [Output('overview-summary-cards', 'children'),
      Output('overview-heatmap', 'figure'),
      Output('overview-bar-chart', 'figure')],
-    [Input('overview-city-dropdown', 'value'),
-     Input('month-dropdown', 'value')]
+    [Input('main-tabs', 'value'),
+     Input('overview-city-dropdown', 'value'),
+     Input('month-dropdown', 'value'),
+     Input('overview-date-range', 'start_date'),
+     Input('overview-date-range', 'end_date'),
+     Input('overview-heatmap', 'relayoutData'),
+     Input('overview-bar-chart', 'relayoutData'),
+     Input('data-version', 'data')]
 )
 
-def update_overview(selected_city, selected_month):
-    # Data processing logic remains the same
-    df = city_data[selected_city]
-    df['time'] = pd.to_datetime(df['time'])
-    df['date'] = df['time'].dt.date
-    df['month'] = df['time'].dt.month
-    df = df[df['month'] == selected_month]
+@visible_only('overview')
+def update_overview(selected_city, selected_month, start_date, end_date, heatmap_relayout, bar_relayout, data_version=None):
+    # Zooming either chart re-renders both for the visible window, at the
+    # pyramid level that fits it; other inputs start from the whole period
+    x_range = None
+    if heatmap_relayout or bar_relayout:
+        if ctx.triggered_id in ('overview-heatmap', 'overview-bar-chart'):
+            relayout = heatmap_relayout if ctx.triggered_id == 'overview-heatmap' else bar_relayout
+            x_range = zoom_range(relayout)
+            if x_range is None and not is_autorange(relayout):
+                raise PreventUpdate
+        elif ctx.triggered_id == 'data-version':
+            x_range = zoom_range(heatmap_relayout) or zoom_range(bar_relayout)
+    return render_overview(selected_city, selected_month, start_date, end_date, x_range)
+
+
+# Points per chart for the overview's grouped bars and heatmap columns
+OVERVIEW_BAR_BUCKETS = 60
+OVERVIEW_HEATMAP_COLUMNS = 400
+
+
+def overview_series(selected_city, start, end, n_out):
+    # Per-bucket means (or the readings themselves) of the level that fits n_out
+    level = store.resolution(selected_city, start, end, n_out)
+    if level == 'raw':
+        rows = store.query(selected_city, start, end)
+        return level, rows.set_index('time')[[col for col in POLLUTANTS if col in rows.columns]]
+    return level, store.query_level(selected_city, level, start, end)['mean']
+
+
+@figure_cache.memoize(warm=[('Colombo', default_month, None, None, None)], city=0)
+def render_overview(selected_city, selected_month, start_date, end_date, x_range):
+    # Daily means for the period come straight from the aggregate cube
+    start, end, _ = selected_period(selected_month, start_date, end_date)
+    daily = store.query_daily(selected_city, start, end)
     
-    if df.empty:
+    if daily.empty:
         return (
             html.Div("No data available for the selected filters.", className="summary-card"),
             go.Figure(),
@@ -303,9 +559,7 @@ def update_overview(selected_city, selected_month):
                        'carbon_dioxide (ppm)', 'nitrogen_dioxide (μg/m³)', 
                        'sulphur_dioxide (μg/m³)', 'dust (μg/m³)', 'uv_index ()']
     
-    numeric_df = df[['date'] + numeric_columns].copy()
-    numeric_df[numeric_columns] = numeric_df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-    daily_aggregates = numeric_df.groupby('date').mean().reset_index()
+    daily_aggregates = daily[numeric_columns].rename_axis('date').reset_index()
 
     avg_pm10 = daily_aggregates['pm10 (μg/m³)'].mean()
     avg_pm25 = daily_aggregates['pm2_5 (μg/m³)'].mean()
@@ -397,307 +651,554 @@ def update_overview(selected_city, selected_month):
         }
     )
 
-    # Heatmap and bar chart remain unchanged
+    # Heatmap and bar chart use the pyramid level that fits the visible window
     pollutants = ['pm10 (μg/m³)', 'pm2_5 (μg/m³)', 'carbon_monoxide (μg/m³)', 'carbon_dioxide (ppm)', 'nitrogen_dioxide (μg/m³)', 'sulphur_dioxide (μg/m³)', 'dust (μg/m³)', 'uv_index ()']
-    heatmap_data = daily_aggregates[['date'] + pollutants]
-    heatmap_fig = go.Figure(data=go.Heatmap(z=heatmap_data[pollutants].values.T, x=heatmap_data['date'], y=pollutants, colorscale='Viridis', colorbar=dict(title='Concentration')))
-    heatmap_fig.update_layout(title=f"Air Quality Heatmap - {selected_city}", xaxis_title='Date', yaxis_title='Pollutants', height=600)
-
-    bar_chart_fig = px.bar(daily_aggregates, x='date', y=pollutants, title=f"Daily Pollutant Levels in {selected_city}", labels={'value': 'Concentration', 'variable': 'Pollutants'}, color_discrete_sequence=px.colors.qualitative.Set2)
-    bar_chart_fig.update_layout(barmode='group', height=600, showlegend=True, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+    if x_range is not None:
+        start = max(start, pd.Timestamp(x_range[0])) if start is not None else pd.Timestamp(x_range[0])
+        end = min(end, pd.Timestamp(x_range[1])) if end is not None else pd.Timestamp(x_range[1])
+    heatmap_level, heatmap_data = overview_series(selected_city, start, end, OVERVIEW_HEATMAP_COLUMNS)
+    bar_level, bar_data = overview_series(selected_city, start, end, OVERVIEW_BAR_BUCKETS)
+    bar_data = bar_data.reindex(columns=pollutants).rename_axis('date').reset_index()
+    with phase('figure'):
+        heatmap_fig = go.Figure(data=go.Heatmap(z=heatmap_data.reindex(columns=pollutants).values.T, x=heatmap_data.index, y=pollutants, colorscale='Viridis', colorbar=dict(title='Concentration')))
+        heatmap_fig.update_layout(title=f"Air Quality Heatmap - {selected_city} ({LEVEL_TITLES[heatmap_level]})", xaxis_title='Date', yaxis_title='Pollutants', height=600)
+
+        bar_chart_fig = px.bar(bar_data, x='date', y=pollutants, title=f"{LEVEL_TITLES[bar_level]} Pollutant Levels in {selected_city}", labels={'value': 'Concentration', 'variable': 'Pollutants'}, color_discrete_sequence=px.colors.qualitative.Set2)
+        bar_chart_fig.update_layout(barmode='group', height=600, showlegend=True, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+        if x_range is not None:
+            heatmap_fig.update_xaxes(range=list(x_range))
+            bar_chart_fig.update_xaxes(range=list(x_range))
 
     return summary_cards, heatmap_fig, bar_chart_fig
 
 
 # Callbacks for Tab 2
+def message_figure(message):
+    fig = go.Figure()
+    fig.update_layout(
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        annotations=[dict(text=message, showarrow=False, font=dict(size=16))]
+    )
+    return fig
+
+
+# With CLIENTSIDE_MONTHS the city and month are only read here; the browser
+# renders their changes from the city payload below
+city_graph_selection = State if CLIENTSIDE_MONTHS else Input
+
+
 @app.callback(
-    Output('city-graph-container', 'children'),
-    [Input('city-dropdown', 'value'),
-     Input('month-radio', 'value')]
+    Output('city-graph', 'figure'),
+    [Input('main-tabs', 'value'),
+     Input('city-trends-tabs', 'value'),
+     city_graph_selection('city-dropdown', 'value'),
+     city_graph_selection('month-radio', 'value'),
+     Input('city-date-range', 'start_date'),
+     Input('city-date-range', 'end_date'),
+     Input('city-graph', 'relayoutData'),
+     Input('data-version', 'data')],
+    prevent_initial_call=CLIENTSIDE_MONTHS
 )
 
 # Callback for PM2.5 Trends (Sub-Tab 1)
 
-def update_city_graph(selected_city, selected_month):
-    # Fetch data for the selected city
-    df = city_data[selected_city]
+@visible_only('city-trends', 'pm-trends')
+def update_city_graph(selected_city, selected_month, start_date, end_date, relayout_data, data_version=None):
+    # Zooming re-renders the visible window at full resolution; city/month
+    # changes start from the whole (downsampled) month again, while a data
+    # refresh keeps the current zoom
+    x_range = None
+    if relayout_data and ctx.triggered_id not in ('city-dropdown', 'month-radio', 'city-date-range'):
+        x_range = zoom_range(relayout_data)
+        if ctx.triggered_id == 'city-graph' and x_range is None and not is_autorange(relayout_data):
+            raise PreventUpdate
+    if (CLIENTSIDE_MONTHS and ctx.triggered_id in ('data-version', 'main-tabs', 'city-trends-tabs')
+            and x_range is None and not (start_date and end_date)):
+        # The (re)loaded payload renders the month in the browser
+        raise PreventUpdate
+    start, end, label = selected_period(selected_month, start_date, end_date)
+    return render_city_graph(selected_city, start, end, label, x_range)
+
+
+if CLIENTSIDE_MONTHS:
+    @app.callback(
+        Output('city-payload', 'data'),
+        [Input('main-tabs', 'value'),
+         Input('city-trends-tabs', 'value'),
+         Input('city-dropdown', 'value'),
+         Input('data-version', 'data')],
+        [State('city-payload', 'data')]
+    )
+    @visible_only('city-trends', 'pm-trends')
+    def update_city_payload(selected_city, data_version=None, current=None):
+        # Every month (and '' for all data) rendered as it would be on the server;
+        # the months share one layout, so each only carries its traces and title.
+        # All Data is drawn from a coarser level with its own layout, so it
+        # comes last and never sets the shared one.
+        options = month_options() + [{'value': ''}]
+        stamp = [DATA_RELEASE, store.snapshot().stamp(selected_city)]
+        if (current and current.get('city') == selected_city and current.get('stamp') == stamp
+                and list(current['months']) == [option['value'] for option in options]):
+            # A version tick from another station: the browser already has this payload
+            raise PreventUpdate
+        payload = {'city': selected_city, 'stamp': stamp, 'layout': None, 'months': {}}
+        for option in options:
+            fig = render_city_graph(selected_city, *selected_period(option['value'], None, None), None)
+            figure = fig if isinstance(fig, dict) else fig.to_plotly_json()
+            layout = dict(figure['layout'])
+            title = layout.pop('title', None)
+            if payload['layout'] is None and figure['data']:
+                payload['layout'] = layout
+            if figure['data'] and layout == payload['layout']:
+                payload['months'][option['value']] = {'data': figure['data'], 'title': title}
+            else:
+                payload['months'][option['value']] = {'figure': figure}
+        return payload
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='city_trends', function_name='render_month'),
+        Output('city-graph', 'figure', allow_duplicate=True),
+        [Input('city-payload', 'data'),
+         Input('month-radio', 'value')],
+        [State('city-date-range', 'start_date'),
+         State('city-date-range', 'end_date')],
+        prevent_initial_call=True
+    )
+
+
+# 24-hour averages drawn dotted next to the hourly PM readings
+PM_ROLLING_MEANS = [rolling_column(spec, 'mean') for spec in ROLLING_WINDOWS if spec['window'] == '24h']
 
-    if 'time' in df.columns:
-        df['time'] = pd.to_datetime(df['time'])
-        month_mapping = {'September': 9, 'October': 10, 'November': 11, 'December': 12}
-        filtered_df = df[df['time'].dt.month == month_mapping[selected_month]]
+
+@figure_cache.memoize(warm=[('Colombo', *selected_period(default_month, None, None), None)], city=0)
+def render_city_graph(selected_city, start, end, label, x_range):
+    # Fetch the period (or the zoomed window inside it) for the selected city
+    if x_range is not None:
+        zoom_start, zoom_end = pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1])
+        start = zoom_start if start is None else max(start, zoom_start)
+        end = zoom_end if end is None else min(end, zoom_end)
+    level = store.resolution(selected_city, start, end)
+    if level != 'raw':
+        return pyramid_city_graph(selected_city, start, end, label, x_range, level)
+    filtered_df = store.query(selected_city, start, end)
+
+    if 'time' in filtered_df.columns:
 
         # Check if both PM2.5 and PM10 columns are available in the data
         if not filtered_df.empty and 'pm2_5 (μg/m³)' in filtered_df.columns and 'pm10 (μg/m³)' in filtered_df.columns:
-            # Melt the DataFrame for dual-line plotting
-            melted_df = filtered_df.melt(
-                id_vars=['time'],
-                value_vars=['pm2_5 (μg/m³)', 'pm10 (μg/m³)'],
-                var_name='Particulate Matter',
-                value_name='Concentration'
-            )
+            # One long frame of downsampled traces for dual-line plotting
+            # plus the 24h regulatory averages kept by the rolling engine
+            columns = ['pm2_5 (μg/m³)', 'pm10 (μg/m³)']
+            columns += [col for col in PM_ROLLING_MEANS if col in filtered_df.columns]
+            traces = []
+            for column in columns:
+                times, values = downsample_series(filtered_df['time'], filtered_df[column])
+                traces.append(pd.DataFrame({'time': times.values, 'Particulate Matter': column, 'Concentration': values.values}))
+            melted_df = pd.concat(traces, ignore_index=True)
 
             # Create a dual-line chart
-            fig = px.line(
-                melted_df,
-                x='time',
-                y='Concentration',
-                color='Particulate Matter',
-                title=f"PM2.5 and PM10 Levels in {selected_city} - {selected_month}",
-                labels={'time': 'Date', 'Concentration': 'Concentration (μg/m³)', 'Particulate Matter': 'Type'}
-            )
-            fig.update_layout(legend_title_text='Particulate Matter Type')
+            with phase('figure'):
+                fig = px.line(
+                    melted_df,
+                    x='time',
+                    y='Concentration',
+                    color='Particulate Matter',
+                    title=f"PM2.5 and PM10 Levels in {selected_city} - {label}",
+                    labels={'time': 'Date', 'Concentration': 'Concentration (μg/m³)', 'Particulate Matter': 'Type'}
+                )
+                fig.update_layout(legend_title_text='Particulate Matter Type')
+                fig.update_traces(line_dash='dot', selector=lambda trace: trace.name in PM_ROLLING_MEANS)
+                if x_range is not None:
+                    fig.update_xaxes(range=list(x_range))
 
-            return dcc.Graph(figure=fig)
+            return fig
         else:
-            return html.Div("No data available for PM2.5 or PM10 in the selected month.")
+            return message_figure("No data available for PM2.5 or PM10 in the selected period.")
     else:
-        return html.Div("Data not available for the selected city.")
+        return message_figure("Data not available for the selected city.")
+
+def pyramid_city_graph(selected_city, start, end, label, x_range, level):
+    # More readings than the chart can show: each pollutant's bucket means
+    # inside a band spanning the bucket minima and maxima
+    buckets = store.query_level(selected_city, level, start, end)
+    if buckets.empty:
+        return message_figure("No data available for PM2.5 or PM10 in the selected period.")
+    with phase('figure'):
+        fig = go.Figure()
+        for column, color in zip(['pm2_5 (μg/m³)', 'pm10 (μg/m³)'], px.colors.qualitative.Plotly):
+            band = f"rgba({', '.join(str(c) for c in hex_to_rgb(color))}, 0.2)"
+            fig.add_trace(go.Scatter(x=buckets.index, y=buckets[('max', column)], mode='lines', line=dict(width=0),
+                                     legendgroup=column, showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=buckets.index, y=buckets[('min', column)], mode='lines', line=dict(width=0),
+                                     fill='tonexty', fillcolor=band, legendgroup=column, showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=buckets.index, y=buckets[('mean', column)], mode='lines', name=column,
+                                     line=dict(color=color), legendgroup=column))
+        fig.update_layout(
+            title=f"PM2.5 and PM10 Levels in {selected_city} - {label} ({LEVEL_TITLES[level].lower()} mean and range)",
+            xaxis_title='Date', yaxis_title='Concentration (μg/m³)', legend_title_text='Particulate Matter Type'
+        )
+        if x_range is not None:
+            fig.update_xaxes(range=list(x_range))
+    return fig
 
-@app.callback(
-    Output('pollutant-bar-chart', 'figure'),
-    [Input('pollutant-city-dropdown', 'value')]
-)
+# Pollutant Analysis (Sub-Tab 2)
+# One request per city change: the monthly aggregates are read once and shared
+# by the bar and pie charts, and the UV grid comes from the same store entry
 
-# Pollutant Analysis (Sub-Tab 2
+ANALYSIS_POLLUTANTS = ['carbon_monoxide (μg/m³)', 'carbon_dioxide (ppm)',
+                       'nitrogen_dioxide (μg/m³)', 'sulphur_dioxide (μg/m³)', 'dust (μg/m³)']
 
-# Pollutant Bar Chart
 
-def update_bar_chart(selected_city):
-    if selected_city is None:
-        return go.Figure()
+# Pollutant Bar Chart
+def pollutant_bar_figure(selected_city, max_data):
+    with phase('figure'):
+        fig = go.Figure()
+        for pollutant in ANALYSIS_POLLUTANTS:
+            fig.add_trace(go.Bar(
+                x=max_data['month'],
+                y=max_data[pollutant],
+                name=pollutant
+            ))
+
+        # Customize the layout
+        fig.update_layout(
+            title=f"Maximum Recorded Levels for Pollutants in {selected_city}",
+            xaxis_title="Month",
+            yaxis_title="Maximum Levels",
+            barmode='group',  
+            legend_title="Pollutants",
+            xaxis=dict(tickangle=-45),
+            template="plotly"
+        )
 
-    df = city_data[selected_city]
+    return fig
 
-    df['time'] = pd.to_datetime(df['time'])
 
-    df['month'] = df['time'].dt.strftime('%B')
+# Seasonal Pie Chart
+def seasonal_pie_figure(selected_city, monthly_totals):
+    with phase('figure'):
+        fig = px.pie(
+            monthly_totals,
+            names='month',
+            values='total_pollution',
+            title=f"Seasonal Contribution of Pollution in {selected_city}",
+            labels={'month': 'Month', 'total_pollution': 'Total Pollution'}
+        )
+        fig.update_traces(textinfo='percent+label')
 
-    # Maximum recorded levels per month for each pollutant
-    pollutants = ['carbon_monoxide (μg/m³)', 'carbon_dioxide (ppm)', 
-                  'nitrogen_dioxide (μg/m³)', 'sulphur_dioxide (μg/m³)', 'dust (μg/m³)']
-    max_data = df.groupby('month')[pollutants].max().reset_index()
+    return fig
 
-    # Reorder months to calendar order
-    months_order = ['September', 'October', 'November', 'December']
-    max_data['month'] = pd.Categorical(max_data['month'], categories=months_order, ordered=True)
-    max_data = max_data.sort_values('month')
 
-    # Create the bar chart
-    fig = go.Figure()
-    for pollutant in pollutants:
-        fig.add_trace(go.Bar(
-            x=max_data['month'],
-            y=max_data[pollutant],
-            name=pollutant
+def uv_heatmap_figure(selected_city, weekly_uv):
+    z, mondays, cell_dates = weekly_uv
+    days_order = DAYS_ORDER
+    
+    # Sunday at the top, Monday at the bottom
+    z = z[::-1]
+    cell_dates = cell_dates[::-1]
+    
+    x_labels = mondays.strftime('%b-%d') # Monday Dates as labels
+    
+    with phase('figure'):
+        fig = go.Figure(data=go.Heatmap(
+            z=z,
+            x=x_labels,
+            y=days_order[::-1],
+            colorscale='YlOrRd',
+            colorbar=dict(
+                title='UV Index',
+                titleside='right'
+            ),
+            hoverongaps=False,
+            customdata=np.datetime_as_string(cell_dates, unit='D'),
+            hovertemplate=(
+                'Date: %{customdata}<br>'
+                'Day: %{y}<br>'
+                'UV Index: %{z:.2f}<extra></extra>'
+            )
         ))
-
-    # Customize the layout
-    fig.update_layout(
-        title=f"Maximum Recorded Levels for Pollutants in {selected_city}",
-        xaxis_title="Month",
-        yaxis_title="Maximum Levels",
-        barmode='group',  
-        legend_title="Pollutants",
-        xaxis=dict(tickangle=-45),
-        template="plotly"
-    )
-
+    
+        fig.update_layout(
+            title=f'Weekly UV Index Patterns in {selected_city}',
+            xaxis_title='Week Starting',
+            yaxis_title='Day of Week',
+            height=500,
+            xaxis=dict(
+                side='top',
+                tickangle=45,
+                showgrid=True
+            ),
+            yaxis=dict(
+                tickmode='array',
+                ticktext=days_order[::-1],
+                tickvals=list(range(len(days_order)))
+            )
+        )
+    
     return fig
 
+
 @app.callback(
-    Output('seasonal-pie-chart', 'figure'),
-    [Input('pollutant-city-dropdown', 'value')]
+    [Output('pollutant-bar-chart', 'figure'),
+     Output('seasonal-pie-chart', 'figure'),
+     Output('uv-heatmap', 'figure')],
+    [Input('main-tabs', 'value'),
+     Input('city-trends-tabs', 'value'),
+     Input('pollutant-city-dropdown', 'value'),
+     Input('data-version', 'data')]
 )
-
-# Seasonal Pie Chart
-
-def update_seasonal_pie_chart(selected_city):
+@visible_only('city-trends', 'pollutant-analysis')
+@figure_cache.memoize(warm=[('Colombo',)], versioned=True, city=0)
+def update_pollutant_analysis(selected_city, data_version=None):
     if selected_city is None:
-        return go.Figure()
+        return go.Figure(), go.Figure(), go.Figure()
 
-    df = city_data[selected_city]
+    # Maximum recorded levels and total readings per month, with year-aware
+    # month labels in calendar order, computed once for both charts
+    max_levels = store.monthly(selected_city, 'max', ANALYSIS_POLLUTANTS)
+    sums = store.monthly(selected_city, 'sum', ANALYSIS_POLLUTANTS)
+    labels = max_levels.index.map(month_label)
 
-    df['time'] = pd.to_datetime(df['time'])
+    max_data = max_levels.reset_index(drop=True)
+    max_data.insert(0, 'month', labels)
 
-    df['month'] = df['time'].dt.strftime('%B')
+    # Sum of every reading of every pollutant, from the monthly sums
+    monthly_totals = pd.DataFrame({'month': labels, 'total_pollution': sums.fillna(0).sum(axis=1).to_numpy()})
 
-    pollutants = ['carbon_monoxide (μg/m³)', 'carbon_dioxide (ppm)', 
-                  'nitrogen_dioxide (μg/m³)', 'sulphur_dioxide (μg/m³)', 'dust (μg/m³)']
-    df['total_pollution'] = df[pollutants].sum(axis=1)
-    monthly_totals = df.groupby('month')['total_pollution'].sum().reset_index()
+    # Weekday x week grid of daily mean UV, precomputed once per city
+    weekly_uv = store.weekly_uv(selected_city)
 
-    months_order = ['September', 'October', 'November', 'December']
-    monthly_totals['month'] = pd.Categorical(monthly_totals['month'], categories=months_order, ordered=True)
-    monthly_totals = monthly_totals.sort_values('month')
-
-    # Create a pie chart
-    fig = px.pie(
-        monthly_totals,
-        names='month',
-        values='total_pollution',
-        title=f"Seasonal Contribution of Pollution in {selected_city}",
-        labels={'month': 'Month', 'total_pollution': 'Total Pollution'}
-    )
-    fig.update_traces(textinfo='percent+label')
-
-    return fig
+    return (pollutant_bar_figure(selected_city, max_data),
+            seasonal_pie_figure(selected_city, monthly_totals),
+            uv_heatmap_figure(selected_city, weekly_uv))
 
 
+# Air Quality Index (Sub-Tab 3)
 @app.callback(
-    Output('uv-heatmap', 'figure'),
-    [Input('pollutant-city-dropdown', 'value')]
+    [Output('aqi-timeseries', 'figure'),
+     Output('aqi-distribution', 'figure')],
+    [Input('main-tabs', 'value'),
+     Input('city-trends-tabs', 'value'),
+     Input('aqi-city-dropdown', 'value'),
+     Input('data-version', 'data')]
 )
-
-def update_uv_heatmap(selected_city):
+@visible_only('city-trends', 'aqi')
+@figure_cache.memoize(warm=[('Colombo',)], versioned=True)
+def update_aqi(selected_city, data_version=None):
     if selected_city is None:
-        return go.Figure()
-    
-    city_data = combined_uv_index[combined_uv_index['city'] == selected_city].copy()
-    city_data['date'] = pd.to_datetime(city_data['date'])
-    city_data['day_name'] = city_data['date'].dt.strftime('%A')
-    
-    min_date = city_data['date'].min()
-    max_date = city_data['date'].max()
-    
-    # Find the first Monday
-    days_to_monday = (0 - min_date.weekday()) % 7
-    first_monday = min_date + pd.Timedelta(days=days_to_monday)
-    
-    # Generate all Mondays
-    monday_dates = pd.date_range(start=first_monday, end=max_date, freq='W-MON')
-    
-    # Group data by week 
-    city_data['week_monday'] = city_data['date'].apply(
-        lambda x: x - pd.Timedelta(days=x.weekday())
-    )
-    
-    # Create pivot table using week Monday as columns
-    pivot_df = city_data.pivot_table(
-        index='day_name',
-        columns='week_monday',
-        values='daily_mean_uv',
-        aggfunc='mean'
-    )
-    
-    days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    pivot_df = pivot_df.reindex(days_order)
-    pivot_df = pivot_df.iloc[::-1]
-    
-    x_labels = [d.strftime('%b-%d') for d in pivot_df.columns] # Monday Dates as labels
-    
-    # Create hover text matrix
-    hover_matrix = []
-    for i in range(len(pivot_df.index)):
-        hover_row = []
-        for j in range(len(pivot_df.columns)):
-            if not pd.isna(pivot_df.iloc[i, j]):
-                # Get the actual date for this cell
-                monday_date = pivot_df.columns[j]
-                day_offset = days_order.index(pivot_df.index[i])
-                actual_date = monday_date + pd.Timedelta(days=day_offset)
-                date_str = actual_date.strftime('%Y-%m-%d')
-                uv_value = pivot_df.iloc[i, j]
-                hover_row.append(
-                    f'Date: {date_str}<br>'
-                    f'Day: {pivot_df.index[i]}<br>'
-                    f'UV Index: {uv_value:.2f}'
-                )
-            else:
-                hover_row.append('')
-        hover_matrix.append(hover_row)
-    
-    fig = go.Figure(data=go.Heatmap(
-        z=pivot_df.values,
-        x=x_labels,
-        y=pivot_df.index,
-        colorscale='YlOrRd',
-        colorbar=dict(
-            title='UV Index',
-            titleside='right'
-        ),
-        hoverongaps=False,
-        text=hover_matrix,
-        hovertemplate="%{text}<extra></extra>"
-    ))
-    
-    fig.update_layout(
-        title=f'Weekly UV Index Patterns in {selected_city}',
-        xaxis_title='Week Starting',
-        yaxis_title='Day of Week',
-        height=500,
-        xaxis=dict(
-            side='top',
-            tickangle=45,
-            showgrid=True
-        ),
-        yaxis=dict(
-            tickmode='array',
-            ticktext=days_order[::-1],
-            tickvals=list(range(len(days_order)))
+        return go.Figure(), go.Figure()
+
+    # Daily AQI from the cube, hourly AQI from the precomputed column
+    daily = store.daily_aqi(selected_city)
+    hourly = store.city(selected_city)
+    hourly_times, hourly_aqi = downsample_series(hourly['time'], hourly['aqi'])
+    distribution = store.aqi_distribution()
+    shares = distribution.div(distribution.sum(axis=1).where(lambda total: total > 0), axis=0) * 100
+
+    with phase('figure'):
+        series_fig = go.Figure()
+        # Category bands behind the series
+        lower = 0
+        for (upper, name, color) in AQI_CATEGORIES:
+            series_fig.add_hrect(y0=lower, y1=upper, fillcolor=color, opacity=0.08, line_width=0, layer='below')
+            lower = upper
+        series_fig.add_trace(go.Scattergl(
+            x=hourly_times, y=hourly_aqi, mode='lines', name='Hourly AQI',
+            line=dict(color='lightgray', width=1)
+        ))
+        series_fig.add_trace(go.Scatter(
+            x=daily.index, y=daily['aqi'], mode='lines+markers', name='Daily AQI',
+            marker=dict(color=[CATEGORY_COLORS[code] if code >= 0 else 'gray' for code in daily['category']], size=6),
+            line=dict(color='black', width=1),
+            customdata=daily['pollutant'],
+            hovertemplate='%{x|%Y-%m-%d}<br>AQI: %{y:.0f}<br>Dominant: %{customdata}<extra></extra>'
+        ))
+        top = max(float(np.nanmax(daily['aqi'])) if daily['aqi'].notna().any() else 0, 100) * 1.1
+        series_fig.update_layout(
+            title=f"Air Quality Index in {selected_city}",
+            xaxis_title='Date', yaxis_title='AQI', yaxis=dict(range=[0, top]),
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)
+        )
+
+        distribution_fig = go.Figure()
+        for name, color in zip(CATEGORY_NAMES, CATEGORY_COLORS):
+            distribution_fig.add_trace(go.Bar(
+                x=shares.index, y=shares[name], name=name, marker_color=color,
+                customdata=distribution[name],
+                hovertemplate='%{x}<br>%{customdata} days (%{y:.1f}%)<extra>' + name + '</extra>'
+            ))
+        distribution_fig.update_layout(
+            title="Days in Each AQI Category by City", barmode='stack',
+            xaxis_title='City', yaxis_title='Share of days (%)', legend_title_text='Category'
         )
-    )
-    
-    return fig
+
+    return series_fig, distribution_fig
 
 
 # Callbacks for Tab 3
 # Callbacks
 @app.callback(
     Output("city_bar_chart", "figure"),
-    Input("bar_x_axis", "value")
+    [Input('main-tabs', 'value'),
+     Input("bar_x_axis", "value"),
+     Input("data-version", "data")]
 )
-def update_bar_chart(x_axis):
+@visible_only('analysis')
+@figure_cache.memoize(warm=[('pm10 (μg/m³)',)], versioned=True)
+def update_bar_chart(x_axis, data_version=None):
     if x_axis:
-        avg_data = combined_data.groupby("City")[x_axis].mean().reset_index()
-        fig = px.bar(avg_data, x="City", y=x_axis, title=f"Average {x_axis} Levels Across Cities")
+        avg_data = store.city_means([x_axis]).reset_index()
+        with phase('figure'):
+            fig = px.bar(avg_data, x="City", y=x_axis, title=f"Average {x_axis} Levels Across Cities")
         return fig
     return {}
 
 
 @app.callback(
     Output("scatter_plot", "figure"),
-    [Input("scatter_x_axis", "value"),
-     Input("scatter_y_axis", "value")]
+    [Input('main-tabs', 'value'),
+     Input("scatter_x_axis", "value"),
+     Input("scatter_y_axis", "value"),
+     Input("scatter_options", "value"),
+     Input("data-version", "data")]
 )
-def update_scatter_plot(x_axis, y_axis):
+@visible_only('analysis')
+@figure_cache.memoize(warm=[('pm10 (μg/m³)', 'pm2_5 (μg/m³)', [])], versioned=True)
+def update_scatter_plot(x_axis, y_axis, options, data_version=None):
     if x_axis and y_axis:
-        fig = px.scatter(combined_data, x=x_axis, y=y_axis, color="City",
-                         title=f"Correlation between {x_axis} and {y_axis}")
+        # SVG, WebGL or binned density depending on how many readings there are;
+        # stations are read lazily, and in density mode only for the overlay
+        snapshot = store.snapshot()
+        frames = StationFrames(snapshot, snapshot.cities, [x_axis, y_axis])
+        with phase('figure'):
+            fig = correlation_scatter(frames, x_axis, y_axis, snapshot.rows(),
+                                      overlay_cities='cities' in (options or []), joint=snapshot.joint_stats())
         return fig
     return {}
 
 @app.callback(
-    Output("alerts_outliers", "figure"),
-    [Input("threshold_checklist", "value")]
+    Output("correlation_matrix", "figure"),
+    [Input('main-tabs', 'value'),
+     Input("correlation_method", "value"),
+     Input("correlation_city", "value"),
+     Input("data-version", "data")]
+)
+@visible_only('analysis')
+@figure_cache.memoize(warm=[('pearson', 'all')], versioned=True)
+def update_correlation_matrix(method, city, data_version=None):
+    # Read from the running pairwise statistics; no pass over the readings
+    joint = store.joint_stats()
+    selected = None if city in (None, 'all') else city
+    matrix = joint.spearman(selected) if method == 'spearman' else joint.pearson(selected)
+    metrics = [col for col in store.metrics if col in matrix.index]
+    matrix = matrix.loc[metrics, metrics]
+    with phase('figure'):
+        fig = go.Figure(go.Heatmap(
+            x=metrics, y=metrics, z=matrix.values,
+            zmin=-1, zmax=1, colorscale='RdBu_r',
+            colorbar=dict(title='r'),
+            text=np.round(matrix.values, 2), texttemplate="%{text}",
+            hovertemplate="%{y}<br>%{x}<br>r = %{z:.3f}<extra></extra>"
+        ))
+        fig.update_layout(
+            title=f"{'Spearman' if method == 'spearman' else 'Pearson'} Correlation - {selected or 'All Cities'}",
+            yaxis=dict(autorange='reversed'), height=600
+        )
+    return fig
+
+
+@app.callback(
+    [Output("alerts_outliers", "figure"),
+     Output("alert_counts", "children")],
+    [Input('main-tabs', 'value'),
+     Input("threshold_checklist", "value"),
+     Input("outlier_methods", "value"),
+     Input("data-version", "data")]
 )
 
-def update_alerts_outliers(thresholds):
-    if thresholds:
-        highlight_df = combined_data.copy()
+@visible_only('analysis')
+@figure_cache.memoize(warm=[(['pm2_5 (μg/m³)', 'pm10 (μg/m³)'], ['zscore', 'seasonal'])], versioned=True)
+def update_alerts_outliers(thresholds, methods, data_version=None):
+    if thresholds or methods:
+        # One OR over the precomputed exceedance bits; no copy of the readings
+        engine = store.alerts()
+        alert_rows = engine.alerting_rows(thresholds or [])
+        normal = engine.normal_summary(thresholds or [])
+
+        # Only the flagged readings are loaded, not the history they were scored on
+        outliers = store.outliers()
+        outliers = outliers[(outliers['methods'] & methods_mask(methods)) != 0]
+        pm_outliers = outliers[outliers['pollutant'] == 'pm2_5 (μg/m³)']
+
+        with phase('figure'):
+            fig = go.Figure()
+            fig.add_trace(go.Bar(
+                x=normal['City'], base=normal['min'], y=normal['max'] - normal['min'],
+                name="Within thresholds (range)", marker_color='lightsteelblue', opacity=0.6,
+                customdata=normal[['count', 'mean']],
+                hovertemplate="%{x}<br>%{customdata[0]} readings<br>Mean: %{customdata[1]:.2f}<extra></extra>"
+            ))
+            fig.add_trace(go.Scattergl(
+                x=alert_rows['City'], y=alert_rows["pm2_5 (μg/m³)"], mode='markers',
+                name="Exceeds Threshold", marker=dict(color='red', symbol='diamond', size=7)
+            ))
+            if methods:
+                fig.add_trace(go.Scattergl(
+                    x=pm_outliers['City'], y=pm_outliers['value'], mode='markers',
+                    name="Statistical Outlier", marker=dict(color='darkorange', symbol='x', size=7),
+                    customdata=np.column_stack([pm_outliers['time'].dt.strftime('%Y-%m-%d %H:%M'),
+                                                [method_labels(bits) for bits in pm_outliers['methods']]]),
+                    hovertemplate="%{x}<br>%{customdata[0]}<br>%{y:.1f} μg/m³<br>%{customdata[1]}<extra></extra>"
+                ))
+            fig.update_layout(title="Highlighted Alerts and Outliers", xaxis_title="City",
+                              yaxis_title="pm2_5 (μg/m³)", legend_title_text="Exceeds Threshold")
+
+        counts = engine.exceedance_counts(thresholds or [])
+        if methods:
+            # Outliers of every pollutant, per city, for the selected tests
+            flagged = outliers['City'].value_counts().reindex(counts.index, fill_value=0)
+            counts = counts.assign(**{"Statistical outliers (all pollutants)": flagged})
+        counts = counts.reset_index()
+        table = html.Table(
+            [html.Tr([html.Th(col) for col in counts.columns])] +
+            [html.Tr([html.Td(value) for value in row]) for row in counts.itertuples(index=False)],
+            style={'margin': '20px auto', 'text-align': 'center'}
+        )
+        return fig, table
+    return {}, None
 
-        highlight_df['Alert'] = False
 
-        # Update 'Alert' column based on thresholds
-        for metric in thresholds:
-            if metric == "pm2_5 (μg/m³)":
-                highlight_df['Alert'] = highlight_df['Alert'] | (highlight_df["pm2_5 (μg/m³)"] > 100)
-            elif metric == "pm10 (μg/m³)":
-                highlight_df['Alert'] = highlight_df['Alert'] | (highlight_df["pm10 (μg/m³)"] > 150)
-            elif metric == "carbon_monoxide (μg/m³)":
-                highlight_df['Alert'] = highlight_df['Alert'] | (highlight_df["carbon_monoxide (μg/m³)"] > 10)
-            elif metric == "nitrogen_dioxide (μg/m³)":
-                highlight_df['Alert'] = highlight_df['Alert'] | (highlight_df["nitrogen_dioxide (μg/m³)"] > 80)
+@app.callback(
+    [Output('data-version', 'data'),
+     Output('stream-interval', 'disabled')],
+    [Input('stream-interval', 'n_intervals')],
+    [State('data-version', 'data')]
+)
 
+def refresh_data_version(n_intervals, current_version):
+    # The ingestor, the station loader and reloads work in the background;
+    # clients only learn the new version. Without streaming or reloading,
+    # polling stops once loaded.
+    disabled = not POLL_FOREVER and store.ready
+    version = data_version()
+    if version == current_version:
+        return dash.no_update, disabled
+    return version, disabled
+
+
+if STREAM_INTERVAL_S and not store.read_only:
+    ingestor = StreamingIngestor(store, store.data_dir)
+    ingestor.start(STREAM_INTERVAL_S)
+
+if RELOAD_INTERVAL_S and not store.read_only:
+    store.watch(RELOAD_INTERVAL_S)
 
-        fig = px.scatter(highlight_df, x="City", y="pm2_5 (μg/m³)", color="Alert",
-                         title="Highlighted Alerts and Outliers",
-                         labels={"Alert": "Exceeds Threshold"},
-                         symbol="Alert")
-        return fig
-    return {}
 
+if WARM_FIGURE_CACHE:
+    figure_cache.warm()
 
 
 if __name__ == '__main__':
-    app.run_server(debug=True, port=8865)
+    # Callbacks only read immutable snapshots, so requests can be served concurrently
+    app.run_server(debug=True, port=8865, threaded=True)
@@ -0,0 +1,213 @@
+import copy
+import threading
+
+import numpy as np
+import pandas as pd
+
+from rolling import ROLLING_WINDOWS, rolling_column
+
+# Declarative threshold table: one bit of the exceedance mask per rule
+ALERT_RULES = [
+    {'column': 'pm2_5 (μg/m³)', 'threshold': 100, 'label': 'PM2.5 > 100 (μg/m³)'},
+    {'column': 'pm10 (μg/m³)', 'threshold': 150, 'label': 'PM10 > 150 (μg/m³)'},
+    {'column': 'carbon_monoxide (μg/m³)', 'threshold': 10, 'label': 'CO > 10 (μg/m³)'},
+    {'column': 'nitrogen_dioxide (μg/m³)', 'threshold': 80, 'label': 'NO2 > 80 (μg/m³)'},
+]
+# Regulatory averages, read from the rolling columns kept next to the readings
+ALERT_RULES += [
+    {'column': rolling_column(spec, 'mean'), 'threshold': spec['threshold'],
+     'label': f"{spec['label']} {spec['window']} mean > {spec['threshold']} (μg/m³)"}
+    for spec in ROLLING_WINDOWS
+]
+
+
+def _pattern_stats(bits, values):
+    # count/sum/min/max of the (non-missing) values per distinct bit pattern
+    valid = ~np.isnan(values)
+    grouped = pd.Series(values[valid]).groupby(bits[valid])
+    stats = pd.DataFrame({'count': grouped.count(), 'sum': grouped.sum(), 'min': grouped.min(), 'max': grouped.max()})
+    return stats.rename_axis('bits')
+
+
+class AlertEngine:
+    """Exceedance bits of every reading, per city, folded in as stations and rows arrive.
+
+    Each rule sets one bit. Only the readings that set any bit are kept
+    (their time, value and bits), together with per-rule counts and the
+    count/sum/min/max of the value column per distinct bit pattern. Any
+    checklist combination is then answered from those without a pass over
+    the readings, and nothing of the stored frames is copied. Cells are
+    replaced rather than updated in place, so snapshots keep what they saw.
+    """
+
+    def __init__(self, rules=ALERT_RULES, value_column='pm2_5 (μg/m³)'):
+        if len(rules) > 32:
+            raise ValueError("AlertEngine supports at most 32 rules")
+        self.rules = list(rules)
+        self.value_column = value_column
+        self.cities = []
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def _bits(self, df):
+        bits = np.zeros(len(df), dtype=np.uint32)
+        for i, rule in enumerate(self.rules):
+            if rule['column'] in df.columns:
+                # NaN compares False, so missing readings never alert
+                exceeded = df[rule['column']].to_numpy(dtype=float) > rule['threshold']
+                bits |= exceeded.astype(np.uint32) << np.uint32(i)
+        return bits
+
+    def add(self, city, df):
+        bits = self._bits(df)
+        alerting = np.flatnonzero(bits)
+        if self.value_column in df.columns:
+            values = df[self.value_column].to_numpy()
+        else:
+            values = np.full(len(df), np.nan, dtype=np.float32)
+        counts = np.array([np.count_nonzero(bits[alerting] & np.uint32(1 << i)) for i in range(len(self.rules))],
+                          dtype=np.int64)
+        patterns = _pattern_stats(bits, values.astype(np.float64))
+        times = df['time'].to_numpy()[alerting]
+        with self._lock:
+            cell = self._cells.get(city)
+            if cell is not None:
+                counts = counts + cell['counts']
+                merged = pd.concat([cell['patterns'], patterns]).groupby(level='bits')
+                patterns = merged.agg({'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+                times = np.concatenate([cell['times'], times])
+                bits = np.concatenate([cell['bits'], bits[alerting]])
+                values = np.concatenate([cell['values'], values[alerting]])
+            else:
+                bits, values = bits[alerting], values[alerting]
+                self.cities.append(city)
+            self._cells[city] = {'counts': counts, 'patterns': patterns, 'times': times, 'bits': bits, 'values': values}
+
+    def discard(self, city):
+        with self._lock:
+            if self._cells.pop(city, None) is not None:
+                self.cities.remove(city)
+
+    def snapshot(self, cities=None):
+        # Frozen copy answering for `cities`, in that order (those added so far if None)
+        with self._lock:
+            frozen = copy.copy(self)
+            frozen._cells = dict(self._cells)
+            frozen.cities = list(self.cities if cities is None else cities)
+        frozen._lock = threading.Lock()
+        return frozen
+
+    def rule_mask(self, columns):
+        selected = np.uint32(0)
+        for i, rule in enumerate(self.rules):
+            if rule['column'] in columns:
+                selected |= np.uint32(1 << i)
+        return selected
+
+    def _cell(self, city):
+        cell = self._cells.get(city)
+        if cell is None:
+            cell = {'counts': np.zeros(len(self.rules), dtype=np.int64),
+                    'patterns': _pattern_stats(np.zeros(0, dtype=np.uint32), np.zeros(0)),
+                    'times': np.array([], dtype='datetime64[ns]'), 'bits': np.zeros(0, dtype=np.uint32),
+                    'values': np.zeros(0, dtype=np.float32)}
+        return cell
+
+    def exceedance_counts(self, columns=None):
+        selected = [i for i, rule in enumerate(self.rules) if columns is None or rule['column'] in columns]
+        counts = np.array([self._cell(city)['counts'][selected] for city in self.cities], dtype=np.int64)
+        return pd.DataFrame(counts.reshape(len(self.cities), len(selected)),
+                            index=pd.Index(self.cities, name='City'),
+                            columns=[self.rules[i]['label'] for i in selected])
+
+    def alerting_rows(self, columns):
+        # Time, value and City of the readings breaking any selected rule, by city then time
+        selected = self.rule_mask(columns)
+        times, values, codes = [], [], []
+        for code, city in enumerate(self.cities):
+            cell = self._cell(city)
+            rows = (cell['bits'] & selected) != 0
+            times.append(cell['times'][rows])
+            values.append(cell['values'][rows])
+            codes.append(np.full(int(rows.sum()), code, dtype=np.int16))
+        rows = pd.DataFrame({'time': np.concatenate(times) if times else np.array([], dtype='datetime64[ns]'),
+                             self.value_column: np.concatenate(values) if values else np.zeros(0, dtype=np.float32)})
+        codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int16)
+        rows['City'] = pd.Categorical.from_codes(codes, categories=self.cities)
+        return rows
+
+    def normal_summary(self, columns):
+        # Readings within every selected threshold, reduced to per-city statistics
+        selected = self.rule_mask(columns)
+        rows = []
+        for city in self.cities:
+            patterns = self._cell(city)['patterns']
+            kept = patterns[(patterns.index.to_numpy(dtype=np.uint32) & selected) == 0]
+            count = int(kept['count'].sum())
+            rows.append({'count': count, 'min': kept['min'].min() if count else np.nan,
+                         'mean': kept['sum'].sum() / count if count else np.nan,
+                         'max': kept['max'].max() if count else np.nan})
+        summary = pd.DataFrame(rows, columns=['count', 'min', 'mean', 'max'])
+        summary = summary.astype({'count': np.int64, 'min': np.float64, 'mean': np.float64, 'max': np.float64})
+        summary.insert(0, 'City', pd.Categorical(self.cities, categories=self.cities))
+        return summary
+
+
+class QueryAlertEngine:
+    """The AlertEngine interface over a SQL storage backend.
+
+    Nothing is precomputed or held in memory: every call is one query that
+    filters and groups the readings in the database.
+    """
+
+    def __init__(self, storage, cities, rules=ALERT_RULES, value_column='pm2_5 (μg/m³)'):
+        self.storage = storage
+        self.cities = list(cities)
+        self.rules = list(rules)
+        self.value_column = value_column
+        self._present = storage.present_columns()
+
+    def _condition(self, rule):
+        # A NULL (missing) reading never alerts
+        if rule['column'] not in self._present:
+            return "FALSE"
+        return f"COALESCE({self.storage.quote(rule['column'])} > {float(rule['threshold'])!r}, FALSE)"
+
+    def _selected(self, columns):
+        conditions = [self._condition(rule) for rule in self.rules if rule['column'] in columns]
+        return ' OR '.join(conditions) if conditions else "FALSE"
+
+    def exceedance_counts(self, columns=None):
+        rules = [rule for rule in self.rules if columns is None or rule['column'] in columns]
+        sums = ''.join(f", SUM(CASE WHEN {self._condition(rule)} THEN 1 ELSE 0 END) AS {self.storage.quote(rule['label'])}"
+                       for rule in rules)
+        visible, params = self.storage.visible()
+        counts = self.storage.fetch(f"SELECT city{sums} FROM readings WHERE {visible} GROUP BY city", params)
+        counts = counts.set_index('city')
+        counts = counts.reindex(self.cities).fillna(0).astype(np.int64)
+        return counts.rename_axis('City')
+
+    def alerting_rows(self, columns):
+        value = self.storage.quote(self.value_column)
+        visible, params = self.storage.visible()
+        rows = self.storage.fetch(f"SELECT city, time, {value} FROM readings "
+                                  f"WHERE {visible} AND ({self._selected(columns)}) ORDER BY time", params)
+        rows['time'] = rows['time'].to_numpy(dtype=np.int64).astype('datetime64[ns]')
+        rows[self.value_column] = rows[self.value_column].astype(np.float32)
+        rows['City'] = pd.Categorical(rows.pop('city'), categories=self.cities)
+        # By city in the configured order, as AlertEngine returns them, rather than by name
+        return rows.sort_values('City', kind='stable', ignore_index=True)
+
+    def normal_summary(self, columns):
+        # Readings within every selected threshold, reduced to per-city statistics in the database
+        value, quote = self.storage.quote(self.value_column), self.storage.quote
+        visible, params = self.storage.visible()
+        summary = self.storage.fetch(
+            f"SELECT city, COUNT({value}) AS {quote('count')}, MIN({value}) AS {quote('min')}, "
+            f"AVG({value}) AS {quote('mean')}, MAX({value}) AS {quote('max')} FROM readings "
+            f"WHERE {visible} AND NOT ({self._selected(columns)}) GROUP BY city", params
+        ).set_index('city').reindex(self.cities)
+        summary['count'] = summary['count'].fillna(0).astype(np.int64)
+        summary[['min', 'mean', 'max']] = summary[['min', 'mean', 'max']].astype(np.float64)
+        summary.index = pd.CategoricalIndex(summary.index, categories=self.cities, name='City')
+        return summary.reset_index()
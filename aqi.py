@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+
+# US EPA AQI (2024 revision). Concentration breakpoints are in each table's
+# own unit; `scale` converts the stored μg/m³ readings to it (25 °C, 1 atm).
+# `decimals` is the truncation EPA applies before the lookup, and
+# `daily_stat` the daily reduction matching the pollutant's averaging period.
+AQI_INDEX_BREAKPOINTS = [(0, 50), (51, 100), (101, 150), (151, 200), (201, 300), (301, 500)]
+
+AQI_TABLES = {
+    'pm2_5 (μg/m³)': {
+        'label': 'PM2.5', 'scale': 1.0, 'decimals': 1, 'daily_stat': 'mean',
+        'breakpoints': [(0.0, 9.0), (9.1, 35.4), (35.5, 55.4), (55.5, 125.4), (125.5, 225.4), (225.5, 325.4)],
+    },
+    'pm10 (μg/m³)': {
+        'label': 'PM10', 'scale': 1.0, 'decimals': 0, 'daily_stat': 'mean',
+        'breakpoints': [(0, 54), (55, 154), (155, 254), (255, 354), (355, 424), (425, 604)],
+    },
+    'carbon_monoxide (μg/m³)': {
+        # ppm
+        'label': 'CO', 'scale': 1 / 1145.0, 'decimals': 1, 'daily_stat': 'mean',
+        'breakpoints': [(0.0, 4.4), (4.5, 9.4), (9.5, 12.4), (12.5, 15.4), (15.5, 30.4), (30.5, 50.4)],
+    },
+    'nitrogen_dioxide (μg/m³)': {
+        # ppb, 1-hour standard
+        'label': 'NO2', 'scale': 1 / 1.88, 'decimals': 0, 'daily_stat': 'max',
+        'breakpoints': [(0, 53), (54, 100), (101, 360), (361, 649), (650, 1249), (1250, 2049)],
+    },
+    'sulphur_dioxide (μg/m³)': {
+        # ppb, 1-hour standard
+        'label': 'SO2', 'scale': 1 / 2.62, 'decimals': 0, 'daily_stat': 'max',
+        'breakpoints': [(0, 35), (36, 75), (76, 185), (186, 304), (305, 604), (605, 1004)],
+    },
+}
+
+# Upper AQI bound, name and display colour of each category, in order
+AQI_CATEGORIES = [
+    (50, 'Good', 'green'),
+    (100, 'Moderate', 'yellow'),
+    (150, 'Unhealthy for Sensitive Groups', 'orange'),
+    (200, 'Unhealthy', 'red'),
+    (300, 'Very Unhealthy', 'purple'),
+    (500, 'Hazardous', 'maroon'),
+]
+CATEGORY_NAMES = [name for _, name, _ in AQI_CATEGORIES]
+CATEGORY_COLORS = [color for _, _, color in AQI_CATEGORIES]
+
+
+# Decimal places kept below the truncation digit before flooring. Readings
+# are float32, so 12.2 is stored as 12.19999981; without the guard it would
+# truncate to 12.1. Every scaled value below the top breakpoints is within
+# this of its decimal value.
+GUARD_DECIMALS = 3
+
+
+def sub_index(concentration, table):
+    """Piecewise-linear EPA sub-index for an array of concentrations (NaN stays NaN)."""
+    factor = 10 ** table['decimals']
+    scaled = np.round(np.asarray(concentration, dtype=np.float64) * table['scale'] * factor, GUARD_DECIMALS)
+    c = np.floor(scaled) / factor
+    c = np.clip(c, 0, None)
+    c_lo, c_hi = np.array(table['breakpoints'], dtype=np.float64).T
+    i_lo, i_hi = np.array(AQI_INDEX_BREAKPOINTS, dtype=np.float64).T
+    band = np.minimum(np.searchsorted(c_hi, c, 'left'), len(c_hi) - 1)
+    # Beyond the last breakpoint the index is capped at the top of the scale
+    c = np.minimum(c, c_hi[-1])
+    index = (i_hi[band] - i_lo[band]) / (c_hi[band] - c_lo[band]) * (c - c_lo[band]) + i_lo[band]
+    return np.round(index)
+
+
+def compute_aqi(columns, tables=AQI_TABLES):
+    """Overall AQI and dominant pollutant for aligned concentration arrays.
+
+    `columns` maps pollutant column names to arrays (a DataFrame works);
+    pollutants without a table, or missing from `columns`, are ignored.
+    Returns the AQI (float32, NaN where no pollutant was measured) and the
+    index into `tables` of the pollutant that set it (int8, -1 for none).
+    """
+    names = [name for name in tables if name in columns]
+    if not names:
+        n = len(columns) if isinstance(columns, pd.DataFrame) else len(next(iter(columns.values()), []))
+        return np.full(n, np.nan, dtype=np.float32), np.full(n, -1, dtype=np.int8)
+    stacked = np.vstack([sub_index(columns[name], tables[name]) for name in names])
+    measured = ~np.isnan(stacked)
+    any_measured = measured.any(axis=0)
+    dominant = np.argmax(np.where(measured, stacked, -1), axis=0)
+    value = np.where(any_measured, stacked[dominant, np.arange(stacked.shape[1])], np.nan)
+    table_positions = np.array([list(tables).index(name) for name in names], dtype=np.int8)
+    return value.astype(np.float32), np.where(any_measured, table_positions[dominant], -1).astype(np.int8)
+
+
+def aqi_category(aqi):
+    # Category code per value (0 = Good ... 5 = Hazardous), -1 where the AQI is missing
+    aqi = np.asarray(aqi, dtype=np.float64)
+    upper = np.array([bound for bound, _, _ in AQI_CATEGORIES[:-1]], dtype=np.float64)
+    codes = np.searchsorted(upper, aqi, 'left').astype(np.int8)
+    return np.where(np.isnan(aqi), -1, codes).astype(np.int8)
+
+
+def add_aqi_columns(df, tables=AQI_TABLES):
+    # Per-reading AQI from the hourly values, stored next to the pollutants
+    df['aqi'], df['aqi_pollutant'] = compute_aqi(df, tables)
+    df['aqi_category'] = aqi_category(df['aqi'])
+    return df
+
+
+def daily_aqi(daily_mean, daily_max, tables=AQI_TABLES):
+    """Per-day AQI from daily aggregates, using each pollutant's `daily_stat`."""
+    columns = {}
+    for name, table in tables.items():
+        source = daily_max if table['daily_stat'] == 'max' else daily_mean
+        if name in source.columns:
+            columns[name] = source[name].to_numpy()
+    value, dominant = compute_aqi(columns, tables)
+    labels = np.array([table['label'] for table in tables.values()] + [None], dtype=object)
+    return pd.DataFrame({
+        'aqi': value,
+        'category': aqi_category(value),
+        'pollutant': labels[dominant],
+    }, index=daily_mean.index)
+
+
+def category_of(aqi):
+    # (name, colour) of a single AQI value
+    code = int(aqi_category([aqi])[0])
+    if code < 0:
+        return 'No data', 'gray'
+    return CATEGORY_NAMES[code], CATEGORY_COLORS[code]
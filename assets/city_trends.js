@@ -0,0 +1,27 @@
+// Clientside month switching for City Trends (AQ_CLIENTSIDE_MONTHS=1).
+// The city payload holds every month's traces, so a month click only slices it.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    city_trends: {
+        render_month: function(payload, month, startDate, endDate) {
+            const noUpdate = window.dash_clientside.no_update;
+            // A complete date range wins over the month and is rendered on the server
+            if (!payload || (startDate && endDate)) {
+                return noUpdate;
+            }
+            const entry = payload.months[month || ''];
+            if (!entry) {
+                return noUpdate;
+            }
+            // Plotly keeps references to what it is given, so hand it a copy
+            const copy = (value) => JSON.parse(JSON.stringify(value));
+            if (entry.figure) {
+                return copy(entry.figure);
+            }
+            const layout = copy(payload.layout);
+            if (entry.title) {
+                layout.title = entry.title;
+            }
+            return {data: copy(entry.data), layout: layout};
+        }
+    }
+});
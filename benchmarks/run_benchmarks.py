@@ -0,0 +1,188 @@
+"""Time every dashboard callback against synthetic data at a range of scales.
+
+    python benchmarks/run_benchmarks.py --stations 11 50 --days 120 365 \\
+        --freq h --output bench.json [--compare previous.json]
+
+Each (stations, days, freq) combination runs in a fresh interpreter so the
+dashboard is imported against its own data directory. The figure cache is
+disabled so every call does the full work. Each callback's first call and
+its peak allocations are measured on fresh snapshots, before the repeats
+that time it warm.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+sys.path.insert(0, REPO)
+sys.path.insert(0, HERE)
+
+from synthetic import generate_city_csvs  # noqa: E402
+
+
+def callback_args(m):
+    # Typical selections for each callback, keyed by its Dash output id
+    city = m.store.cities[0]
+    month = m.default_month
+    metrics = m.store.metrics
+    # Tab values come first: callbacks of hidden tabs skip their work
+    return {
+        '..overview-summary-cards.children...overview-heatmap.figure...overview-bar-chart.figure..': ('overview', city, month, None, None, None, None, None),
+        'city-graph.figure': ('city-trends', 'pm-trends', city, month, None, None, None, None),
+        '..pollutant-bar-chart.figure...seasonal-pie-chart.figure...uv-heatmap.figure..': ('city-trends', 'pollutant-analysis', city, None),
+        '..aqi-timeseries.figure...aqi-distribution.figure..': ('city-trends', 'aqi', city, None),
+        'city_bar_chart.figure': ('analysis', metrics[0], None),
+        'scatter_plot.figure': ('analysis', metrics[0], metrics[1], [], None),
+        'correlation_matrix.figure': ('analysis', 'pearson', 'all', None),
+        '..alerts_outliers.figure...alert_counts.children..': ('analysis', ['pm2_5 (μg/m³)', 'pm10 (μg/m³)'], ['zscore', 'seasonal'], None),
+    }
+
+
+def measure(fn, args, repeat, fresh):
+    from plotly.io.json import to_json_plotly
+
+    # Cold: per-snapshot results (outliers, weekly UV grids, ...) not built yet
+    fresh()
+    start = time.perf_counter()
+    fn(*args)
+    cold = time.perf_counter() - start
+
+    fresh()
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'cold_s': cold,
+        'median_s': statistics.median(timings),
+        'min_s': min(timings),
+        'max_s': max(timings),
+        'peak_alloc_bytes': peak,
+        'response_bytes': len(to_json_plotly(out)),
+    }
+
+
+def run_worker(data_dir, stations, repeat):
+    # Runs inside the fresh interpreter started by run_config
+    os.environ['AQ_DATA_DIR'] = data_dir
+    os.environ['AQ_SNAPSHOT_DIR'] = os.path.join(data_dir, '.snapshots')
+    os.environ['AQ_CITIES'] = ','.join(stations)
+    os.environ['AQ_FIGURE_CACHE_MB'] = '0'
+
+    start = time.perf_counter()
+    import airquality_dashboard as m
+    startup = time.perf_counter() - start
+
+    args = callback_args(m)
+    callbacks = {}
+    for key, entry in m.app.callback_map.items():
+        if key not in args:
+            continue
+        fn = entry['callback'].__wrapped__
+        callbacks[f"{fn.__name__} [{key.strip('.')}]"] = measure(fn, args[key], repeat, m.store.fresh_snapshot)
+    rows = sum(len(m.store.city(city)) for city in m.store.cities)
+    return {'startup_s': startup, 'rows': rows, 'callbacks': callbacks}
+
+
+def run_config(stations, days, freq, repeat):
+    with tempfile.TemporaryDirectory() as data_dir:
+        names = generate_city_csvs(data_dir, stations, days, freq)
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', data_dir,
+               '--names', ','.join(names), '--repeat', str(repeat)]
+        # Twice: the first start parses CSVs and writes snapshots, the second reads them
+        cold = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=REPO).stdout.splitlines()[-1])
+        warm = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=REPO).stdout.splitlines()[-1])
+    warm['cold_startup_s'] = cold['startup_s']
+    warm['config'] = {'stations': stations, 'days': days, 'freq': freq}
+    return warm
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=REPO).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(current, previous):
+    def index(report):
+        return {(tuple(sorted(r['config'].items())), name): stats['median_s']
+                for r in report['results'] for name, stats in r['callbacks'].items()}
+
+    before, after = index(previous), index(current)
+    print(f"\n{'config':<40} {'callback':<60} {'before':>9} {'after':>9} {'ratio':>7}")
+    for key in sorted(after):
+        if key in before:
+            config = ' '.join(f"{k}={v}" for k, v in key[0])
+            print(f"{config:<40} {key[1][:60]:<60} {before[key]:9.4f} {after[key]:9.4f} {after[key] / before[key]:7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, nargs='+', default=[11])
+    parser.add_argument('--days', type=int, nargs='+', default=[120])
+    parser.add_argument('--freq', nargs='+', default=['h'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--names', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.names.split(','), args.repeat)))
+        return
+
+    import numpy
+    import pandas
+    import plotly
+
+    report = {
+        'meta': {
+            'git_revision': git_revision(),
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'pandas': pandas.__version__,
+            'numpy': numpy.__version__,
+            'plotly': plotly.__version__,
+            'repeat': args.repeat,
+        },
+        'results': [],
+    }
+    for stations, days, freq in itertools.product(args.stations, args.days, args.freq):
+        print(f"stations={stations} days={days} freq={freq}", flush=True)
+        result = run_config(stations, days, freq, args.repeat)
+        report['results'].append(result)
+        print(f"  {result['rows']:,} rows, startup {result['cold_startup_s']:.2f}s cold / {result['startup_s']:.2f}s warm")
+        for name, stats in result['callbacks'].items():
+            print(f"  {name[:70]:<70} {stats['cold_s'] * 1000:9.1f} ms cold {stats['median_s'] * 1000:9.1f} ms "
+                  f"{stats['peak_alloc_bytes']:>13,} B peak {stats['response_bytes']:>11,} B")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
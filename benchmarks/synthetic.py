@@ -0,0 +1,74 @@
+"""Synthetic city CSVs with the same columns as the real station exports.
+
+    python benchmarks/synthetic.py out_dir --stations 50 --days 730 --freq 15min
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+REAL_CITIES = ['Colombo', 'Kandy', 'Anuradhapura', 'Galle', 'Jaffna', 'Nuwaraeliya',
+               'Kurunegala', 'Gampaha', 'Trincomalee', 'Matara', 'Kalutara']
+
+# column -> (typical level, diurnal swing as a fraction of the level, decimals)
+COLUMNS = {
+    'pm10 (μg/m³)': (45, 0.35, 1),
+    'pm2_5 (μg/m³)': (30, 0.35, 1),
+    'carbon_monoxide (μg/m³)': (300, 0.3, 0),
+    'carbon_dioxide (ppm)': (420, 0.02, 0),
+    'nitrogen_dioxide (μg/m³)': (25, 0.5, 1),
+    'sulphur_dioxide (μg/m³)': (8, 0.4, 1),
+    'dust (μg/m³)': (3, 0.2, 0),
+    'uv_index ()': (4, 1.0, 2),
+}
+
+
+def station_names(count):
+    # Real names first so the dashboard's defaults ('Colombo', ...) still resolve
+    extra = [f"Station{i:03d}" for i in range(len(REAL_CITIES), count)]
+    return (REAL_CITIES + extra)[:count]
+
+
+def station_frame(times, rng, missing_rate=0.002, spike_rate=0.001):
+    n = len(times)
+    hour = times.hour.to_numpy() + times.minute.to_numpy() / 60
+    data = {'time': times.strftime('%Y-%m-%dT%H:%M')}
+    for col, (level, swing, decimals) in COLUMNS.items():
+        if col == 'uv_index ()':
+            # Daylight only, peaking at noon
+            values = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * rng.gamma(8, level / 8 * 2, n)
+        else:
+            diurnal = 1 + swing * np.sin((hour - 8) / 24 * 2 * np.pi)
+            values = level * diurnal * rng.gamma(6, 1 / 6, n)
+            spikes = rng.random(n) < spike_rate
+            values[spikes] *= rng.uniform(3, 8, spikes.sum())
+        values = values.round(decimals)
+        values[rng.random(n) < missing_rate] = np.nan
+        data[col] = values
+    return pd.DataFrame(data)
+
+
+def generate_city_csvs(out_dir, stations=11, days=120, freq='h', start='2024-09-01', seed=0):
+    os.makedirs(out_dir, exist_ok=True)
+    start = pd.Timestamp(start)
+    times = pd.date_range(start, start + pd.Timedelta(days=days), freq=freq, inclusive='left')
+    rng = np.random.default_rng(seed)
+    names = station_names(stations)
+    for name in names:
+        station_frame(times, rng).to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
+    return names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--stations', type=int, default=11)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--freq', default='h', help="pandas frequency, e.g. 'h' or '15min'")
+    parser.add_argument('--start', default='2024-09-01')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    names = generate_city_csvs(args.out_dir, args.stations, args.days, args.freq, args.start, args.seed)
+    print(f"Wrote {len(names)} stations to {args.out_dir}")
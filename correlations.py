@@ -0,0 +1,183 @@
+import copy
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# Bins per axis of every precomputed joint distribution
+JOINT_BINS = int(os.environ.get('AQ_JOINT_BINS', '50'))
+
+
+def _metric_matrix(df, columns):
+    # Readings as an (n, k) float64 matrix; absent columns are all-NaN
+    return np.column_stack([
+        df[col].to_numpy(dtype=np.float64) if col in df.columns else np.full(len(df), np.nan)
+        for col in columns
+    ]) if len(df) else np.empty((0, len(columns)))
+
+
+def _midranks(counts):
+    # Average rank of the readings in each bin (ties share the mean rank)
+    return np.cumsum(counts, axis=-1) - counts + (counts + 1) / 2
+
+
+class JointStats:
+    """Pairwise moments and fixed-bin 2-D histograms of every metric pair, per city.
+
+    Everything kept is a sum over readings, so stations and streamed rows are
+    folded in without revisiting earlier data. Pearson correlations are exact
+    (pairwise-complete readings); Spearman ones are computed from the
+    histograms' mid-ranks and are therefore a close approximation. Bin edges
+    are fixed when the stats are built; later readings outside them are
+    counted in the end bins.
+    """
+
+    def __init__(self, columns, edges, bins=JOINT_BINS):
+        self.columns = list(columns)
+        self.bins = bins
+        self.edges = edges
+        # Moments are accumulated around the middle of each range to stay well conditioned
+        self.shift = np.array([(e[0] + e[-1]) / 2 for e in edges])
+        self.pairs = [(i, j) for i in range(len(self.columns)) for j in range(i + 1, len(self.columns))]
+        self._pair_index = {pair: p for p, pair in enumerate(self.pairs)}
+        self._cities = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, frames, columns, bins=JOINT_BINS):
+        # Edges span every reading loaded so far, then stay fixed
+        low = np.full(len(columns), np.inf)
+        high = np.full(len(columns), -np.inf)
+        for df in frames.values():
+            values = _metric_matrix(df, columns)
+            if len(values):
+                with np.errstate(invalid='ignore'):
+                    low = np.fmin(low, np.nanmin(values, axis=0))
+                    high = np.fmax(high, np.nanmax(values, axis=0))
+        edges = []
+        for lo, hi in zip(low, high):
+            if not np.isfinite(lo):
+                lo, hi = 0.0, 1.0
+            elif hi <= lo:
+                lo, hi = lo - 0.5, hi + 0.5
+            edges.append(np.linspace(lo, hi, bins + 1))
+        stats = cls(columns, edges, bins)
+        for city, df in frames.items():
+            stats.add(city, df)
+        return stats
+
+    def _empty(self):
+        k, b = len(self.columns), self.bins
+        return {
+            'n': np.zeros((k, k)), 'sum': np.zeros((k, k)), 'sum_sq': np.zeros((k, k)), 'sum_xy': np.zeros((k, k)),
+            'marginal': np.zeros((k, b), dtype=np.uint32),
+            'joint': np.zeros((len(self.pairs), b, b), dtype=np.uint32),
+        }
+
+    def add(self, city, df):
+        values = _metric_matrix(df, self.columns)
+        if not len(values):
+            return
+        valid = ~np.isnan(values)
+        present = valid.astype(np.float64)
+        centred = np.where(valid, values - self.shift, 0.0)
+        # Bin of every reading, -1 where it is missing
+        codes = np.full(values.shape, -1, dtype=np.int32)
+        for i, edges in enumerate(self.edges):
+            column = np.searchsorted(edges, values[valid[:, i], i], 'right') - 1
+            codes[valid[:, i], i] = np.clip(column, 0, self.bins - 1)
+
+        b = self.bins
+        marginal = np.stack([np.bincount(codes[valid[:, i], i], minlength=b) for i in range(len(self.columns))])
+        joint = np.empty((len(self.pairs), b, b), dtype=np.uint32)
+        for p, (i, j) in enumerate(self.pairs):
+            both = valid[:, i] & valid[:, j]
+            joint[p] = np.bincount(codes[both, i] * b + codes[both, j], minlength=b * b).reshape(b, b)
+
+        with self._lock:
+            cell = self._cities.get(city) or self._empty()
+            # Entry [i, j] only counts readings where both i and j are present.
+            # A new cell replaces the old one, so snapshots keep what they saw.
+            self._cities[city] = {
+                'n': cell['n'] + present.T @ present,
+                'sum': cell['sum'] + centred.T @ present,
+                'sum_sq': cell['sum_sq'] + (centred * centred).T @ present,
+                'sum_xy': cell['sum_xy'] + centred.T @ centred,
+                'marginal': cell['marginal'] + marginal.astype(np.uint32),
+                'joint': cell['joint'] + joint,
+            }
+
+    def discard(self, city):
+        with self._lock:
+            self._cities.pop(city, None)
+
+    def snapshot(self):
+        with self._lock:
+            frozen = copy.copy(self)
+            frozen._cities = dict(self._cities)
+        frozen._lock = threading.Lock()
+        return frozen
+
+    def _cell(self, city=None):
+        with self._lock:
+            if city is not None:
+                return self._cities.get(city) or self._empty()
+            total = self._empty()
+            for cell in self._cities.values():
+                for key in total:
+                    total[key] += cell[key]
+            return total
+
+    @property
+    def cities(self):
+        return list(self._cities)
+
+    def rows(self, city=None):
+        cell = self._cell(city)
+        return int(cell['n'].diagonal().max()) if len(self.columns) else 0
+
+    def pearson(self, city=None):
+        cell = self._cell(city)
+        n, s = cell['n'], cell['sum']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = n * cell['sum_xy'] - s * s.T
+            var = n * cell['sum_sq'] - s * s
+            r = cov / np.sqrt(var * var.T)
+        r[(n < 2) | ~np.isfinite(r)] = np.nan
+        return pd.DataFrame(np.clip(r, -1, 1), index=self.columns, columns=self.columns)
+
+    def spearman(self, city=None):
+        cell = self._cell(city)
+        joint = cell['joint'].astype(np.float64)
+        k = len(self.columns)
+        r = np.full((k, k), np.nan)
+        if self.pairs:
+            rows, cols = joint.sum(axis=2), joint.sum(axis=1)
+            n = rows.sum(axis=1)
+            rank_x, rank_y = _midranks(rows), _midranks(cols)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                dx = rank_x - ((rank_x * rows).sum(axis=1) / n)[:, None]
+                dy = rank_y - ((rank_y * cols).sum(axis=1) / n)[:, None]
+                cov = np.einsum('pab,pa,pb->p', joint, dx, dy)
+                rho = cov / np.sqrt((rows * dx * dx).sum(axis=1) * (cols * dy * dy).sum(axis=1))
+            for (i, j), value in zip(self.pairs, rho):
+                r[i, j] = r[j, i] = value
+        # A metric is perfectly rank-correlated with itself once it varies
+        varies = (cell['marginal'] > 0).sum(axis=1) > 1
+        r[np.diag_indices(k)] = np.where(varies, 1.0, np.nan)
+        return pd.DataFrame(np.clip(r, -1, 1), index=self.columns, columns=self.columns)
+
+    def histogram(self, x_axis, y_axis, city=None):
+        """Counts (rows follow y, columns follow x) and the bin centres of both axes."""
+        i, j = self.columns.index(x_axis), self.columns.index(y_axis)
+        cell = self._cell(city)
+        if i == j:
+            counts = np.diag(cell['marginal'][i])
+        elif i < j:
+            counts = cell['joint'][self._pair_index[(i, j)]].T
+        else:
+            counts = cell['joint'][self._pair_index[(j, i)]]
+        centres = [(self.edges[c][:-1] + self.edges[c][1:]) / 2 for c in (i, j)]
+        return counts, centres[0], centres[1]
@@ -0,0 +1,624 @@
+import os
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aggregates import weekly_matrix
+from alerts import AlertEngine, QueryAlertEngine
+from aqi import AQI_CATEGORIES, CATEGORY_NAMES, add_aqi_columns, daily_aqi
+from correlations import JointStats
+from downsample import target_points
+from outliers import OutlierDetector, empty_outliers
+from rolling import RollingEngine, batch_rolling, rolling_columns
+from snapshot_cache import read_city_csv
+from storage import PandasStorage, city_column, open_storage, source_stamp
+
+
+DATA_DIR = os.environ.get('AQ_DATA_DIR', 'data')
+
+CITIES = ['Colombo', 'Kandy', 'Anuradhapura', 'Galle', 'Jaffna', 'Nuwaraeliya',
+          'Kurunegala', 'Gampaha', 'Trincomalee', 'Matara', 'Kalutara']
+if os.environ.get('AQ_CITIES'):
+    CITIES = [city.strip() for city in os.environ['AQ_CITIES'].split(',') if city.strip()]
+
+# Stations are parsed on a pool; with AQ_LAZY_LOAD=1 the store is usable at
+# once and each station is waited for only when something first reads it
+LOAD_WORKERS = int(os.environ.get('AQ_LOAD_WORKERS', str(min(8, os.cpu_count() or 1))))
+LOAD_POOL = os.environ.get('AQ_LOAD_POOL', 'thread')  # or 'process'
+LAZY_LOAD = os.environ.get('AQ_LAZY_LOAD', '0') == '1'
+# With AQ_RELOAD_INTERVAL_S set, changed CSVs are re-read and swapped in without a restart
+RELOAD_INTERVAL_S = float(os.environ.get('AQ_RELOAD_INTERVAL_S', '0'))
+
+POLLUTANTS = ['pm10 (μg/m³)', 'pm2_5 (μg/m³)', 'carbon_monoxide (μg/m³)',
+              'carbon_dioxide (ppm)', 'nitrogen_dioxide (μg/m³)',
+              'sulphur_dioxide (μg/m³)', 'dust (μg/m³)', 'uv_index ()']
+
+
+# Measurements are stored as float32: sensors report far fewer significant
+# digits than float32 keeps, and it halves the footprint of every reading.
+MEASUREMENT_DTYPE = np.float32
+
+
+def prepare_city_frame(city, df):
+    # Everything the callbacks need is derived here, once per station
+    df = df.copy()
+    df['time'] = pd.to_datetime(df['time']).astype('datetime64[ns]')
+    for col in POLLUTANTS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(MEASUREMENT_DTYPE)
+    df = df.sort_values('time', kind='stable').reset_index(drop=True)
+    add_aqi_columns(df)
+    df['City'] = city_column(city, len(df))
+    return df
+
+
+def csv_path(data_dir, city):
+    return os.path.join(data_dir, f"{city}.csv")
+
+
+def load_city_frame(city, data_dir):
+    # Runs on the loader pool; returns (frame, source stamp, None) or (None, None, error message).
+    # The stamp is taken before reading, so a CSV written meanwhile is seen as changed.
+    try:
+        source = source_stamp(csv_path(data_dir, city))
+        raw = read_city_csv(csv_path(data_dir, city))
+        df = prepare_city_frame(city, raw)
+        # The full-history rolling windows are vectorized, so they run here on the pool too
+        return df.assign(**batch_rolling(df)), source, None
+    except Exception as e:
+        print(f"Error loading data for {city}: {e}")
+        return None, None, str(e)
+
+
+def month_bounds(month_key):
+    # 'YYYY-MM' -> [first instant of the month, first instant of the next)
+    start = pd.Timestamp(f"{month_key}-01")
+    return start, start + pd.offsets.MonthBegin(1)
+
+
+def week_bounds(day):
+    # The Monday-to-Sunday week containing `day`
+    start = pd.Timestamp(day).normalize()
+    start -= pd.Timedelta(days=start.weekday())
+    return start, start + pd.Timedelta(days=7)
+
+
+def date_range_bounds(start_date, end_date):
+    # Inclusive calendar dates, as picked in a DatePickerRange
+    return pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+
+
+def month_label(month_start):
+    return pd.Timestamp(month_start).strftime('%B %Y')
+
+
+def legacy_frame(df):
+    # The layout before compaction: float64 readings, per-row city strings,
+    # datetime.date objects and a per-row daily_mean_uv column
+    derived = ['aqi', 'aqi_pollutant', 'aqi_category'] + rolling_columns()
+    legacy = df.drop(columns=derived, errors='ignore')
+    legacy = legacy.astype({col: 'float64' for col in POLLUTANTS if col in legacy.columns})
+    legacy['City'] = legacy['City'].astype(object)
+    legacy['date'] = legacy['time'].dt.date
+    legacy['month'] = legacy['time'].dt.month.astype('int64')
+    legacy['daily_mean_uv'] = legacy.groupby('date')['uv_index ()'].transform('mean')
+    return legacy
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class StationFrames(Mapping):
+    # Read-through {city: frame} view of `columns`, so a database-backed
+    # store never materializes every station at once
+    def __init__(self, snapshot, cities, columns=POLLUTANTS):
+        self.snapshot = snapshot
+        self.columns = columns
+        self._cities = list(cities)
+
+    def __getitem__(self, city):
+        if city not in self._cities:
+            raise KeyError(city)
+        return self.snapshot.query(city, columns=self.columns)
+
+    def __iter__(self):
+        return iter(self._cities)
+
+    def __len__(self):
+        return len(self._cities)
+
+
+class Snapshot:
+    """One immutable version of the dataset; callbacks only ever read from these.
+
+    Holds a frozen copy of the storage and of the pairwise statistics as of
+    `version`. Later writes, reloads included, go into the next snapshot, so a
+    request keeps one consistent view until it finishes. Derived views are
+    built on first use and kept for the snapshot's lifetime instead of being
+    invalidated. A station still loading when the snapshot was taken is read
+    from the latest snapshot once it has loaded, and from that same one after.
+    """
+
+    def __init__(self, store, version, storage, cities, loading=(), joint=None, alerts=None, previous=None, changed=(),
+                 appended=None, stamps=None):
+        self._store = store
+        self.version = version
+        self._stamps = stamps or {}
+        self.storage = storage
+        self._cities = list(cities)
+        self._loading = frozenset(loading)
+        self._joint = joint
+        self._lock = threading.RLock()
+        self._alerts = alerts
+        self._flagged = None
+        self._weekly_uv = {}
+        self._outliers = {}
+        self._resolved = {}
+        if previous is not None:
+            # Per-station results carry over unless that station changed
+            self._weekly_uv.update((city, value) for city, value in dict(previous._weekly_uv).items()
+                                   if city not in changed)
+            # Outliers also carry over for stations that only gained rows: those
+            # rows are counted as pending and scored on first use
+            appended = appended or {}
+            for city, (flagged, fits, pending) in dict(previous._outliers).items():
+                if city not in changed or city in appended:
+                    self._outliers[city] = (flagged, fits, pending + appended.get(city, 0))
+
+    def _settled(self, name=None):
+        # This snapshot, or a later one in which `name` (every station if None) has loaded
+        pending = name in self._loading if name is not None else self._loading
+        if not pending:
+            return self
+        if name not in self._resolved:
+            self._resolved[name] = self._store.settled(name)
+        return self._resolved[name]
+
+    def stamp(self, name=None):
+        # Version at which `name` last changed; the dataset version for
+        # everything else, including stations still loading
+        if name is None or name in self._loading or name not in self._stamps:
+            return self.version
+        return self._stamps[name]
+
+    @property
+    def cities(self):
+        # Stations that were loaded or still loading; failed ones are left out
+        return list(self._cities)
+
+    @property
+    def metrics(self):
+        # Numeric columns present in at least one station, in canonical order.
+        # Until every station is in, all canonical columns are assumed.
+        if self._loading:
+            return list(POLLUTANTS)
+        present = self.storage.present_columns()
+        return [col for col in POLLUTANTS if col in present]
+
+    def city(self, name):
+        # Shallow view: shares the column data, and adding or replacing a column
+        # on it leaves the store alone. Callbacks only read the values.
+        return self._settled(name).storage.frame(name).copy(deep=False)
+
+    def last_time(self, name):
+        return self._settled(name).storage.last_time(name)
+
+    def query(self, name, start=None, end=None, columns=None):
+        # Readings in [start, end), time-ordered; only `columns` when given
+        return self._settled(name).storage.query(name, start, end, columns)
+
+    def query_daily(self, name, start=None, end=None, stat='mean', columns=None):
+        return self._settled(name).storage.daily(name, stat, columns, start, end)
+
+    def resolution(self, name, start=None, end=None, n_out=None):
+        # Pyramid level whose point count in [start, end) fits the chart
+        return self._settled(name).storage.resolution(name, start, end, n_out or target_points())
+
+    def query_level(self, name, level, start=None, end=None):
+        # Buckets of one pyramid level overlapping [start, end), columns (stat, pollutant)
+        return self._settled(name).storage.level(name, level, start, end)
+
+    def monthly(self, name, stat='mean', columns=None):
+        return self._settled(name).storage.monthly(name, stat, columns)
+
+    def rows(self):
+        # Readings across every station, counted without reading them
+        snapshot = self._settled()
+        return sum(snapshot.storage.rows(city) for city in snapshot.cities)
+
+    def city_means(self, columns=None):
+        snapshot = self._settled()
+        return snapshot.storage.city_means(snapshot.cities, columns)
+
+    def months(self, name=None):
+        # Year-aware month starts with data, for one station or all of them.
+        # Across stations only those already loaded count, so the month
+        # pickers never wait; they are refreshed as the dataset version moves.
+        if name:
+            return sorted(self._settled(name).storage.month_starts(name))
+        starts = set()
+        for city in self._cities:
+            if city not in self._loading:
+                starts.update(self.storage.month_starts(city))
+        return sorted(starts)
+
+    def daily_uv(self, name):
+        daily = self._settled(name).storage.daily(name, columns=['uv_index ()'])
+        return daily['uv_index ()'].rename('daily_mean_uv').rename_axis('date').reset_index()
+
+    def weekly_uv(self, name):
+        if name not in self._weekly_uv:
+            daily = self.daily_uv(name)
+            self._weekly_uv[name] = weekly_matrix(daily['date'], daily['daily_mean_uv'])
+        return self._weekly_uv[name]
+
+    def daily_aqi(self, name, start=None, end=None):
+        # Per-day AQI from the stored daily means and maxima
+        storage = self._settled(name).storage
+        mean = storage.daily(name, 'mean', start=start, end=end)
+        return daily_aqi(mean, storage.daily(name, 'max', start=start, end=end)).rename_axis('date')
+
+    def aqi_distribution(self, start=None, end=None):
+        # Days in each AQI category per city
+        counts = {}
+        for city in self._cities:
+            codes = self.daily_aqi(city, start, end)['category'].to_numpy()
+            counts[city] = np.bincount(codes[codes >= 0], minlength=len(AQI_CATEGORIES))
+        return pd.DataFrame.from_dict(counts, orient='index', columns=CATEGORY_NAMES).rename_axis('City')
+
+    def joint_stats(self):
+        if self._joint is None:
+            # Built once every station is in; snapshots taken before that keep the first copy they read
+            self._store.build_joint_stats()
+            with self._lock:
+                if self._joint is None:
+                    self._joint = self._store.latest().joint_stats()
+        return self._joint
+
+    def alerts(self):
+        snapshot = self._settled()
+        if snapshot is not self:
+            return snapshot.alerts()
+        with self._lock:
+            if self._alerts is None:
+                # In a database the thresholds are evaluated by queries instead of resident bits
+                self._alerts = QueryAlertEngine(self.storage, self._cities)
+        return self._alerts
+
+    def outliers(self, pool='thread'):
+        # Statistically flagged readings of every city; stations unchanged since
+        # the previous version keep their results, and streamed rows are scored
+        # on their own against the statistics of the station's history.
+        # Requests score on threads; the store scores on its configured pool
+        # while loading, before any request can be running (see DataStore).
+        snapshot = self._settled()
+        if snapshot is not self:
+            return snapshot.outliers(pool)
+        with self._lock:
+            if self._flagged is None:
+                detector = self._store.outlier_detector
+                missing = StationFrames(self, [city for city in self._cities if city not in self._outliers])
+                if missing:
+                    self._outliers.update((city, (flagged, fits, 0))
+                                          for city, (flagged, fits) in detector.detect(missing, pool).items())
+                for city in self._cities:
+                    flagged, fits, pending = self._outliers[city]
+                    if pending:
+                        tail = self.storage.tail(city, detector.params['window'] + pending, detector.pollutants)
+                        self._outliers[city] = (*detector.extend((flagged, fits), tail, pending), 0)
+                frames = [self._outliers[city][0] for city in self._cities]
+                flagged = pd.concat(frames, ignore_index=True) if frames else empty_outliers()
+                flagged['pollutant'] = flagged['pollutant'].astype('category')
+                cities = np.repeat(np.arange(len(frames), dtype=np.int16), [len(df) for df in frames])
+                flagged['City'] = pd.Categorical.from_codes(cities, categories=self._cities)
+                self._flagged = flagged
+        return self._flagged.copy(deep=False)
+
+    def memory_report(self):
+        # Footprint per station in the compact layout vs. the legacy one
+        snapshot = self._settled()
+        rows = []
+        for city in snapshot.cities:
+            df = snapshot.storage.frame(city)
+            rows.append({'city': city, 'rows': len(df),
+                         'legacy_bytes': frame_bytes(legacy_frame(df)),
+                         'compact_bytes': frame_bytes(df)})
+        report = pd.DataFrame(rows, columns=['city', 'rows', 'legacy_bytes', 'compact_bytes'])
+        report.loc[len(report)] = ['total', report['rows'].sum(),
+                                   report['legacy_bytes'].sum(), report['compact_bytes'].sum()]
+        report['ratio'] = report['compact_bytes'] / report['legacy_bytes']
+        return report
+
+
+class DataStore:
+    """Canonical copy of every station, published to readers as immutable snapshots.
+
+    Readings live in a storage backend (see storage.py): in memory by
+    default, or in an embedded database that queries are pushed down to.
+    Only the loader, the streaming ingestor and `reload()` write, under one
+    lock; each write bumps `version`. Readers get a frozen `Snapshot` of the
+    latest version, or of the one pinned to their request with `pin()`.
+    Reads made on the store itself are answered by that snapshot.
+
+    Stations are parsed concurrently. With `lazy=True` the constructor returns
+    straight away and a background thread adds stations as they finish;
+    anything that reads a station first waits for that station only.
+    Outliers are scored once everything is in, so the alert view reads
+    precomputed results: on the outlier pool when loading eagerly, and on
+    threads in the background thread, which runs next to the server.
+    """
+
+    def __init__(self, cities=CITIES, data_dir=DATA_DIR, workers=LOAD_WORKERS, pool=LOAD_POOL, lazy=LAZY_LOAD,
+                 storage=None):
+        self.data_dir = data_dir
+        self.workers = workers
+        self.pool = pool
+        self.version = 0
+        self.storage = storage or open_storage(POLLUTANTS, data_dir)
+        self.rolling = RollingEngine()
+        # Resident stations keep their exceedance bits up to date as rows arrive
+        self._alerts = AlertEngine() if self.storage.resident else None
+        self.outlier_detector = OutlierDetector(POLLUTANTS, cache_dir=os.path.join(data_dir, '.outliers'))
+        self.load_errors = {}
+        self._order = list(cities)
+        self._loaded = set()
+        self._loading = {}
+        self._load_lock = threading.RLock()
+        self._joint = None
+        self._snapshot = None
+        self._changed = set()
+        # Rows appended per station since the last snapshot, and the version
+        # at which each station last changed
+        self._appended = {}
+        self._stamps = {}
+        self._pinned = threading.local()
+        self._reloading = None
+        # Stations ingested on an earlier start from the same CSV are not parsed again
+        todo = [city for city in cities if not self.storage.is_current(city, csv_path(data_dir, city))]
+        self._loaded.update(city for city in cities if city not in todo)
+        self._stamps.update((city, 0) for city in self._loaded)
+        if todo:
+            executor = self._executor()
+            for city in todo:
+                self._loading[city] = executor.submit(load_city_frame, city, data_dir)
+            executor.shutdown(wait=False)
+        if cities:
+            if lazy:
+                threading.Thread(target=self._load_all, args=('thread',), name='station-prefetch', daemon=True).start()
+            else:
+                self._load_all(self.outlier_detector.pool)
+
+    def __getattr__(self, name):
+        # Reads on the store itself go to the current snapshot
+        if name.startswith('_') or not hasattr(Snapshot, name):
+            raise AttributeError(name)
+        return getattr(self.snapshot(), name)
+
+    def _executor(self):
+        return (ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor)(max_workers=max(1, self.workers))
+
+    def _ensure(self, city):
+        # Add a station once its parse has finished; a no-op after that
+        future = self._loading.get(city)
+        if future is None:
+            return
+        df, source, error = future.result()
+        with self._load_lock:
+            if city in self._loading:
+                if df is not None:
+                    self._add_frame(city, df, source)
+                else:
+                    self.load_errors[city] = error
+                    # The station drops out of `cities`
+                    self.version += 1
+                del self._loading[city]
+
+    def _ensure_all(self):
+        # In configured order, so the aggregates and `cities` do not depend on timing
+        for city in list(self._order):
+            self._ensure(city)
+
+    def _load_all(self, outlier_pool):
+        self._ensure_all()
+        self.build_joint_stats()
+        self.latest().outliers(outlier_pool)
+
+    @property
+    def ready(self):
+        return not self._loading
+
+    @property
+    def read_only(self):
+        return self.storage.read_only
+
+    def load_status(self):
+        return {'ready': self.ready, 'loaded': len(self._loaded),
+                'loading': list(self._loading), 'failed': dict(self.load_errors)}
+
+    def _cities(self):
+        return [city for city in self._order if city in self._loaded or city in self._loading]
+
+    def _freeze(self, carry=True):
+        changed, self._changed = self._changed, set()
+        appended, self._appended = self._appended, {}
+        cities = self._cities()
+        return Snapshot(self, self.version, self.storage.snapshot(), cities, list(self._loading),
+                        joint=None if self._joint is None else self._joint.snapshot(),
+                        alerts=None if self._alerts is None else self._alerts.snapshot(cities),
+                        previous=self._snapshot if carry else None, changed=changed, appended=appended,
+                        stamps=dict(self._stamps))
+
+    def latest(self):
+        # Frozen at most once per version, when first asked for
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != self.version:
+            with self._load_lock:
+                if self._snapshot is None or self._snapshot.version != self.version:
+                    self._snapshot = self._freeze()
+                snapshot = self._snapshot
+        return snapshot
+
+    def fresh_snapshot(self):
+        # Replace the latest snapshot with one of the same version that starts
+        # with no per-station results, as after a restart; for measuring cold reads
+        with self._load_lock:
+            self._snapshot = self._freeze(carry=False)
+            return self._snapshot
+
+    def snapshot(self):
+        # The snapshot pinned to this thread's request, else the latest one
+        return getattr(self._pinned, 'snapshot', None) or self.latest()
+
+    def pin(self):
+        # Everything this thread reads until unpin() comes from one version
+        self._pinned.snapshot = self.latest()
+        return self._pinned.snapshot
+
+    def unpin(self):
+        self._pinned.snapshot = None
+
+    def settled(self, name=None):
+        # The latest snapshot once `name` (every station if None) has loaded
+        if name is None:
+            self._ensure_all()
+        else:
+            self._ensure(name)
+        return self.latest()
+
+    def build_joint_stats(self):
+        # Pairwise statistics need every station for their bin ranges. They are
+        # built from a snapshot, so writers aren't held up, and adopted only if
+        # nothing was written meanwhile; from then on writes keep them current.
+        self._ensure_all()
+        while self._joint is None:
+            snapshot = self.latest()
+            joint = JointStats.build(StationFrames(snapshot, snapshot.cities), POLLUTANTS)
+            with self._load_lock:
+                if self._joint is None and self.version == snapshot.version:
+                    self._joint = joint
+                    # Republished at the same version, now with the statistics
+                    self._snapshot = self._freeze()
+
+    @classmethod
+    def from_frames(cls, frames, data_dir=DATA_DIR, read_only=False, sources=None):
+        # Frames that are already prepared, with the stamps of the CSVs they
+        # were read from if known. Frames attached from shared memory are
+        # read-only: the process that published them owns the data, so
+        # streaming and reloading are left to it.
+        store = cls(cities=[], data_dir=data_dir, storage=PandasStorage(POLLUTANTS))
+        for city, df in frames.items():
+            store._add_frame(city, df, (sources or {}).get(city))
+        store.build_joint_stats()
+        store.storage.read_only = read_only
+        return store
+
+    @classmethod
+    def from_storage(cls, storage, data_dir=DATA_DIR):
+        # Stations another process already ingested, e.g. the gunicorn master
+        store = cls(cities=[], data_dir=data_dir, storage=storage)
+        stored = storage.cities
+        store._order = [city for city in CITIES if city in stored] + sorted(set(stored) - set(CITIES))
+        store._loaded.update(stored)
+        store._stamps.update((city, 0) for city in stored)
+        store.build_joint_stats()
+        return store
+
+    def _add_city(self, city, raw):
+        self._add_frame(city, prepare_city_frame(city, raw))
+
+    def _add_frame(self, city, df, source=None):
+        # Adds or replaces a station; callers hold the load lock
+        if city not in self._order:
+            self._order.append(city)
+        df = self.rolling.attach(city, df)
+        if self._joint is not None:
+            self._joint.discard(city)
+            self._joint.add(city, df)
+        if self._alerts is not None:
+            self._alerts.discard(city)
+            self._alerts.add(city, df)
+        self.storage.add(city, df, source)
+        self._loaded.add(city)
+        self._changed.add(city)
+        self._appended.pop(city, None)
+        self.version += 1
+        self._stamps[city] = self.version
+
+    def append(self, city, raw_rows):
+        # Fold newly arrived readings into the stored aggregates straight away
+        self._ensure(city)
+        with self._load_lock:
+            if city not in self._loaded:
+                self._add_city(city, raw_rows)
+                return len(raw_rows)
+            rows = prepare_city_frame(city, raw_rows)
+            last = self.storage.last_time(city)
+            rows = rows[rows['time'] > last]
+            if rows.empty:
+                return 0
+            if not self.rolling.has(city) and last > pd.Timestamp.min:
+                # Taken from the database as ingested earlier: rebuild the windows from its tail
+                self.rolling.seed(city, self.storage.query(city, last - self.rolling.span))
+            # Only the new readings go through the windows; history is not rescanned
+            rows = rows.assign(**self.rolling.push_frame(city, rows))
+            self.storage.append(city, rows)
+            if self._joint is not None:
+                self._joint.add(city, rows)
+            if self._alerts is not None:
+                self._alerts.add(city, rows)
+            # Rows appended to a station replaced since the last snapshot are
+            # not tracked: that station is scored from scratch anyway
+            if city not in self._changed or city in self._appended:
+                self._appended[city] = self._appended.get(city, 0) + len(rows)
+            self._changed.add(city)
+            self.version += 1
+            self._stamps[city] = self.version
+        return len(rows)
+
+    def reload(self):
+        """Re-read every station whose CSV changed, in the background.
+
+        The new data is published as one version once every changed station
+        is parsed; requests already running finish on the snapshot they
+        pinned. Returns False if a reload is already running.
+        """
+        if self.read_only:
+            raise RuntimeError("A read-only store cannot be reloaded")
+        with self._load_lock:
+            if self._reloading is not None and self._reloading.is_alive():
+                return False
+            self._reloading = threading.Thread(target=self._reload, name='station-reload', daemon=True)
+            self._reloading.start()
+        return True
+
+    def watch(self, interval=RELOAD_INTERVAL_S):
+        # Look for changed CSVs every `interval` seconds; set the returned event to stop
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.reload()
+        threading.Thread(target=run, name='station-watch', daemon=True).start()
+        return stop
+
+    def _reload(self):
+        self._ensure_all()
+        changed = [city for city in self._order
+                   if not self.storage.is_current(city, csv_path(self.data_dir, city))]
+        if not changed:
+            return
+        # Parsed without the lock; readers and the ingestor carry on meanwhile
+        with self._executor() as executor:
+            frames = list(executor.map(load_city_frame, changed, [self.data_dir] * len(changed)))
+        with self._load_lock:
+            for city, (df, source, error) in zip(changed, frames):
+                # A station that fails to parse keeps its previous data
+                if df is not None:
+                    self.load_errors.pop(city, None)
+                    self._add_frame(city, df, source)
+        # Rescored here rather than in the first request that needs them
+        self.latest().outliers('thread')
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# The server can't see the browser, so size traces for a typical full-width chart
+CHART_WIDTH_PX = int(os.environ.get('AQ_CHART_WIDTH_PX', '1200'))
+POINTS_PER_PIXEL = 2
+DOWNSAMPLE_METHOD = os.environ.get('AQ_DOWNSAMPLE', 'lttb')
+
+
+def target_points(width_px=CHART_WIDTH_PX):
+    return width_px * POINTS_PER_PIXEL
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets; returns the indices of the kept points
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    kept = np.empty(n_out, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def minmax(x, y, n_out):
+    # Keep the lowest and highest reading of each bucket so spikes survive
+    n = len(x)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    # Two points per bucket, leaving room for both endpoints
+    buckets = np.arange(n) * ((n_out - 2) // 2) // n
+    order = np.lexsort((np.asarray(y), buckets))
+    starts = np.flatnonzero(np.r_[True, buckets[order][1:] != buckets[order][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+
+METHODS = {'lttb': lttb, 'minmax': minmax}
+
+
+def downsample_series(times, values, n_out=None, method=DOWNSAMPLE_METHOD):
+    """Reduce one trace to about `n_out` points; missing readings are dropped first."""
+    n_out = n_out or target_points()
+    mask = values.notna().to_numpy()
+    times, values = times[mask], values[mask]
+    if len(values) <= n_out:
+        return times, values
+    kept = METHODS[method](times.to_numpy().astype('datetime64[ns]').astype(np.int64), values.to_numpy(), n_out)
+    return times.iloc[kept], values.iloc[kept]
+
+
+def zoom_range(relayout_data, axis='xaxis'):
+    # Plotly reports zooms as either 'xaxis.range[0]'/'xaxis.range[1]' or 'xaxis.range'
+    if not relayout_data:
+        return None
+    if f'{axis}.range[0]' in relayout_data and f'{axis}.range[1]' in relayout_data:
+        bounds = relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]']
+    elif f'{axis}.range' in relayout_data:
+        bounds = relayout_data[f'{axis}.range']
+    else:
+        return None
+    return tuple(str(pd.Timestamp(b)) for b in bounds)
+
+
+def is_autorange(relayout_data, axis='xaxis'):
+    return bool(relayout_data) and bool(relayout_data.get(f'{axis}.autorange'))
@@ -0,0 +1,127 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+
+FIGURE_CACHE_MB = float(os.environ.get('AQ_FIGURE_CACHE_MB', '64'))
+WARM_FIGURE_CACHE = os.environ.get('AQ_WARM_FIGURE_CACHE', '0') == '1'
+
+
+def _freeze(value):
+    # Dash passes checklist values as lists; make them usable as dict keys
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def response_size(value):
+    return len(to_json_plotly(value))
+
+
+class FigureCache:
+    """LRU cache of callback responses, bounded by their serialized size.
+
+    Each entry is tagged with the stamp of the data it was computed from:
+    `stamp_fn(city)` for responses about one station, `stamp_fn()` for the
+    rest. An entry whose stamp has moved on is dropped when next looked up,
+    so new readings in one station leave the other stations' entries alone;
+    stale entries nobody asks for again age out of the LRU.
+    """
+
+    def __init__(self, max_bytes, stamp_fn=lambda city=None: 0, on_lookup=None, transform=None):
+        self.max_bytes = max_bytes
+        self.stamp_fn = stamp_fn
+        # Called with True/False after every memoized lookup, e.g. for metrics
+        self.on_lookup = on_lookup
+        # Applied once to each freshly computed response (value, function name)
+        # so the cache holds what is actually sent
+        self.transform = transform
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._warmers = []
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                self.bytes -= self._entries.pop(key)[1]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, stamp):
+        if self.max_bytes <= 0:
+            # Caching is off; don't serialize the response only to drop it
+            return
+        size = response_size(value)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, stamp)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def memoize(self, warm=(), versioned=False, city=None):
+        # versioned: the last argument is the data-version trigger, which the
+        # cache already accounts for, so it is left out of the key.
+        # city: position of the argument naming the one station the response
+        # depends on; without it any change to the dataset invalidates it.
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args):
+                key = (fn, _freeze(args[:-1] if versioned else args))
+                # Taken before computing, so rows arriving meanwhile make the entry stale
+                stamp = self.stamp_fn() if city is None else self.stamp_fn(args[city])
+                hit, value = self.get(key, stamp)
+                if self.on_lookup is not None:
+                    self.on_lookup(hit)
+                if hit:
+                    return value
+                value = fn(*args)
+                if self.transform is not None:
+                    value = self.transform(value, fn.__name__)
+                self.put(key, value, stamp)
+                return value
+
+            for args in warm:
+                self._warmers.append((wrapper, tuple(args) + ((None,) if versioned else ())))
+            return wrapper
+        return decorator
+
+    def warm(self):
+        for wrapper, args in self._warmers:
+            try:
+                wrapper(*args)
+            except Exception as e:
+                print(f"Could not warm {wrapper.__name__}{args}: {e}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'dataset_version': self.stamp_fn(),
+            }
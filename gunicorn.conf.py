@@ -0,0 +1,147 @@
+# gunicorn -c gunicorn.conf.py airquality_dashboard:server
+#
+# The master loads every station once and publishes it to shared memory;
+# workers attach read-only, so adding workers doesn't duplicate the dataset.
+# With a database backend (AQ_STORAGE=sqlite|duckdb) the database file is
+# what is shared: the master ingests into it and workers open it read-only.
+#
+# The master also owns reloads. On SIGHUP (sent by POST /reload in any
+# worker, or by the watcher below when AQ_RELOAD_INTERVAL_S is set) it
+# re-reads the changed CSVs, publishes the result and gunicorn restarts the
+# workers on it. gunicorn re-runs this file on SIGHUP, so nothing is kept in
+# its globals: the current segment is the one named in AQ_SHARED_DATA.
+import os
+import signal
+import threading
+import time
+
+bind = os.environ.get('AQ_BIND', '0.0.0.0:8865')
+workers = int(os.environ.get('AQ_WORKERS', '4'))
+# Callbacks only read immutable snapshots, so each worker can serve requests on several threads
+threads = int(os.environ.get('AQ_THREADS', '4'))
+
+
+def _new_release():
+    # Workers count dataset versions from scratch; this tells clients they are on new data
+    os.environ['AQ_DATA_RELEASE'] = str(time.time_ns())
+
+
+def on_starting(server):
+    from data_store import DataStore
+    from shared_data import publish_frames
+
+    # Workers ask the master to reload instead of reloading themselves
+    os.environ['AQ_MASTER_PID'] = str(os.getpid())
+    _new_release()
+    # Workers only start once everything is published, so there is nothing to gain from lazy loading
+    store = DataStore(lazy=False)
+    if not store.storage.resident:
+        # Workers must not inherit the master's connection
+        store.storage.close()
+        os.environ['AQ_STORAGE_READ_ONLY'] = '1'
+        server.log.info("Ingested %d stations into %s", len(store.cities), store.storage.path)
+        return
+    name = f"aq-{os.getpid()}"
+    publish_frames(name, {city: store.city(city) for city in store.cities},
+                   {city: store.storage.source(city) for city in store.cities})
+    # Forked workers inherit this and attach instead of loading the CSVs
+    os.environ['AQ_SHARED_DATA'] = name
+    server.log.info("Published %d stations to shared memory as %s", len(store.cities), name)
+
+
+def _changed_stations():
+    # {city: CSV stamp} of the stations whose CSV differs from what the workers were given
+    from data_store import CITIES, DATA_DIR, POLLUTANTS, csv_path
+    from shared_data import published_sources
+    from storage import open_storage, source_stamp
+
+    stamps = {}
+    for city in CITIES:
+        try:
+            stamps[city] = source_stamp(csv_path(DATA_DIR, city))
+        except OSError:
+            continue
+    name = os.environ.get('AQ_SHARED_DATA')
+    if name:
+        published = published_sources(name)
+        return {city: stamp for city, stamp in stamps.items() if published.get(city) != stamp}
+    storage = open_storage(POLLUTANTS, DATA_DIR, read_only=True)
+    try:
+        return {city: stamp for city, stamp in stamps.items()
+                if not storage.is_current(city, csv_path(DATA_DIR, city))}
+    finally:
+        storage.close()
+
+
+def when_ready(server):
+    from data_store import RELOAD_INTERVAL_S
+
+    if not RELOAD_INTERVAL_S:
+        return
+
+    def watch():
+        signalled = {}
+        while True:
+            time.sleep(RELOAD_INTERVAL_S)
+            try:
+                changed = _changed_stations()
+            except Exception as e:
+                server.log.warning("Could not check the station CSVs: %s", e)
+                continue
+            # Once per change, so a CSV that fails to parse doesn't restart the workers every interval
+            if changed and changed != signalled:
+                server.log.info("Changed station CSVs: %s", ', '.join(changed))
+                os.kill(os.getpid(), signal.SIGHUP)
+            signalled = changed
+    threading.Thread(target=watch, name='station-watch', daemon=True).start()
+
+
+def on_reload(server):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from data_store import DATA_DIR, LOAD_WORKERS, DataStore, load_city_frame
+    from shared_data import republish, unlink_frames
+    from storage import STORAGE_BACKEND
+
+    name = os.environ.get('AQ_SHARED_DATA')
+    if not name:
+        if STORAGE_BACKEND == 'duckdb':
+            # DuckDB can't be opened for writing while the workers have it open
+            server.log.warning("Reloading needs a restart with AQ_STORAGE=duckdb")
+            return
+        # Re-ingests the changed stations as a new generation; workers still on
+        # the previous one finish their requests on it
+        store = DataStore(lazy=False)
+        store.storage.close()
+        _new_release()
+        server.log.info("Reloaded %d stations into %s", len(store.cities), store.storage.path)
+        return
+
+    changed = _changed_stations()
+    if not changed:
+        server.log.info("No station CSV changed")
+        return
+    with ThreadPoolExecutor(max_workers=max(1, LOAD_WORKERS)) as executor:
+        loaded = dict(zip(changed, executor.map(load_city_frame, changed, [DATA_DIR] * len(changed))))
+    frames = {city: df for city, (df, _, _) in loaded.items() if df is not None}
+    sources = {city: source for city, (df, source, _) in loaded.items() if df is not None}
+    for city, (df, _, error) in loaded.items():
+        if df is None:
+            # The workers keep the station's previous data
+            server.log.warning("Could not reload %s: %s", city, error)
+    if not frames:
+        return
+    new_name = f"aq-{os.getpid()}-{time.time_ns()}"
+    republish(name, new_name, frames, sources)
+    os.environ['AQ_SHARED_DATA'] = new_name
+    _new_release()
+    # Workers still attached to the old segment keep it until they exit
+    unlink_frames(name)
+    server.log.info("Republished %s as %s", ', '.join(frames), new_name)
+
+
+def on_exit(server):
+    from shared_data import unlink_frames
+
+    if os.environ.get('AQ_SHARED_DATA'):
+        unlink_frames(os.environ['AQ_SHARED_DATA'])
@@ -0,0 +1,186 @@
+import cProfile
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlparse
+
+from flask import Response, has_request_context, request
+
+
+PROFILE_DIR = os.environ.get('AQ_PROFILE_DIR', 'profiles')
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+
+_current = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class CallbackMetrics:
+    """Per-callback timings, response sizes and cache results, in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _get(self, name, key, buckets):
+        series = self._series.setdefault(name, {})
+        if key not in series:
+            series[key] = Histogram(buckets) if buckets else 0
+        return series[key]
+
+    def observe(self, name, key, value, buckets=SECONDS_BUCKETS):
+        with self._lock:
+            self._get(name, key, buckets).observe(value)
+
+    def increment(self, name, key):
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            series[key] = series.get(key, 0) + 1
+
+    def render(self):
+        help_text = {
+            'aq_callback_seconds': ('histogram', 'Wall time of each Dash callback'),
+            'aq_callback_phase_seconds': ('histogram', 'Callback time split into pandas work and figure construction'),
+            'aq_callback_response_bytes': ('histogram', 'Serialized size of each callback response'),
+            'aq_callback_cache_total': ('counter', 'Figure cache lookups made by each callback'),
+            'aq_callback_errors_total': ('counter', 'Callbacks that raised'),
+        }
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._series.items()):
+                kind, text = help_text.get(name, ('untyped', name))
+                lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}']
+                for key, value in sorted(series.items()):
+                    labels = ','.join(f'{k}="{v}"' for k, v in key)
+                    if isinstance(value, Histogram):
+                        lines.extend(value.lines(name, labels))
+                    else:
+                        lines.append(f'{name}{{{labels}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = CallbackMetrics()
+
+
+@contextmanager
+def phase(name):
+    # Time a section of the running callback, e.g. `with phase('figure'):`
+    record = getattr(_current, 'record', None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if record is not None:
+            record[name] = record.get(name, 0.0) + time.perf_counter() - start
+
+
+def record_cache_access(hit):
+    callback = getattr(_current, 'callback', None)
+    if callback is not None:
+        metrics.increment('aq_callback_cache_total', (('callback', callback), ('result', 'hit' if hit else 'miss')))
+
+
+def _profiling_requested():
+    # ?profile=1 on the callback request itself, or on the page that made it
+    if not has_request_context():
+        return False
+    if request.args.get('profile') == '1':
+        return True
+    referrer = request.referrer or ''
+    return parse_qs(urlparse(referrer).query).get('profile') == ['1']
+
+
+def _output_label(output):
+    # First component id of a Dash output spec ('id.prop' or '..id.prop...id2.prop..')
+    first = output.strip('.').split('...')[0]
+    return first.rsplit('.', 1)[0]
+
+
+def instrument_callback(fn, label):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        _current.callback, _current.record = label, {}
+        profiler = cProfile.Profile() if _profiling_requested() else None
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                return profiler.runcall(fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if type(e).__name__ != 'PreventUpdate':
+                metrics.increment('aq_callback_errors_total', (('callback', label),))
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            figure = _current.record.get('figure', 0.0)
+            metrics.observe('aq_callback_seconds', (('callback', label),), wall)
+            metrics.observe('aq_callback_phase_seconds', (('callback', label), ('phase', 'figure')), figure)
+            metrics.observe('aq_callback_phase_seconds', (('callback', label), ('phase', 'pandas')), max(wall - figure, 0.0))
+            _current.callback, _current.record = None, None
+            if profiler is not None:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{label.replace(':', '-')}.prof")
+                profiler.dump_stats(path)
+                print(f"Wrote profile {path}")
+    return wrapper
+
+
+def instrument(app):
+    """Wrap every callback registered on `app` from now on and serve /metrics."""
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+
+        def wrap(fn):
+            outputs = args[0] if args else kwargs.get('output')
+            first = outputs[0] if isinstance(outputs, (list, tuple)) else outputs
+            label = f"{fn.__name__}:{first.component_id}"
+            return decorator(instrument_callback(fn, label))
+        return wrap
+
+    app.callback = callback
+
+    @app.server.after_request
+    def record_response_size(response):
+        if request.path.endswith('/_dash-update-component') and response.status_code == 200:
+            body = request.get_json(silent=True) or {}
+            callback_fn = app.callback_map.get(body.get('output'), {}).get('callback')
+            if callback_fn is not None:
+                label = f"{callback_fn.__name__}:{_output_label(body['output'])}"
+                metrics.observe('aq_callback_response_bytes', (('callback', label),),
+                                response.calculate_content_length() or 0, BYTES_BUCKETS)
+        return response
+
+    @app.server.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return app
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from snapshot_cache import _read_meta, _write_atomic, _write_json, feather
+
+
+# One bit per detector in the `methods` column of the flagged table
+OUTLIER_METHODS = {
+    'zscore': (1, 'Rolling z-score'),
+    'mad': (2, 'MAD band'),
+    'iqr': (4, 'IQR fence'),
+    'seasonal': (8, 'Seasonal residual'),
+}
+
+OUTLIER_PARAMS = {
+    'window': 168,        # readings in the trailing z-score window (a week of hourly data)
+    'min_periods': 24,
+    'zscore': 4.0,
+    'mad': 3.5,
+    'iqr': 1.5,
+    'seasonal': 4.0,
+}
+
+# Rows per NumPy pass, which bounds the temporaries on long histories
+CHUNK_ROWS = int(os.environ.get('AQ_OUTLIER_CHUNK_ROWS', str(1 << 20)))
+# Cities are scored in parallel; results are kept next to the data unless told otherwise
+OUTLIER_WORKERS = int(os.environ.get('AQ_OUTLIER_WORKERS', str(min(8, os.cpu_count() or 1))))
+OUTLIER_POOL = os.environ.get('AQ_OUTLIER_POOL', 'process')  # or 'thread'
+OUTLIER_DIR = os.environ.get('AQ_OUTLIER_DIR')
+OUTLIER_FORMAT_VERSION = 3
+
+MAD_SCALE = 1.4826  # MAD of a normal distribution -> standard deviation
+
+
+def _chunks(n, chunk_rows):
+    for start in range(0, n, max(1, chunk_rows)):
+        yield start, min(n, start + chunk_rows)
+
+
+def rolling_zscore(values, window, min_periods, chunk_rows=CHUNK_ROWS):
+    """|x - mean| / std against the previous `window` readings (NaN where undefined)."""
+    values = np.asarray(values, dtype=np.float64)
+    scores = np.full(len(values), np.nan)
+    for start, end in _chunks(len(values), chunk_rows):
+        # Each pass re-reads the `window` rows before the chunk instead of carrying state
+        lo = max(0, start - window)
+        block = values[lo:end]
+        valid = ~np.isnan(block)
+        # Centring first keeps the sum of squares well conditioned
+        centred = np.where(valid, block - (np.nanmean(block) if valid.any() else 0.0), 0.0)
+        s1 = np.concatenate(([0.0], np.cumsum(centred)))
+        s2 = np.concatenate(([0.0], np.cumsum(centred * centred)))
+        cnt = np.concatenate(([0], np.cumsum(valid)))
+        idx = np.arange(start - lo, end - lo)
+        first = np.maximum(idx - window, 0)
+        n = cnt[idx] - cnt[first]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (s1[idx] - s1[first]) / n
+            var = (s2[idx] - s2[first]) / n - mean * mean
+            # The prefix sums carry rounding error of about eps * s2[idx], so a
+            # constant window can come out slightly above 0; that is 0
+            var = np.where(var > 64 * np.finfo(np.float64).eps * s2[idx] / n, var, 0.0)
+            std = np.sqrt(var)
+            z = np.abs(centred[idx] - mean) / std
+        ok = valid[idx] & (n >= min_periods) & (std > 0)
+        scores[start:end] = np.where(ok, z, np.nan)
+    return scores
+
+
+def _seasonal_slots(times):
+    # Month of year x hour of day, 0..287
+    months = times.astype('datetime64[M]').astype(np.int64) % 12
+    hours = (times - times.astype('datetime64[D]')).astype('timedelta64[h]').astype(np.int64)
+    return (months * 24 + hours).astype(np.int16)
+
+
+def _seasonal_residual(values, slot, baseline, chunk_rows):
+    residual = np.full(len(values), np.nan)
+    for start, end in _chunks(len(values), chunk_rows):
+        residual[start:end] = values[start:end] - baseline[slot[start:end]]
+    return residual
+
+
+def fit_series(values, times, chunk_rows=CHUNK_ROWS):
+    """Statistics of a whole series that the MAD, IQR and seasonal tests score against.
+
+    Plain floats and lists, so they can be stored next to the flagged rows
+    and reused to score readings that arrive later.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    median = np.nanmedian(values)
+    q1, q3 = np.nanpercentile(values, [25, 75])
+    slot = _seasonal_slots(times)
+    baseline = pd.Series(values).groupby(slot).median().reindex(np.arange(12 * 24)).to_numpy()
+    residual = _seasonal_residual(values, slot, baseline, chunk_rows)
+    centre = np.nanmedian(residual)
+    return {
+        'median': float(median), 'mad': float(MAD_SCALE * np.nanmedian(np.abs(values - median))),
+        'q1': float(q1), 'q3': float(q3), 'baseline': baseline.tolist(),
+        'centre': float(centre), 'scale': float(MAD_SCALE * np.nanmedian(np.abs(residual - centre))),
+    }
+
+
+def _robust_scores(values, fit, chunk_rows):
+    # MAD-normalised distance and distance beyond the IQR fences, both in one pass per chunk
+    median, mad, q1, q3 = fit['median'], fit['mad'], fit['q1'], fit['q3']
+    iqr = q3 - q1
+    mad_scores = np.full(len(values), np.nan)
+    iqr_scores = np.full(len(values), np.nan)
+    for start, end in _chunks(len(values), chunk_rows):
+        block = values[start:end]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if mad > 0:
+                mad_scores[start:end] = np.abs(block - median) / mad
+            if iqr > 0:
+                # How many IQRs outside [q1, q3]; 0 inside the box
+                iqr_scores[start:end] = np.maximum(np.maximum(q1 - block, block - q3), 0) / iqr
+    return mad_scores, iqr_scores
+
+
+def seasonal_scores(values, times, fit=None, chunk_rows=CHUNK_ROWS):
+    """Robust z-score of the residual from the median of the same month and hour of day."""
+    values = np.asarray(values, dtype=np.float64)
+    fit = fit or fit_series(values, times, chunk_rows)
+    if not fit['scale'] > 0:
+        return np.full(len(values), np.nan)
+    residual = _seasonal_residual(values, _seasonal_slots(times), np.asarray(fit['baseline'], dtype=np.float64), chunk_rows)
+    return np.abs(residual - fit['centre']) / fit['scale']
+
+
+def score_series(values, times, params=OUTLIER_PARAMS, chunk_rows=CHUNK_ROWS, fit=None):
+    # Method bits, the largest normalised score of every reading of one series,
+    # and the fitted statistics it was scored against (its own unless `fit` is given)
+    values = np.asarray(values, dtype=np.float64)
+    if fit is None:
+        if not np.isfinite(values).any():
+            return np.zeros(len(values), dtype=np.uint8), np.zeros(len(values), dtype=np.float32), None
+        fit = fit_series(values, times, chunk_rows)
+    mad, iqr = _robust_scores(values, fit, chunk_rows)
+    scores = {
+        'zscore': (rolling_zscore(values, params['window'], params['min_periods'], chunk_rows), params['zscore']),
+        'mad': (mad, params['mad']),
+        'iqr': (iqr, params['iqr']),
+        'seasonal': (seasonal_scores(values, times, fit, chunk_rows), params['seasonal']),
+    }
+    bits = np.zeros(len(values), dtype=np.uint8)
+    worst = np.zeros(len(values), dtype=np.float64)
+    for method, (score, limit) in scores.items():
+        # NaN compares False, so undefined scores never flag
+        flagged = score > limit
+        bits |= flagged.astype(np.uint8) * np.uint8(OUTLIER_METHODS[method][0])
+        worst = np.where(flagged, np.fmax(worst, score / limit), worst)
+    return bits, worst.astype(np.float32), fit
+
+
+def detect_city(times, columns, params=OUTLIER_PARAMS, chunk_rows=CHUNK_ROWS, fits=None, skip=0):
+    """Flagged readings of one city as (time, pollutant, value, methods, score) rows.
+
+    `columns` maps pollutant names to arrays aligned with `times`. Also
+    returns the statistics each pollutant was scored against. With `fits`
+    the readings are scored against those instead of their own, and the
+    first `skip` readings are only history for the rolling z-score. Runs on
+    the outlier pool, so it only takes and returns plain arrays, frames and dicts.
+    """
+    parts, used = [], {}
+    for name, values in columns.items():
+        bits, score, used[name] = score_series(values, times, params, chunk_rows, (fits or {}).get(name))
+        rows = np.flatnonzero(bits[skip:]) + skip
+        if len(rows):
+            parts.append(pd.DataFrame({
+                'time': times[rows],
+                'pollutant': name,
+                'value': np.asarray(values, dtype=np.float32)[rows],
+                'methods': bits[rows],
+                'score': score[rows],
+            }))
+    if not parts:
+        return empty_outliers(), used
+    flagged = pd.concat(parts, ignore_index=True)
+    flagged['pollutant'] = flagged['pollutant'].astype('category')
+    return flagged, used
+
+
+def empty_outliers():
+    return pd.DataFrame({
+        'time': np.array([], dtype='datetime64[ns]'), 'pollutant': pd.Categorical([]),
+        'value': np.array([], dtype=np.float32), 'methods': np.array([], dtype=np.uint8),
+        'score': np.array([], dtype=np.float32),
+    })
+
+
+def _fingerprint(times, columns, params):
+    # Content hash of exactly what is scored, so appended or edited data is rescored
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([OUTLIER_FORMAT_VERSION, params, list(columns)]).encode())
+    digest.update(np.ascontiguousarray(times).tobytes())
+    for values in columns.values():
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def _cache_paths(folder, city):
+    return os.path.join(folder, f"{city}.feather"), os.path.join(folder, f"{city}.json")
+
+
+def _load_cached(folder, city, fingerprint):
+    if feather is None or folder is None:
+        return None
+    table_path, meta_path = _cache_paths(folder, city)
+    meta = _read_meta(meta_path)
+    if meta is None or meta.get('fingerprint') != fingerprint or not os.path.exists(table_path):
+        return None
+    try:
+        return feather.read_feather(table_path), meta['fits']
+    except Exception as e:
+        print(f"Ignoring unreadable outlier cache {table_path}: {e}")
+        return None
+
+
+def _save(folder, city, fingerprint, result):
+    if feather is None or folder is None:
+        return
+    flagged, fits = result
+    table_path, meta_path = _cache_paths(folder, city)
+    try:
+        os.makedirs(folder, exist_ok=True)
+        _write_atomic(table_path, lambda p: feather.write_feather(flagged, p))
+        _write_atomic(meta_path, lambda p: _write_json(p, {'fingerprint': fingerprint, 'rows': len(flagged), 'fits': fits}))
+    except OSError as e:
+        print(f"Could not write outlier cache for {city}: {e}")
+
+
+class OutlierDetector:
+    """Per-city statistical outliers, scored in parallel and persisted on disk."""
+
+    def __init__(self, pollutants, cache_dir=None, workers=OUTLIER_WORKERS, pool=OUTLIER_POOL,
+                 params=OUTLIER_PARAMS, chunk_rows=CHUNK_ROWS):
+        self.pollutants = list(pollutants)
+        self.cache_dir = OUTLIER_DIR or cache_dir
+        self.workers = max(1, workers)
+        self.pool = pool
+        self.params = dict(params)
+        self.chunk_rows = chunk_rows
+
+    def detect(self, frames, pool=None):
+        # {city: frame} -> {city: (flagged rows, fitted statistics)}; cached cities are not rescored.
+        # `pool` overrides the configured one: callers serving a request pass
+        # 'thread', since forking a process pool from a server thread is unsafe.
+        pool = pool or self.pool
+        results, todo = {}, {}
+        for city, df in frames.items():
+            times = df['time'].to_numpy()
+            columns = {col: df[col].to_numpy() for col in self.pollutants if col in df.columns}
+            fingerprint = _fingerprint(times, columns, self.params)
+            cached = _load_cached(self.cache_dir, city, fingerprint)
+            if cached is not None:
+                results[city] = cached
+            else:
+                todo[city] = (fingerprint, times, columns)
+
+        if len(todo) > 1 and self.workers > 1:
+            executor_type = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+            with executor_type(max_workers=min(self.workers, len(todo))) as executor:
+                futures = {city: executor.submit(detect_city, times, columns, self.params, self.chunk_rows)
+                           for city, (_, times, columns) in todo.items()}
+                computed = {city: future.result() for city, future in futures.items()}
+        else:
+            computed = {city: detect_city(times, columns, self.params, self.chunk_rows)
+                        for city, (_, times, columns) in todo.items()}
+
+        for city, result in computed.items():
+            _save(self.cache_dir, city, todo[city][0], result)
+            results[city] = result
+        return results
+
+    def extend(self, result, tail, rows):
+        """`result` of a city with its last `rows` readings scored too.
+
+        `tail` holds those readings, preceded by the rolling z-score window.
+        They are scored against the statistics fitted on the history, so a
+        streamed batch costs O(rows + window) instead of a full rescore; a
+        reload of the station fits them again.
+        """
+        flagged, fits = result
+        times = tail['time'].to_numpy()
+        columns = {col: tail[col].to_numpy() for col in self.pollutants if col in tail.columns}
+        added, fits = detect_city(times, columns, self.params, self.chunk_rows, fits, skip=len(tail) - rows)
+        if not len(added):
+            return flagged, fits
+        if not len(flagged):
+            return added, fits
+        flagged = pd.concat([flagged, added], ignore_index=True)
+        flagged['pollutant'] = flagged['pollutant'].astype(str).astype('category')
+        return flagged, fits
+
+
+def methods_mask(methods):
+    mask = 0
+    for method in methods or []:
+        mask |= OUTLIER_METHODS[method][0]
+    return mask
+
+
+def method_labels(bits):
+    return ', '.join(label for bit, label in OUTLIER_METHODS.values() if bits & bit)
@@ -0,0 +1,131 @@
+import copy
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# Aggregated levels, finest first, with their nominal bucket width.
+# 'raw' (the readings themselves) always comes before them.
+PYRAMID_LEVELS = [
+    ('1h', pd.Timedelta(hours=1)),
+    ('6h', pd.Timedelta(hours=6)),
+    ('1D', pd.Timedelta(days=1)),
+    ('1W', pd.Timedelta(days=7)),
+    ('1M', pd.Timedelta(days=30.44)),
+]
+LEVEL_TITLES = {'raw': 'Raw', '1h': 'Hourly', '6h': '6-Hourly', '1D': 'Daily', '1W': 'Weekly', '1M': 'Monthly'}
+PYRAMID_STATS = ('mean', 'min', 'max', 'count')
+
+
+def bucket_starts(times, level):
+    # Start of each reading's bucket; weeks start on Monday like the rest of the app
+    t = np.asarray(times, dtype='datetime64[ns]')
+    if level == '1h':
+        return t.astype('datetime64[h]').astype('datetime64[ns]')
+    if level == '6h':
+        hours = t.astype('datetime64[h]').astype(np.int64)
+        return (hours - hours % 6).astype('datetime64[h]').astype('datetime64[ns]')
+    if level == '1D':
+        return t.astype('datetime64[D]').astype('datetime64[ns]')
+    if level == '1W':
+        days = t.astype('datetime64[D]').astype(np.int64)
+        # 1970-01-01 was a Thursday
+        return (days - (days + 3) % 7).astype('datetime64[D]').astype('datetime64[ns]')
+    if level == '1M':
+        return t.astype('datetime64[M]').astype('datetime64[ns]')
+    raise ValueError(f"Unknown pyramid level: {level}")
+
+
+def _reduce(df, level, columns):
+    keys = pd.Index(bucket_starts(df['time'], level), name='time')
+    grouped = df[columns].astype('float64').groupby(keys, sort=True)
+    return pd.concat({'mean': grouped.mean(), 'min': grouped.min(), 'max': grouped.max(),
+                      'count': grouped.count()}, axis=1)
+
+
+def _merge(current, partial):
+    # Buckets touched by both are combined; means are re-weighted by their counts
+    overlap = partial.index.intersection(current.index)
+    if len(overlap):
+        current = current.astype(np.float64)
+        old, new = current.loc[overlap], partial.loc[overlap]
+        count = old['count'].values + new['count'].values
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (np.nan_to_num(old['mean'].values * old['count'].values)
+                    + np.nan_to_num(new['mean'].values * new['count'].values)) / count
+        current.loc[overlap, 'mean'] = np.where(count > 0, mean, np.nan)
+        current.loc[overlap, 'min'] = np.fmin(old['min'].values, new['min'].values)
+        current.loc[overlap, 'max'] = np.fmax(old['max'].values, new['max'].values)
+        current.loc[overlap, 'count'] = count
+    fresh = partial.index.difference(current.index)
+    if len(fresh):
+        current = pd.concat([current, partial.loc[fresh]]).sort_index()
+    return current
+
+
+class TimePyramid:
+    """Mean/min/max of every pollutant at several bucket widths, per city.
+
+    Buckets merge, so new readings only touch the buckets they fall in.
+    Levels no coarser than a station's own reading interval would just repeat
+    the raw data and are not built for it.
+    """
+
+    def __init__(self, columns, levels=PYRAMID_LEVELS):
+        self.columns = list(columns)
+        self.widths = dict(levels)
+        self._levels = {}
+        self._lock = threading.Lock()
+
+    def add(self, city, df):
+        columns = [col for col in self.columns if col in df.columns]
+        if df.empty or not columns:
+            return
+        with self._lock:
+            levels = self._levels.get(city)
+            if levels is None:
+                times = df['time'].to_numpy()
+                step = pd.Timedelta(np.median(np.diff(times).astype(np.int64))) if len(times) > 1 else pd.Timedelta(0)
+                levels = self._levels[city] = {name: None for name, width in self.widths.items() if width > step}
+            for name, current in levels.items():
+                partial = _reduce(df, name, columns).reindex(
+                    columns=pd.MultiIndex.from_product([PYRAMID_STATS, self.columns]))
+                partial['count'] = partial['count'].fillna(0)
+                merged = partial if current is None else _merge(current, partial)
+                # Readings are float32; so are their aggregates
+                levels[name] = merged.astype({col: np.int32 if col[0] == 'count' else np.float32
+                                              for col in merged.columns})
+
+    def discard(self, city):
+        with self._lock:
+            self._levels.pop(city, None)
+
+    def snapshot(self):
+        # Merged levels are new frames, so copying the per-city dicts is enough
+        with self._lock:
+            frozen = copy.copy(self)
+            frozen._levels = {city: dict(levels) for city, levels in self._levels.items()}
+        frozen._lock = threading.Lock()
+        return frozen
+
+    def levels(self, city):
+        return ['raw'] + list(self._levels.get(city, {}))
+
+    def frame(self, city, level, start=None, end=None):
+        """Buckets of `level` overlapping [start, end), columns (stat, pollutant)."""
+        df = self._levels[city][level]
+        times = df.index.to_numpy()
+        lo = 0 if start is None else np.searchsorted(times, bucket_starts([pd.Timestamp(start)], level)[0], 'left')
+        hi = len(times) if end is None else np.searchsorted(times, np.datetime64(pd.Timestamp(end), 'ns'), 'left')
+        return df.iloc[lo:max(lo, hi)]
+
+    def choose(self, city, start, end, raw_points, n_out):
+        # The finest level that fits `n_out` points in the range; the coarsest otherwise
+        if raw_points <= n_out:
+            return 'raw'
+        levels = self.levels(city)[1:]
+        for level in levels:
+            if len(self.frame(city, level, start, end)) <= n_out:
+                return level
+        return levels[-1] if levels else 'raw'
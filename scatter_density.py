@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from storage import concat_cities
+
+
+# Up to WEBGL_THRESHOLD points SVG markers are fine; up to DENSITY_THRESHOLD
+# WebGL copes; beyond that the points are binned on the server.
+WEBGL_THRESHOLD = int(os.environ.get('AQ_SCATTER_WEBGL_THRESHOLD', '5000'))
+DENSITY_THRESHOLD = int(os.environ.get('AQ_SCATTER_DENSITY_THRESHOLD', '200000'))
+DENSITY_BINS = 200
+OVERLAY_POINTS_PER_CITY = 500
+
+
+def scatter_mode(n_points):
+    if n_points > DENSITY_THRESHOLD:
+        return 'density'
+    if n_points > WEBGL_THRESHOLD:
+        return 'webgl'
+    return 'svg'
+
+
+def binned_density(x, y, bins=DENSITY_BINS):
+    # Vectorized 2-D histogram; rows with a missing coordinate are skipped
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return counts.T, x_centers, y_centers
+
+
+def city_sample(df, n=OVERLAY_POINTS_PER_CITY, seed=0):
+    # Same rows every time for a given frame, so cached figures stay stable
+    shuffled = df.iloc[np.random.default_rng(seed).permutation(len(df))]
+    return shuffled[shuffled.groupby('City', observed=True).cumcount() < n]
+
+
+def density_figure(frames, x_axis, y_axis, overlay_cities=False, joint=None):
+    # `frames` maps each city to its readings of the two axes. With the
+    # precomputed joint bins only the overlay reads them, one city at a time.
+    if joint is not None:
+        counts, x_centers, y_centers = joint.histogram(x_axis, y_axis)
+    else:
+        df = concat_cities(list(frames.values()))
+        counts, x_centers, y_centers = binned_density(df[x_axis], df[y_axis])
+    z = np.where(counts > 0, counts, np.nan)
+    fig = go.Figure(go.Heatmap(
+        x=x_centers, y=y_centers, z=z,
+        colorscale='Viridis',
+        colorbar=dict(title='Readings'),
+        hoverongaps=False,
+        hovertemplate=f"{x_axis}: %{{x:.2f}}<br>{y_axis}: %{{y:.2f}}<br>Readings: %{{z}}<extra></extra>"
+    ))
+    if overlay_cities:
+        for city, df in frames.items():
+            points = city_sample(df[['City', x_axis, y_axis]].dropna())
+            fig.add_trace(go.Scattergl(
+                x=points[x_axis], y=points[y_axis], name=str(city),
+                mode='markers', marker=dict(size=4, opacity=0.6)
+            ))
+    fig.update_layout(xaxis_title=x_axis, yaxis_title=y_axis, legend_title_text='City')
+    return fig
+
+
+def correlation_scatter(frames, x_axis, y_axis, rows, overlay_cities=False, joint=None):
+    # `rows` is the total number of readings, so the mode is picked before any are read
+    mode = scatter_mode(rows)
+    title = f"Correlation between {x_axis} and {y_axis}"
+    if joint is not None:
+        r = joint.pearson().loc[x_axis, y_axis]
+        rho = joint.spearman().loc[x_axis, y_axis]
+        title += f" (Pearson {r:.2f}, Spearman {rho:.2f})"
+    if mode == 'density':
+        fig = density_figure(frames, x_axis, y_axis, overlay_cities, joint)
+        fig.update_layout(title=f"{title} (density of {rows:,} readings)")
+        return fig
+    # Few enough to plot every reading, so they are put side by side
+    df = concat_cities(list(frames.values()))
+    return px.scatter(df, x=x_axis, y=y_axis, color="City", title=title, render_mode=mode)
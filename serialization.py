@@ -0,0 +1,160 @@
+import base64
+import datetime
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+
+
+# Numeric arrays are sent as base64 typed arrays (plotly.js >= 2.28 decodes them)
+TYPED_ARRAYS = os.environ.get('AQ_TYPED_ARRAYS', '1') == '1'
+# Response compression on the Flask server; needs flask-compress (brotli optional)
+COMPRESS = os.environ.get('AQ_COMPRESS', '0') == '1'
+# Shorter arrays gain nothing from the base64 wrapper
+MIN_TYPED_LENGTH = 64
+
+try:
+    import orjson  # noqa: F401
+    pio.json.config.default_engine = 'orjson'
+except ImportError:
+    pass
+
+# Dtypes plotly.js accepts, keyed by the dtype each array is converted to
+_TYPED_DTYPES = {
+    np.dtype('int8'): 'i1', np.dtype('uint8'): 'u1',
+    np.dtype('int16'): 'i2', np.dtype('uint16'): 'u2',
+    np.dtype('int32'): 'i4', np.dtype('uint32'): 'u4',
+    np.dtype('float32'): 'f4', np.dtype('float64'): 'f8',
+}
+
+
+def _typed_array(values, keep_float64=False):
+    if values.dtype.kind == 'b':
+        values = values.astype(np.uint8)
+    elif values.dtype.kind in 'iu' and values.dtype not in _TYPED_DTYPES:
+        # 64-bit integers have no typed-array equivalent
+        fits = values.size == 0 or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max)
+        values = values.astype(np.int32 if fits else np.float64)
+    elif values.dtype == np.float64 and not keep_float64:
+        # Readings are stored as float32, so the extra precision is not real
+        values = values.astype(np.float32)
+    values = np.ascontiguousarray(values)
+    encoded = {'dtype': _TYPED_DTYPES[values.dtype], 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+    if values.ndim > 1:
+        encoded['shape'] = ','.join(str(n) for n in values.shape)
+    return encoded
+
+
+def _json_length(values):
+    return len(to_json_plotly(values))
+
+
+def _encode(value):
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in 'biuf' and value.size >= MIN_TYPED_LENGTH:
+            # Short decimals ('45.3') can be smaller as text than as 4-byte floats
+            encoded = _typed_array(value)
+            if len(encoded['bdata']) < _json_length(value):
+                return encoded
+        return value
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _epoch_ms(values):
+    # Datetime coordinates as milliseconds since the epoch, which date axes accept
+    if not isinstance(values, np.ndarray) or values.size < MIN_TYPED_LENGTH:
+        return None
+    if values.dtype.kind == 'O' and not isinstance(values.flat[0], (datetime.datetime, np.datetime64)):
+        return None
+    if values.dtype.kind not in 'OM':
+        return None
+    times = pd.to_datetime(values.ravel())
+    if times.tz is not None:
+        return None
+    ms = (times.asi8 // 10**6).astype(np.float64)
+    ms[times.isna()] = np.nan
+    return ms.reshape(values.shape)
+
+
+def compact_figure(fig):
+    """Plain figure dict with numeric and datetime trace arrays sent as typed arrays."""
+    figure = fig.to_plotly_json()
+    layout = figure.setdefault('layout', {})
+    traces = []
+    for trace in figure['data']:
+        for axis in ('x', 'y'):
+            ms = _epoch_ms(trace.get(axis))
+            if ms is not None:
+                # Milliseconds need float64; float32 would be off by minutes
+                trace[axis] = _typed_array(ms, keep_float64=True)
+                # Numbers would otherwise make plotly.js pick a linear axis
+                name = axis + 'axis' + trace.get(axis + 'axis', axis)[1:]
+                layout.setdefault(name, {}).setdefault('type', 'date')
+        traces.append(_encode(trace))
+    figure['data'] = traces
+    return figure
+
+
+class PayloadStats:
+    """Serialized size of each callback's figures as plain JSON and as sent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sizes = {}
+
+    def record(self, name, plain, compact):
+        with self._lock:
+            entry = self._sizes.setdefault(name, {'figures': 0, 'plain_bytes': 0, 'compact_bytes': 0})
+            entry['figures'] += 1
+            entry['plain_bytes'] += plain
+            entry['compact_bytes'] += compact
+            entry['last_plain_bytes'] = plain
+            entry['last_compact_bytes'] = compact
+
+    def report(self):
+        with self._lock:
+            return {
+                name: dict(entry, ratio=entry['compact_bytes'] / entry['plain_bytes'] if entry['plain_bytes'] else 1.0)
+                for name, entry in sorted(self._sizes.items())
+            }
+
+
+payload_stats = PayloadStats()
+
+
+def compact_response(value, name='figure'):
+    # Callback results are a figure or a tuple holding figures among other outputs
+    if isinstance(value, tuple):
+        return tuple(compact_response(v, name) for v in value)
+    if not TYPED_ARRAYS or not isinstance(value, go.Figure):
+        return value
+    compact = compact_figure(value)
+    payload_stats.record(name, len(to_json_plotly(value)), len(to_json_plotly(compact)))
+    return compact
+
+
+def enable_compression(app):
+    if not COMPRESS:
+        return
+    try:
+        from flask_compress import Compress
+    except ImportError:
+        print("AQ_COMPRESS is set but flask-compress is not installed; responses are not compressed")
+        return
+    algorithms = ['gzip']
+    try:
+        import brotli  # noqa: F401
+        algorithms.insert(0, 'br')
+    except ImportError:
+        pass
+    app.server.config['COMPRESS_ALGORITHM'] = algorithms
+    app.server.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/css', 'application/javascript']
+    Compress(app.server)
@@ -0,0 +1,160 @@
+import json
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+_ALIGN = 64
+
+def shared_data_name():
+    # Set by the gunicorn master (see gunicorn.conf.py) before workers start.
+    # Read on use: the master imports this module before publishing, and
+    # changes the name on every reload.
+    return os.environ.get('AQ_SHARED_DATA')
+
+
+# Segments this process attached to; kept open for as long as the frames use them
+_attached = []
+
+# Segments created here (or, after a fork, by the parent process)
+_published = set()
+
+
+def _segment_names(name):
+    return f"{name}-data", f"{name}-manifest"
+
+
+def _column_plan(df):
+    # Numeric and datetime columns go to shared memory; City is rebuilt per worker
+    plan = []
+    for col in df.columns:
+        dtype = df[col].dtype
+        if col == 'City':
+            continue
+        if pd.api.types.is_datetime64_dtype(dtype):
+            plan.append((col, 'datetime64[ns]'))
+        elif pd.api.types.is_numeric_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype):
+            plan.append((col, np.dtype(dtype).str))
+        else:
+            print(f"Column {col!r} ({dtype}) is not shared; it will be missing in workers")
+    return plan
+
+
+def publish_frames(name, frames, sources=None):
+    """Copy every city frame into one shared memory segment and describe it in a manifest.
+
+    `sources` maps cities to the stamps of the CSVs their frames were read
+    from; they are recorded so readers can tell whether a station is current.
+    Returns the segments; the caller owns them and removes them by name with
+    `unlink_frames` on shutdown.
+    """
+    sources = sources or {}
+    manifest = {'cities': {}}
+    layout = []
+    size = 0
+    for city, df in frames.items():
+        columns = {}
+        for col, dtype in _column_plan(df):
+            values = df[col].to_numpy(dtype=dtype)
+            columns[col] = {'offset': size, 'dtype': dtype}
+            layout.append((size, values))
+            size += -(-values.nbytes // _ALIGN) * _ALIGN
+        manifest['cities'][city] = {'rows': len(df), 'columns': columns,
+                                    'source': None if sources.get(city) is None else list(sources[city])}
+
+    data_name, manifest_name = _segment_names(name)
+    data = shared_memory.SharedMemory(name=data_name, create=True, size=max(size, 1))
+    _published.add(data_name)
+    for offset, values in layout:
+        target = np.ndarray(values.shape, dtype=values.dtype, buffer=data.buf, offset=offset)
+        target[...] = values
+
+    payload = json.dumps(manifest).encode()
+    meta = shared_memory.SharedMemory(name=manifest_name, create=True, size=len(payload) + 8)
+    _published.add(manifest_name)
+    meta.buf[:8] = len(payload).to_bytes(8, 'little')
+    meta.buf[8:8 + len(payload)] = payload
+    return data, meta
+
+
+def _attach(segment_name):
+    try:
+        return shared_memory.SharedMemory(name=segment_name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    # Forked gunicorn workers share the master's resource tracker, which already
+    # owns the segment. Any other process would register it with a tracker of
+    # its own and unlink it on exit, so it has to forget it again.
+    segment = shared_memory.SharedMemory(name=segment_name)
+    if segment_name not in _published:
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+def _read_manifest(name):
+    meta = _attach(_segment_names(name)[1])
+    length = int.from_bytes(bytes(meta.buf[:8]), 'little')
+    manifest = json.loads(bytes(meta.buf[8:8 + length]))
+    meta.close()
+    return manifest
+
+
+def published_sources(name):
+    # {city: CSV stamp} as recorded by the publisher, for stations that have one
+    return {city: tuple(entry['source']) for city, entry in _read_manifest(name)['cities'].items()
+            if entry.get('source') is not None}
+
+
+def _views(manifest, data):
+    frames = {}
+    for city, entry in manifest['cities'].items():
+        columns = {}
+        for col, spec in entry['columns'].items():
+            dtype = np.dtype(spec['dtype'])
+            values = np.ndarray((entry['rows'],), dtype=dtype, buffer=data.buf, offset=spec['offset'])
+            values.setflags(write=False)
+            columns[col] = values
+        df = pd.DataFrame(columns, copy=False)
+        df['City'] = pd.Categorical.from_codes(np.zeros(entry['rows'], dtype=np.int8), categories=[city])
+        frames[city] = df
+    return frames
+
+
+def attach_frames(name):
+    """Read-only city frames backed directly by the published shared memory."""
+    manifest = _read_manifest(name)
+    data = _attach(_segment_names(name)[0])
+    frames = _views(manifest, data)
+    _attached.append(data)
+    return frames
+
+
+def republish(name, new_name, frames, sources):
+    """Publish the stations of segment `name` as `new_name`, with `frames` replacing or adding stations.
+
+    Unchanged stations are copied from the old segment as they are. The old
+    segment is left for the caller to unlink once nothing new attaches to it.
+    """
+    manifest = _read_manifest(name)
+    data = _attach(_segment_names(name)[0])
+    merged = {**_views(manifest, data), **frames}
+    merged_sources = {city: entry['source'] for city, entry in manifest['cities'].items()}
+    merged_sources.update(sources)
+    segments = publish_frames(new_name, merged, merged_sources)
+    # Views into the old segment must be gone before it can be closed
+    del merged
+    data.close()
+    return segments
+
+
+def unlink_frames(name):
+    # Remove the segments published under `name`; processes that attached keep them until they exit
+    for segment_name in _segment_names(name):
+        try:
+            segment = shared_memory.SharedMemory(name=segment_name)
+        except FileNotFoundError:
+            continue
+        segment.close()
+        segment.unlink()
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # snapshots are an optimisation, plain CSV still works
+    feather = None
+
+
+# Snapshots live next to the CSVs unless told otherwise
+SNAPSHOT_DIR = os.environ.get('AQ_SNAPSHOT_DIR')
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def _snapshot_paths(csv_path, snapshot_dir):
+    folder = snapshot_dir or os.path.join(os.path.dirname(os.path.abspath(csv_path)), '.snapshots')
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return folder, os.path.join(folder, f"{name}.feather"), os.path.join(folder, f"{name}.json")
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, write):
+    # Several workers may start at once, so write to a temp file and swap it in
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def _snapshot_is_fresh(csv_path, meta, stat):
+    if meta is None or meta.get('format') != SNAPSHOT_FORMAT_VERSION:
+        return False
+    if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        return True
+    # mtime moved (checkout, copy, touch) - only re-parse if the content changed too
+    return meta.get('size') == stat.st_size and meta.get('hash') == _file_hash(csv_path)
+
+
+def parse_city_csv(csv_path):
+    df = pd.read_csv(csv_path)
+    if 'time' in df.columns:
+        df['time'] = pd.to_datetime(df['time'])
+    return df
+
+
+def read_city_csv(csv_path, snapshot_dir=None):
+    """Read a city CSV, using a memory-mapped Feather snapshot when it is up to date."""
+    if feather is None:
+        return parse_city_csv(csv_path)
+
+    folder, snapshot_path, meta_path = _snapshot_paths(csv_path, snapshot_dir or SNAPSHOT_DIR)
+    stat = os.stat(csv_path)
+    meta = _read_meta(meta_path)
+
+    if os.path.exists(snapshot_path) and _snapshot_is_fresh(csv_path, meta, stat):
+        try:
+            df = feather.read_table(snapshot_path, memory_map=True).to_pandas()
+        except Exception as e:
+            print(f"Ignoring unreadable snapshot {snapshot_path}: {e}")
+        else:
+            if meta['mtime_ns'] != stat.st_mtime_ns:
+                # Same content under a new mtime; remember it so we don't hash again next start
+                meta['mtime_ns'] = stat.st_mtime_ns
+                try:
+                    _write_atomic(meta_path, lambda p: _write_json(p, meta))
+                except OSError:
+                    pass
+            return df
+
+    df = parse_city_csv(csv_path)
+
+    try:
+        os.makedirs(folder, exist_ok=True)
+        # Uncompressed so the file can be memory-mapped without decoding
+        _write_atomic(snapshot_path, lambda p: feather.write_feather(df, p, compression='uncompressed'))
+        meta = {
+            'format': SNAPSHOT_FORMAT_VERSION,
+            'source': os.path.abspath(csv_path),
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'hash': _file_hash(csv_path),
+        }
+        _write_atomic(meta_path, lambda p: _write_json(p, meta))
+    except OSError as e:
+        print(f"Could not write snapshot for {csv_path}: {e}")
+
+    return df
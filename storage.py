@@ -0,0 +1,592 @@
+import copy
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from aggregates import AggregateCube
+from pyramid import PYRAMID_LEVELS, TimePyramid, bucket_starts
+
+
+# Where the readings live: 'pandas' keeps every station in memory; 'sqlite'
+# and 'duckdb' keep them in an embedded database and run queries against it
+STORAGE_BACKEND = os.environ.get('AQ_STORAGE', 'pandas')
+STORAGE_PATH = os.environ.get('AQ_STORAGE_PATH')
+# Bumped whenever prepared frames or the tables change shape, so old databases are re-ingested
+STORAGE_FORMAT_VERSION = 5
+
+DAY_NS = 86400 * 10**9
+SOURCES_TABLE = ("CREATE TABLE IF NOT EXISTS sources "
+                 "(city TEXT PRIMARY KEY, mtime_ns BIGINT, size BIGINT, format INTEGER, generation BIGINT)")
+PYRAMID_WIDTHS = {level: width.value for level, width in PYRAMID_LEVELS}
+
+
+def city_column(city, length):
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[city])
+
+
+def concat_cities(frames):
+    # Concatenating per-city categoricals would fall back to strings
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame()
+    cities = union_categoricals([df['City'] for df in frames])
+    combined = pd.concat([df.drop(columns='City') for df in frames], ignore_index=True)
+    combined['City'] = cities
+    return combined
+
+
+def source_stamp(path):
+    # What identifies one version of a station's CSV
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _bounds_slice(sorted_times, start, end):
+    # Binary search on an ascending datetime64 array for [start, end)
+    lo = 0 if start is None else np.searchsorted(sorted_times, np.datetime64(pd.Timestamp(start), 'ns'), 'left')
+    hi = len(sorted_times) if end is None else np.searchsorted(sorted_times, np.datetime64(pd.Timestamp(end), 'ns'), 'left')
+    return slice(lo, max(lo, hi))
+
+
+class PandasStorage:
+    """Every station as an in-memory frame, with its aggregate cube and time pyramid."""
+
+    name = 'pandas'
+    extension = None
+    resident = True
+    read_only = False
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.cube = AggregateCube(columns)
+        self.pyramid = TimePyramid(columns)
+        self._frames = {}
+        self._pending = {}
+        self._sources = {}
+        # Set on snapshots: the storage they were taken from
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def is_current(self, city, csv_path):
+        try:
+            return self._sources.get(city) == source_stamp(csv_path)
+        except OSError:
+            return False
+
+    def source(self, city):
+        # Stamp of the CSV the station was read from, if known
+        return self._sources.get(city)
+
+    def snapshot(self):
+        # Frozen copy for readers: shares every frame and appended chunk, and never
+        # sees later writes. Chunks are only concatenated when a reader needs them.
+        with self._lock:
+            frozen = copy.copy(self)
+            frozen._frames = dict(self._frames)
+            frozen._pending = {city: list(pending) for city, pending in self._pending.items()}
+            frozen._sources = dict(self._sources)
+        frozen._writer = self
+        frozen.cube = self.cube.snapshot()
+        frozen.pyramid = self.pyramid.snapshot()
+        frozen.read_only = True
+        return frozen
+
+    @property
+    def cities(self):
+        return list(self._frames)
+
+    def present_columns(self):
+        present = set()
+        for df in list(self._frames.values()):
+            present.update(df.columns)
+        return present
+
+    def add(self, city, df, source=None):
+        # A reload replaces the station, so nothing of the old one is merged in.
+        # `source` is the stamp of the CSV the frame was read from.
+        self.cube.discard(city)
+        self.pyramid.discard(city)
+        self.cube.add(city, df)
+        self.pyramid.add(city, df)
+        with self._lock:
+            self._pending[city] = []
+            self._frames[city] = df
+            self._sources[city] = None if source is None else tuple(source)
+
+    def append(self, city, rows):
+        # The hourly frame is only re-consolidated when someone reads it
+        with self._lock:
+            self._pending[city].append(rows)
+        self.cube.add(city, rows)
+        self.pyramid.add(city, rows)
+
+    def _parts(self, city):
+        # The station's frame and the chunks appended since, read together
+        with self._lock:
+            return self._frames[city], list(self._pending[city])
+
+    def _adopt(self, city, base, pending, df):
+        # Swap in `df`, the concatenation of `base` and `pending`, unless the
+        # station was replaced or consolidated meanwhile
+        with self._lock:
+            current = self._pending.get(city, [])
+            if (self._frames.get(city) is base and len(current) >= len(pending)
+                    and all(a is b for a, b in zip(current, pending))):
+                self._frames[city] = df
+                self._pending[city] = current[len(pending):]
+
+    def frame(self, city, columns=None):
+        df, pending = self._parts(city)
+        if pending:
+            base, df = df, pd.concat([df] + pending, ignore_index=True)
+            self._adopt(city, base, pending, df)
+            if self._writer is not None:
+                # Handed back, so later snapshots start from the consolidated frame
+                self._writer._adopt(city, base, pending, df)
+        return df if columns is None else df[['time'] + [c for c in columns if c in df.columns] + ['City']]
+
+    def query(self, city, start=None, end=None, columns=None):
+        # Rows are kept in time order, so [start, end) is two binary searches
+        df = self.frame(city, columns)
+        return df.iloc[_bounds_slice(df['time'].to_numpy(), start, end)]
+
+    def rows(self, city, start=None, end=None):
+        df = self.frame(city)
+        rows = _bounds_slice(df['time'].to_numpy(), start, end)
+        return rows.stop - rows.start
+
+    def tail(self, city, rows, columns=None):
+        # The last `rows` readings, taken from the appended chunks without consolidating them
+        base, pending = self._parts(city)
+        parts, needed = [], rows
+        for df in reversed([base] + pending):
+            if needed <= 0:
+                break
+            parts.append(df.iloc[max(0, len(df) - needed):])
+            needed -= len(df)
+        df = pd.concat(parts[::-1], ignore_index=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+        return df if columns is None else df[['time'] + [c for c in columns if c in df.columns] + ['City']]
+
+    def last_time(self, city):
+        base, pending = self._parts(city)
+        frame = pending[-1] if pending else base
+        return frame['time'].iloc[-1] if len(frame) else pd.Timestamp.min
+
+    def daily(self, city, stat='mean', columns=None, start=None, end=None):
+        daily = self.cube.daily(city, stat, columns)
+        return daily.iloc[_bounds_slice(daily.index.to_numpy(), start, end)]
+
+    def monthly(self, city, stat='mean', columns=None):
+        return self.cube.monthly(city, stat, columns)
+
+    def city_means(self, cities, columns=None):
+        return self.cube.city_means(columns).reindex(cities).rename_axis('City')
+
+    def month_starts(self, city):
+        return self.cube.monthly(city, 'count').index
+
+    def level(self, city, level, start=None, end=None):
+        return self.pyramid.frame(city, level, start, end)
+
+    def resolution(self, city, start, end, n_out):
+        return self.pyramid.choose(city, start, end, self.rows(city, start, end), n_out)
+
+
+class SQLStorage:
+    """Readings in an embedded SQL database, one `readings` table indexed on (city, time).
+
+    Nothing is held in memory: frames are read for the range a caller asks
+    for, and daily/monthly/per-city aggregates and pyramid levels are GROUP BY
+    queries. Times are stored as integer nanoseconds, so bucketing is plain
+    integer arithmetic in either dialect. Subclasses supply the connection,
+    column types, bulk insert and result fetching.
+
+    Every write is tagged with a sequence number, and each ingest of a station
+    starts a new generation of its rows. A snapshot reads one generation per
+    station up to the last write it saw. The generation a reload replaces is
+    kept until the station is replaced again, so requests still reading it
+    can finish.
+    """
+
+    resident = False
+    extension = None
+
+    def __init__(self, columns, path, read_only=False):
+        self.columns = list(columns)
+        self.path = path
+        self.read_only = read_only
+        self._local = threading.local()
+        self._connect_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # Set on snapshots: the last write they see
+        self._until = None
+        if not read_only:
+            self.execute(SOURCES_TABLE)
+            if int(self.fetch("SELECT COUNT(*) AS n FROM sources WHERE format <> ?", (STORAGE_FORMAT_VERSION,))['n'].iloc[0]):
+                # Written by an older layout: start over and re-ingest every station
+                for table in ('readings', 'columns', 'sources'):
+                    self.execute(f"DROP TABLE IF EXISTS {table}")
+                self.execute(SOURCES_TABLE)
+            self.execute("CREATE TABLE IF NOT EXISTS columns (name TEXT PRIMARY KEY, dtype TEXT, position INTEGER)")
+        self._dtypes = dict(self.fetch("SELECT name, dtype FROM columns ORDER BY position").itertuples(index=False))
+        self._generations = {city: int(generation) for city, generation
+                             in self.fetch("SELECT city, generation FROM sources").itertuples(index=False)}
+        self._seq = 1
+        if self._dtypes:
+            last = self.fetch("SELECT MAX(seq) AS seq FROM readings")['seq'].iloc[0]
+            self._seq = 1 if pd.isna(last) else int(last) + 1
+            if not read_only:
+                # Superseded generations only outlive the process that replaced them
+                self.execute("DELETE FROM readings WHERE seq < COALESCE("
+                             "(SELECT generation FROM sources WHERE sources.city = readings.city), 0)")
+
+    # -- dialect hooks
+
+    def connect(self):
+        raise NotImplementedError
+
+    def sql_type(self, dtype):
+        raise NotImplementedError
+
+    def insert_frame(self, con, table):
+        raise NotImplementedError
+
+    def fetch(self, sql, params=()):
+        raise NotImplementedError
+
+    # -- plumbing
+
+    def connection(self):
+        # One connection per thread; neither driver shares one across threads safely
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = self.connect()
+        return con
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def close(self):
+        con = getattr(self._local, 'con', None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    @staticmethod
+    def quote(name):
+        return '"' + name.replace('"', '""') + '"'
+
+    def _ensure_columns(self, df):
+        # The table grows a column the first time any station has it
+        new = [(col, str(df[col].dtype)) for col in df.columns if col not in ('time', 'City') and col not in self._dtypes]
+        if not new:
+            return
+        if not self._dtypes:
+            self.execute("CREATE TABLE IF NOT EXISTS readings (city TEXT NOT NULL, time BIGINT NOT NULL, seq BIGINT NOT NULL)")
+            self.execute("CREATE INDEX IF NOT EXISTS readings_city_time ON readings (city, time)")
+        for col, dtype in new:
+            self.execute(f"ALTER TABLE readings ADD COLUMN {self.quote(col)} {self.sql_type(np.dtype(dtype))}")
+            self.execute("INSERT INTO columns VALUES (?, ?, ?)", (col, dtype, len(self._dtypes)))
+            self._dtypes[col] = dtype
+
+    def _table(self, city, df, seq):
+        table = df.drop(columns='City').copy(deep=False)
+        table['time'] = df['time'].to_numpy().astype('datetime64[ns]').astype(np.int64)
+        table.insert(0, 'city', city)
+        table['seq'] = seq
+        return table
+
+    def _next_seq(self):
+        seq = self._seq
+        self._seq += 1
+        return seq
+
+    def _frame(self, city, result):
+        # Stored dtypes back, `time` as datetime64 and City as a one-category column
+        result['time'] = result['time'].to_numpy(dtype=np.int64).astype('datetime64[ns]')
+        result = result.astype({col: dtype for col, dtype in self._dtypes.items() if col in result.columns})
+        result['City'] = city_column(city, len(result))
+        return result
+
+    def _where(self, city, start=None, end=None):
+        # The station's current generation (as of the snapshot) within [start, end)
+        clauses, params = ["city = ?", "seq >= ?"], [city, self._generations.get(city, 0)]
+        if self._until is not None:
+            clauses.append("seq <= ?")
+            params.append(self._until)
+        if start is not None:
+            clauses.append("time >= ?")
+            params.append(int(pd.Timestamp(start).value))
+        if end is not None:
+            clauses.append("time < ?")
+            params.append(int(pd.Timestamp(end).value))
+        return ' AND '.join(clauses), params
+
+    def visible(self):
+        """WHERE clause and parameters selecting every station's rows as of the snapshot."""
+        clauses, params = [], []
+        for city, generation in self._generations.items():
+            clauses.append("(city = ? AND seq >= ?)")
+            params += [city, generation]
+        sql = f"({' OR '.join(clauses)})" if clauses else "FALSE"
+        if self._until is not None:
+            sql += " AND seq <= ?"
+            params.append(self._until)
+        return sql, params
+
+    # -- storage interface
+
+    def is_current(self, city, csv_path):
+        # Already ingested from this exact CSV by the same code
+        try:
+            stat = os.stat(csv_path)
+        except OSError:
+            return False
+        source = self.fetch("SELECT mtime_ns, size FROM sources WHERE city = ?", (city,)).dropna()
+        return (len(source) == 1 and int(source['mtime_ns'].iloc[0]) == stat.st_mtime_ns
+                and int(source['size'].iloc[0]) == stat.st_size)
+
+    def snapshot(self):
+        # Shares the connections; only the rows visible to it are pinned
+        with self._write_lock:
+            frozen = copy.copy(self)
+            frozen._generations = dict(self._generations)
+            frozen._dtypes = dict(self._dtypes)
+            frozen._until = self._seq - 1
+        frozen.read_only = True
+        return frozen
+
+    @property
+    def cities(self):
+        return list(self._generations)
+
+    def present_columns(self):
+        return set(self._dtypes) | {'time', 'City'}
+
+    def add(self, city, df, source=None):
+        mtime_ns, size = (None, None) if source is None else source
+        with self._write_lock:
+            self._ensure_columns(df)
+            seq = self._next_seq()
+            self.execute("BEGIN")
+            try:
+                if city in self._generations:
+                    # Drop the generation before the one being replaced; that one may still be read
+                    self.execute("DELETE FROM readings WHERE city = ? AND seq < ?", (city, self._generations[city]))
+                self.execute("DELETE FROM sources WHERE city = ?", (city,))
+                self.insert_frame(self.connection(), self._table(city, df, seq))
+                self.execute("INSERT INTO sources VALUES (?, ?, ?, ?, ?)",
+                             (city, mtime_ns, size, STORAGE_FORMAT_VERSION, seq))
+                self.execute("COMMIT")
+            except Exception:
+                self.execute("ROLLBACK")
+                raise
+            self._generations[city] = seq
+
+    def append(self, city, rows):
+        with self._write_lock:
+            self._ensure_columns(rows)
+            self.insert_frame(self.connection(), self._table(city, rows, self._next_seq()))
+
+    def frame(self, city, columns=None):
+        return self.query(city, columns=columns)
+
+    def query(self, city, start=None, end=None, columns=None):
+        names = [col for col in (self._dtypes if columns is None else columns) if col in self._dtypes]
+        where, params = self._where(city, start, end)
+        sql = (f"SELECT time{''.join(', ' + self.quote(col) for col in names)} FROM readings "
+               f"WHERE {where} ORDER BY time, rowid")
+        return self._frame(city, self.fetch(sql, params))
+
+    def tail(self, city, rows, columns=None):
+        names = [col for col in (self._dtypes if columns is None else columns) if col in self._dtypes]
+        where, params = self._where(city)
+        sql = (f"SELECT time{''.join(', ' + self.quote(col) for col in names)} FROM readings "
+               f"WHERE {where} ORDER BY time DESC, rowid DESC LIMIT {int(rows)}")
+        return self._frame(city, self.fetch(sql, params).iloc[::-1].reset_index(drop=True))
+
+    def rows(self, city, start=None, end=None):
+        where, params = self._where(city, start, end)
+        return int(self.fetch(f"SELECT COUNT(*) AS n FROM readings WHERE {where}", params)['n'].iloc[0])
+
+    def last_time(self, city):
+        where, params = self._where(city)
+        last = self.fetch(f"SELECT MAX(time) AS t FROM readings WHERE {where}", params)['t'].iloc[0]
+        return pd.Timestamp.min if pd.isna(last) else pd.Timestamp(int(last))
+
+    def buckets(self, city, width_ns, start=None, end=None, columns=None, offset_ns=0):
+        """sum/count/min/max per pollutant for buckets of `width_ns`, indexed by bucket start."""
+        columns = [col for col in (columns or self.columns) if col in self._dtypes]
+        where, params = self._where(city, start, end)
+        bucket = f"(time - ((time + {offset_ns}) % {width_ns}))"
+        stats = ', '.join(f"{fn}({self.quote(col)}) AS {self.quote(stat + '|' + col)}"
+                          for col in columns for stat, fn in (('sum', 'SUM'), ('count', 'COUNT'), ('min', 'MIN'), ('max', 'MAX')))
+        sql = (f"SELECT {bucket} AS bucket{', ' + stats if stats else ''} FROM readings "
+               f"WHERE {where} GROUP BY bucket ORDER BY bucket")
+        result = self.fetch(sql, params)
+        index = pd.DatetimeIndex(result['bucket'].to_numpy(dtype=np.int64).astype('datetime64[ns]'), name='period')
+        cells = result.drop(columns='bucket').astype(np.float64)
+        cells.columns = pd.MultiIndex.from_tuples([tuple(name.split('|', 1)) for name in cells.columns])
+        cells.index = index
+        # Every pollutant in every stat, like the in-memory cube
+        return cells.reindex(columns=pd.MultiIndex.from_product([('sum', 'count', 'min', 'max'), self.columns]))
+
+    def _month_buckets(self, city, start=None, end=None):
+        # Months have no fixed width: roll the daily buckets up
+        daily = self.buckets(city, DAY_NS, start, end)
+        grouped = daily.groupby(pd.DatetimeIndex(bucket_starts(daily.index, '1M'), name='period'))
+        return pd.concat({'sum': grouped.sum(min_count=1)['sum'], 'count': grouped.sum()['count'],
+                          'min': grouped.min()['min'], 'max': grouped.max()['max']}, axis=1)
+
+    @staticmethod
+    def _stat(cells, stat, columns):
+        if stat == 'mean':
+            result = cells['sum'] / cells['count'].where(cells['count'] > 0)
+        else:
+            result = cells[stat]
+        return result if columns is None else result[columns]
+
+    def daily(self, city, stat='mean', columns=None, start=None, end=None):
+        # Days starting in [start, end), as when slicing the in-memory cube
+        start = None if start is None else pd.Timestamp(start).ceil('D')
+        end = None if end is None else pd.Timestamp(end).ceil('D')
+        return self._stat(self.buckets(city, DAY_NS, start, end), stat, columns)
+
+    def monthly(self, city, stat='mean', columns=None):
+        return self._stat(self._month_buckets(city), stat, columns)
+
+    def city_means(self, cities, columns=None):
+        columns = columns or self.columns
+        stored = [col for col in columns if col in self._dtypes]
+        means = ', '.join(f"AVG({self.quote(col)}) AS {self.quote(col)}" for col in stored)
+        where, params = self.visible()
+        result = self.fetch(f"SELECT city{', ' + means if means else ''} FROM readings WHERE {where} GROUP BY city", params)
+        return result.set_index('city').reindex(index=cities, columns=columns).astype(np.float64).rename_axis('City')
+
+    def month_starts(self, city):
+        return self._month_buckets(city).index
+
+    def level(self, city, level, start=None, end=None):
+        # A pyramid level computed on demand: whole buckets overlapping [start, end)
+        if start is not None:
+            start = pd.Timestamp(bucket_starts([pd.Timestamp(start)], level)[0])
+        if end is not None:
+            floor = pd.Timestamp(bucket_starts([pd.Timestamp(end)], level)[0])
+            if floor < pd.Timestamp(end):
+                end = floor + (pd.offsets.MonthBegin(1) if level == '1M' else pd.Timedelta(PYRAMID_WIDTHS[level]))
+        if level == '1M':
+            cells = self._month_buckets(city, start, end)
+        else:
+            width = PYRAMID_WIDTHS[level]
+            # Weeks start on Monday; the epoch was a Thursday
+            cells = self.buckets(city, width, start, end, offset_ns=3 * DAY_NS if level == '1W' else 0)
+        mean = cells['sum'] / cells['count'].where(cells['count'] > 0)
+        frame = pd.concat({'mean': mean, 'min': cells['min'], 'max': cells['max'], 'count': cells['count']}, axis=1)
+        frame = frame.astype({col: np.int32 if col[0] == 'count' else np.float32 for col in frame.columns})
+        return frame.rename_axis('time')
+
+    def resolution(self, city, start, end, n_out):
+        # Bucket counts are estimated from the span of the data in range
+        if self.rows(city, start, end) <= n_out:
+            return 'raw'
+        where, params = self._where(city, start, end)
+        span = self.fetch(f"SELECT MIN(time) AS lo, MAX(time) AS hi FROM readings WHERE {where}", params)
+        duration = int(span['hi'].iloc[0]) - int(span['lo'].iloc[0])
+        for level, width in PYRAMID_LEVELS:
+            if duration // width.value + 1 <= n_out:
+                return level
+        return PYRAMID_LEVELS[-1][0]
+
+
+class SQLiteStorage(SQLStorage):
+    """SQLite from the standard library; several processes can read one file."""
+
+    name = 'sqlite'
+    extension = 'sqlite'
+
+    def connect(self):
+        import sqlite3
+
+        if self.read_only:
+            con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, isolation_level=None)
+        else:
+            con = sqlite3.connect(self.path, isolation_level=None)
+            # Readers don't block the writer (and vice versa)
+            con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def sql_type(self, dtype):
+        return 'REAL' if dtype.kind == 'f' else 'INTEGER'
+
+    def insert_frame(self, con, table):
+        names = ', '.join(self.quote(col) for col in table.columns)
+        marks = ', '.join('?' for _ in table.columns)
+        # tolist() gives Python scalars; NaN is stored as NULL
+        rows = zip(*[table[col].tolist() for col in table.columns])
+        con.executemany(f"INSERT INTO readings ({names}) VALUES ({marks})", rows)
+
+    def fetch(self, sql, params=()):
+        return pd.read_sql_query(sql, self.connection(), params=list(params))
+
+
+class DuckDBStorage(SQLStorage):
+    """DuckDB (optional): columnar and vectorized, so aggregates over long histories are fast."""
+
+    name = 'duckdb'
+    extension = 'duckdb'
+
+    def connect(self):
+        import duckdb
+
+        with self._connect_lock:
+            if getattr(self, '_db', None) is None:
+                self._db = duckdb.connect(self.path, read_only=self.read_only)
+        # Cursors are the per-thread handles onto one database connection
+        return self._db.cursor()
+
+    def sql_type(self, dtype):
+        if dtype.kind == 'f':
+            return 'FLOAT' if dtype.itemsize == 4 else 'DOUBLE'
+        return {1: 'TINYINT', 2: 'SMALLINT', 4: 'INTEGER'}.get(dtype.itemsize, 'BIGINT')
+
+    def insert_frame(self, con, table):
+        names = ', '.join(self.quote(col) for col in table.columns)
+        # The frame is scanned in place; NaN arrives as NULL
+        con.register('incoming', table)
+        try:
+            con.execute(f"INSERT INTO readings ({names}) SELECT {names} FROM incoming")
+        finally:
+            con.unregister('incoming')
+
+    def fetch(self, sql, params=()):
+        return self.connection().execute(sql, list(params)).df()
+
+    def close(self):
+        super().close()
+        if getattr(self, '_db', None) is not None:
+            self._db.close()
+            self._db = None
+
+
+BACKENDS = {'pandas': PandasStorage, 'sqlite': SQLiteStorage, 'duckdb': DuckDBStorage}
+
+
+def open_storage(columns, data_dir, backend=STORAGE_BACKEND, path=STORAGE_PATH, read_only=False):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    storage_class = BACKENDS[backend]
+    if not storage_class.extension:
+        if read_only:
+            raise ValueError("The in-memory backend cannot be opened read-only")
+        return storage_class(columns)
+    if backend == 'duckdb':
+        try:
+            import duckdb  # noqa: F401
+        except ImportError:
+            raise ImportError("AQ_STORAGE=duckdb needs the duckdb package (pip install duckdb)")
+    path = path or os.path.join(data_dir, f".readings.{storage_class.extension}")
+    return storage_class(columns, path, read_only)
+
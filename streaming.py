@@ -0,0 +1,115 @@
+import glob
+import io
+import os
+import threading
+
+import pandas as pd
+
+
+STREAM_INTERVAL_S = float(os.environ.get('AQ_STREAM_INTERVAL_S', '0'))
+SPOOL_DIR = os.environ.get('AQ_SPOOL_DIR')
+
+
+class CsvTailer:
+    """Returns rows appended to a CSV since the last call, reading only the new bytes."""
+
+    def __init__(self, path, from_end=True):
+        self.path = path
+        self.header = None
+        self.offset = 0
+        if from_end and os.path.exists(path):
+            # The store already holds everything that is in the file now
+            self.header = self._read_header()
+            self.offset = os.path.getsize(path)
+
+    def _read_header(self):
+        with open(self.path, 'rb') as f:
+            return f.readline()
+
+    def read_new_rows(self):
+        if not os.path.exists(self.path):
+            return None
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            # Truncated or replaced; pick up from its current end like on startup
+            print(f"{self.path} shrank from {self.offset} to {size} bytes; skipping to the end")
+            self.offset = size
+            return None
+        if size == self.offset:
+            return None
+
+        with open(self.path, 'rb') as f:
+            if self.header is None:
+                self.header = f.readline()
+                self.offset = f.tell()
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+
+        # Leave a half-written last line for the next poll
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return None
+        self.offset += end
+        return pd.read_csv(io.BytesIO(self.header + chunk[:end]))
+
+
+class StreamingIngestor:
+    """Polls the city CSVs (and an optional spool directory) and appends new readings to the store."""
+
+    def __init__(self, store, data_dir, spool_dir=SPOOL_DIR):
+        self.store = store
+        self.spool_dir = spool_dir
+        self.tailers = {
+            city: CsvTailer(os.path.join(data_dir, f"{city}.csv"))
+            for city in store.cities
+        }
+        self.rows_ingested = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _spooled_files(self):
+        if not self.spool_dir:
+            return []
+        # <City>.csv or <City>__<anything>.csv, oldest first
+        paths = glob.glob(os.path.join(self.spool_dir, '*.csv'))
+        return sorted(paths, key=os.path.getmtime)
+
+    def _ingest_spool_file(self, path):
+        city = os.path.splitext(os.path.basename(path))[0].split('__')[0]
+        rows = pd.read_csv(path)
+        added = self.store.append(city, rows)
+        done_dir = os.path.join(self.spool_dir, 'processed')
+        os.makedirs(done_dir, exist_ok=True)
+        os.replace(path, os.path.join(done_dir, os.path.basename(path)))
+        return added
+
+    def poll(self):
+        added = 0
+        with self._lock:
+            for city, tailer in self.tailers.items():
+                try:
+                    rows = tailer.read_new_rows()
+                    if rows is not None and not rows.empty:
+                        added += self.store.append(city, rows)
+                except Exception as e:
+                    print(f"Error reading new rows for {city}: {e}")
+            for path in self._spooled_files():
+                try:
+                    added += self._ingest_spool_file(path)
+                except Exception as e:
+                    print(f"Error ingesting spooled file {path}: {e}")
+            self.rows_ingested += added
+        return added
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.poll()
+
+    def start(self, interval=STREAM_INTERVAL_S):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True, name='aq-stream')
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,62 @@
+from decimal import ROUND_FLOOR, Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aqi import AQI_CATEGORIES, AQI_INDEX_BREAKPOINTS, AQI_TABLES, add_aqi_columns, sub_index
+
+# Unit conversions as exact decimal divisors, matching each table's `scale`
+DIVISORS = {
+    'pm2_5 (μg/m³)': '1',
+    'pm10 (μg/m³)': '1',
+    'carbon_monoxide (μg/m³)': '1145',
+    'nitrogen_dioxide (μg/m³)': '1.88',
+    'sulphur_dioxide (μg/m³)': '2.62',
+}
+
+
+def reference_sub_index(value, table, divisor):
+    # One reading at a time, truncating its decimal value as EPA does
+    if np.isnan(value):
+        return np.nan
+    reading = Decimal(np.format_float_positional(np.float32(value)))
+    c = (reading / Decimal(divisor)).quantize(Decimal(1).scaleb(-table['decimals']), rounding=ROUND_FLOOR)
+    c = max(float(c), 0.0)
+    for (c_lo, c_hi), (i_lo, i_hi) in zip(table['breakpoints'], AQI_INDEX_BREAKPOINTS):
+        if c <= c_hi:
+            break
+    c = min(c, c_hi)
+    return float(np.round((i_hi - i_lo) / (c_hi - c_lo) * (c - c_lo) + i_lo))
+
+
+@pytest.mark.parametrize('name', list(AQI_TABLES))
+def test_sub_index_matches_scalar_reference(name):
+    table, divisor = AQI_TABLES[name], DIVISORS[name]
+    assert table['scale'] == 1 / float(divisor)
+    # Sensor readings have one decimal and are stored as float32
+    values = (np.arange(0, 30000) / 10).astype(np.float32)
+    values = np.concatenate([values, np.array([np.nan, -1.0], dtype=np.float32)])
+    expected = np.array([reference_sub_index(v, table, divisor) for v in values])
+    np.testing.assert_array_equal(sub_index(values, table), expected)
+
+
+def test_float32_readings_are_not_truncated_down():
+    table = AQI_TABLES['pm2_5 (μg/m³)']
+    # 12.2 is 12.19999981 as float32; 9.1 opens the Moderate band
+    assert sub_index(np.array([9.1], dtype=np.float32), table)[0] == 51
+    assert sub_index(np.array([12.2], dtype=np.float32), table)[0] == sub_index(np.array([12.2]), table)[0]
+
+
+def test_reading_columns():
+    df = pd.DataFrame({
+        'pm2_5 (μg/m³)': np.array([5.0, 40.0, np.nan, np.nan], dtype=np.float32),
+        'pm10 (μg/m³)': np.array([300.0, 10.0, 60.0, np.nan], dtype=np.float32),
+    })
+    add_aqi_columns(df)
+    np.testing.assert_array_equal(df['aqi'], [173, 112, 53, np.nan])
+    assert list(df['aqi_pollutant']) == [1, 0, 1, -1]
+    assert df['aqi_category'].dtype == np.int8
+    assert list(df['aqi_category']) == [3, 2, 1, -1]
+    assert [AQI_CATEGORIES[code][1] for code in df['aqi_category'][:3]] == [
+        'Unhealthy', 'Unhealthy for Sensitive Groups', 'Moderate']
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from data_store import (MEASUREMENT_DTYPE, POLLUTANTS, DataStore, date_range_bounds, legacy_frame, month_bounds,
+                        prepare_city_frame, week_bounds)
+from storage import PandasStorage
+
+CITIES = ['Kandy', 'Galle']
+
+
+def raw_readings(periods=24 * 40, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2024-09-01', periods=periods, freq='h')
+    df = pd.DataFrame({'time': times.strftime('%Y-%m-%dT%H:%M')})
+    for i, col in enumerate(POLLUTANTS):
+        df[col] = np.round(rng.gamma(1.5, 10 * (i + 1), periods), 1)
+    # Out of order, as CSVs sometimes are
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def write_csvs(data_dir, cities=CITIES, periods=24 * 40):
+    for seed, city in enumerate(cities):
+        raw_readings(periods, seed).to_csv(data_dir / f"{city}.csv", index=False)
+
+
+def load(data_dir, cities=CITIES):
+    return DataStore(cities=cities, data_dir=str(data_dir), workers=1, pool='thread',
+                     storage=PandasStorage(POLLUTANTS))
+
+
+def test_prepared_frame_is_compact():
+    df = prepare_city_frame('Kandy', raw_readings())
+    assert all(df[col].dtype == MEASUREMENT_DTYPE for col in POLLUTANTS)
+    assert df['time'].dtype == 'datetime64[ns]' and df['time'].is_monotonic_increasing
+    assert isinstance(df['City'].dtype, pd.CategoricalDtype)
+    assert list(df['City'].cat.categories) == ['Kandy']
+    # Days, months and daily UV means are kept in the aggregates, not per row
+    assert not {'date', 'month', 'daily_mean_uv', 'city'} & set(df.columns)
+
+
+def test_legacy_frame_restores_the_old_layout():
+    df = prepare_city_frame('Kandy', raw_readings())
+    legacy = legacy_frame(df)
+    assert all(legacy[col].dtype == np.float64 for col in POLLUTANTS)
+    assert legacy['City'].dtype == object
+    assert {'date', 'month', 'daily_mean_uv'} <= set(legacy.columns)
+    assert not {'aqi', 'aqi_pollutant', 'aqi_category'} & set(legacy.columns)
+    np.testing.assert_allclose(legacy['pm10 (μg/m³)'], df['pm10 (μg/m³)'])
+
+
+def test_memory_report_totals(tmp_path):
+    write_csvs(tmp_path)
+    report = load(tmp_path).memory_report()
+    assert list(report['city']) == CITIES + ['total']
+    per_city, total = report.iloc[:-1], report.iloc[-1]
+    assert total['rows'] == per_city['rows'].sum() == 2 * 24 * 40
+    assert total['compact_bytes'] == per_city['compact_bytes'].sum()
+    assert (report['compact_bytes'] < report['legacy_bytes']).all()
+
+
+def test_period_bounds():
+    assert month_bounds('2024-12') == (pd.Timestamp('2024-12-01'), pd.Timestamp('2025-01-01'))
+    # 2024-09-04 is a Wednesday; the week runs Monday to Sunday
+    assert week_bounds('2024-09-04 15:30') == (pd.Timestamp('2024-09-02'), pd.Timestamp('2024-09-09'))
+    assert week_bounds('2024-09-02') == week_bounds('2024-09-08 23:59')
+    assert date_range_bounds('2024-09-03', '2024-09-03') == (pd.Timestamp('2024-09-03'), pd.Timestamp('2024-09-04'))
+
+
+def test_queries_slice_half_open_ranges(tmp_path):
+    write_csvs(tmp_path)
+    store = load(tmp_path)
+    df = store.city('Kandy')
+    for start, end in [week_bounds('2024-09-04'), month_bounds('2024-09'),
+                       date_range_bounds('2024-09-10', '2024-09-12'), month_bounds('2025-01')]:
+        expected = df[(df['time'] >= start) & (df['time'] < end)].reset_index(drop=True)
+        got = store.query('Kandy', start, end)
+        pd.testing.assert_frame_equal(got.reset_index(drop=True), expected)
+        daily = store.query_daily('Kandy', start, end)
+        assert len(daily) == expected['time'].dt.normalize().nunique()
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from downsample import downsample_series, lttb, minmax
+
+
+def noisy_series(n=10000, spike_at=6543):
+    rng = np.random.default_rng(0)
+    x = np.arange(n, dtype=np.int64) * 3600 * 10**9
+    y = 20 + rng.normal(0, 1, n)
+    y[spike_at] = 500
+    return x, y
+
+
+@pytest.mark.parametrize('method', [lttb, minmax])
+@pytest.mark.parametrize('n_out', [10, 101, 2400])
+def test_budget_and_endpoints(method, n_out):
+    x, y = noisy_series()
+    kept = method(x, y, n_out)
+    assert len(kept) <= n_out
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert np.all(np.diff(kept) > 0)
+
+
+@pytest.mark.parametrize('method', [lttb, minmax])
+def test_single_sample_spike_is_kept(method):
+    x, y = noisy_series(spike_at=6543)
+    assert 6543 in method(x, y, 200)
+
+
+@pytest.mark.parametrize('method', [lttb, minmax])
+def test_short_series_is_returned_whole(method):
+    x, y = noisy_series(n=50, spike_at=10)
+    assert list(method(x, y, 100)) == list(range(50))
+
+
+def test_downsample_series_drops_missing_readings():
+    times = pd.Series(pd.date_range('2024-01-01', periods=5000, freq='h'))
+    values = pd.Series(np.sin(np.arange(5000) / 50.0))
+    values[::7] = np.nan
+    out_times, out_values = downsample_series(times, values, n_out=300)
+    assert len(out_values) <= 300
+    assert out_values.notna().all()
+    assert out_times.iloc[0] == times.iloc[1] and out_times.iloc[-1] == times.iloc[-1]
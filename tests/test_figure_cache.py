@@ -0,0 +1,80 @@
+import pytest
+
+import figure_cache
+from figure_cache import FigureCache, response_size
+
+
+def response(n):
+    # A response whose serialized size grows with n
+    return {'data': [{'y': list(range(n))}]}
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    size = response_size(response(100))
+    cache = FigureCache(3 * size)
+    for key in 'abc':
+        cache.put(key, response(100), 0)
+    assert cache.get('a', 0)[0]
+    cache.put('d', response(100), 0)
+    assert cache.bytes == 3 * size and cache.evictions == 1
+    assert not cache.get('b', 0)[0]
+    assert all(cache.get(key, 0)[0] for key in 'acd')
+
+
+def test_response_larger_than_the_budget_is_not_kept():
+    cache = FigureCache(response_size(response(10)))
+    cache.put('small', response(10), 0)
+    cache.put('large', response(1000), 0)
+    assert cache.get('small', 0)[0] and not cache.get('large', 0)[0]
+    assert cache.evictions == 0
+
+
+def test_disabled_cache_does_not_serialize(monkeypatch):
+    def fail(value):
+        raise AssertionError('serialized with caching off')
+    monkeypatch.setattr(figure_cache, 'response_size', fail)
+    cache = FigureCache(0)
+    cache.put('a', response(10), 0)
+    assert cache.stats()['entries'] == 0
+
+
+def test_station_stamps_only_invalidate_that_station():
+    stamps = {None: 1, 'Kandy': 1, 'Galle': 1}
+    cache = FigureCache(10**6, stamp_fn=lambda city=None: stamps[city])
+    calls = []
+
+    @cache.memoize(city=0)
+    def by_city(city, month):
+        calls.append(city)
+        return response(len(calls))
+
+    @cache.memoize()
+    def overall(metric):
+        calls.append(metric)
+        return response(len(calls))
+
+    for args in [('Kandy', '2024-09'), ('Galle', '2024-09')]:
+        by_city(*args)
+    overall('pm10')
+    # New readings in Kandy move its stamp and the dataset's, not Galle's
+    stamps['Kandy'] = stamps[None] = 2
+    by_city('Kandy', '2024-09')
+    by_city('Galle', '2024-09')
+    overall('pm10')
+    assert calls == ['Kandy', 'Galle', 'pm10', 'Kandy', 'pm10']
+    assert cache.hits == 1
+
+
+@pytest.mark.parametrize('versioned', [False, True])
+def test_version_trigger_is_not_part_of_the_key(versioned):
+    cache = FigureCache(10**6)
+    calls = []
+
+    @cache.memoize(versioned=versioned)
+    def render(metric, data_version=None):
+        calls.append(data_version)
+        return response(1)
+
+    render('pm10', 1)
+    render('pm10', 2)
+    assert len(calls) == (1 if versioned else 2)
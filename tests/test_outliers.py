@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import outliers
+from data_store import POLLUTANTS, DataStore
+from outliers import OUTLIER_METHODS, OUTLIER_PARAMS, OutlierDetector, detect_city, rolling_zscore, score_series
+from snapshot_cache import feather
+from storage import PandasStorage
+
+WINDOW = OUTLIER_PARAMS['window']
+
+
+def daily_cycle(n=24 * 120, seed=0):
+    # Hourly readings swinging between about 10 and 90 over the day
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2024-09-01', periods=n, freq='h').to_numpy()
+    hours = np.arange(n) % 24
+    values = 50 + 40 * np.cos(2 * np.pi * hours / 24) + rng.normal(0, 1, n)
+    return times, values
+
+
+def flagged_by(bits, method):
+    return set(np.flatnonzero(bits & OUTLIER_METHODS[method][0]))
+
+
+def test_rolling_zscore_matches_pandas():
+    rng = np.random.default_rng(1)
+    values = rng.normal(20, 3, 2000)
+    values[rng.random(2000) < 0.05] = np.nan
+    values[700:760] = 20
+    window, min_periods = 48, 12
+    previous = pd.Series(values).shift(1).rolling(window, min_periods=min_periods)
+    mean, std = previous.mean().to_numpy(), previous.std(ddof=0).to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = np.where(std > 1e-9, np.abs(values - mean) / std, np.nan)
+    scores = rolling_zscore(values, window, min_periods)
+    defined = ~np.isnan(expected)
+    np.testing.assert_array_equal(np.isnan(scores[defined]), False)
+    np.testing.assert_allclose(scores[defined], expected[defined], rtol=1e-6)
+    # Windows within the constant stretch have no spread, so the readings
+    # after them are not scored, however the chunks fall
+    assert np.isnan(scores[760])
+    # Chunking only bounds the temporaries
+    for chunk_rows in [97, 700, 745]:
+        np.testing.assert_allclose(rolling_zscore(values, window, min_periods, chunk_rows), scores, rtol=1e-6)
+
+
+def test_robust_bands_flag_spikes():
+    rng = np.random.default_rng(2)
+    times = pd.date_range('2024-09-01', periods=3000, freq='h').to_numpy()
+    values = rng.normal(50, 5, 3000)
+    values[[400, 2500]] = 200
+    bits, _, fit = score_series(values, times)
+    median = np.median(values)
+    mad = 1.4826 * np.median(np.abs(values - median))
+    q1, q3 = np.percentile(values, [25, 75])
+    assert flagged_by(bits, 'mad') == set(np.flatnonzero(np.abs(values - median) / mad > OUTLIER_PARAMS['mad']))
+    beyond = np.maximum(q1 - values, values - q3) / (q3 - q1)
+    assert flagged_by(bits, 'iqr') == set(np.flatnonzero(beyond > OUTLIER_PARAMS['iqr']))
+    assert {400, 2500} <= flagged_by(bits, 'mad') & flagged_by(bits, 'iqr') & flagged_by(bits, 'zscore')
+    assert fit['median'] == pytest.approx(median) and fit['mad'] == pytest.approx(mad)
+
+
+def test_seasonal_residual_flags_readings_unusual_for_their_hour():
+    times, values = daily_cycle()
+    # Ordinary for the afternoon peak, far off for noon, when readings sit near 10
+    row = 24 * 60 + 12
+    values[row] = 88
+    bits, _, _ = score_series(values, times)
+    assert row in flagged_by(bits, 'seasonal')
+    assert row not in flagged_by(bits, 'mad') | flagged_by(bits, 'iqr') | flagged_by(bits, 'zscore')
+
+
+def test_extend_matches_scoring_the_whole_series_against_the_history():
+    times, values = daily_cycle()
+    values[-50] = 400
+    added = 200
+    history = detect_city(times[:-added], {'pm': values[:-added]})
+    tail = pd.DataFrame({'time': times[-added - WINDOW:], 'pm': values[-added - WINDOW:]})
+    extended, fits = OutlierDetector(['pm'], workers=1).extend(history, tail, added)
+
+    expected, _ = detect_city(times, {'pm': values}, fits=history[1])
+    pd.testing.assert_frame_equal(extended, expected)
+    np.testing.assert_equal(fits, history[1])
+    # A full rescore fits the statistics again, but flags the same spike
+    rescored, _ = detect_city(times, {'pm': values})
+    spike = times[-50]
+    assert spike in set(extended['time']) and spike in set(rescored['time'])
+
+
+def station_frames(n=3):
+    frames = {}
+    for seed in range(n):
+        times, values = daily_cycle(seed=seed)
+        values[100 * (seed + 1)] = 300
+        frames[f"City{seed}"] = pd.DataFrame({'time': times, 'pm': values.astype(np.float32)})
+    return frames
+
+
+def assert_same_results(a, b):
+    assert list(a) == list(b)
+    for city in a:
+        pd.testing.assert_frame_equal(a[city][0], b[city][0])
+        np.testing.assert_equal(a[city][1], b[city][1])
+
+
+def test_pools_agree():
+    frames = station_frames()
+    serial = OutlierDetector(['pm'], workers=1).detect(frames)
+    assert_same_results(OutlierDetector(['pm'], workers=2, pool='process').detect(frames), serial)
+    assert_same_results(OutlierDetector(['pm'], workers=2, pool='process').detect(frames, pool='thread'), serial)
+
+
+@pytest.mark.skipif(feather is None, reason="the outlier cache needs pyarrow")
+def test_cached_results_are_reused_until_the_data_changes(tmp_path, monkeypatch):
+    frames = station_frames()
+    detector = OutlierDetector(['pm'], cache_dir=str(tmp_path), workers=2, pool='thread')
+    first = detector.detect(frames)
+
+    scored = []
+    score = outliers.detect_city
+    monkeypatch.setattr(outliers, 'detect_city', lambda times, *args: scored.append(times[0]) or score(times, *args))
+    assert_same_results(detector.detect(frames), first)
+    assert scored == []
+
+    frames['City1'] = frames['City1'].assign(pm=frames['City1']['pm'] + 1)
+    detector.detect(frames)
+    assert len(scored) == 1
+
+
+def test_requests_score_on_threads(tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    times = pd.date_range('2024-09-01', periods=24 * 30, freq='h')
+    for city in ['Kandy', 'Galle']:
+        df = pd.DataFrame({'time': times.strftime('%Y-%m-%dT%H:%M')})
+        for col in POLLUTANTS:
+            df[col] = np.round(rng.gamma(2, 10, len(times)), 1)
+        df.to_csv(tmp_path / f"{city}.csv", index=False)
+    store = DataStore(cities=['Kandy', 'Galle'], data_dir=str(tmp_path), workers=1, pool='thread',
+                      storage=PandasStorage(POLLUTANTS))
+
+    def no_processes(*args, **kwargs):
+        raise AssertionError('process pool started while serving')
+    monkeypatch.setattr(outliers, 'ProcessPoolExecutor', no_processes)
+    # Scored while loading, so the first request only reads the results
+    monkeypatch.setattr(store.outlier_detector, 'detect', no_processes)
+    precomputed = store.outliers()
+    monkeypatch.undo()
+    monkeypatch.setattr(outliers, 'ProcessPoolExecutor', no_processes)
+    # A snapshot without results, as the benchmarks take, scores them on threads
+    rescored = store.fresh_snapshot().outliers()
+    pd.testing.assert_frame_equal(rescored, precomputed)
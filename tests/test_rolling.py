@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rolling import ROLLING_WINDOWS, RollingEngine, batch_rolling, rolling_column
+
+
+def readings(n=2000, seed=0):
+    # Hourly readings with missing values, a gap longer than every window and some irregular times
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2024-01-01', periods=n, freq='h').to_numpy(copy=True)
+    times[1200:] += np.timedelta64(3, 'D')
+    times[700:760] += (rng.integers(0, 50, 60) * 60 * 10**9).astype('timedelta64[ns]')
+    times = np.sort(times)
+    df = pd.DataFrame({'time': times})
+    for spec in ROLLING_WINDOWS:
+        values = rng.gamma(2.0, spec['threshold'] / 2.5, n).astype(np.float32)
+        values[rng.random(n) < 0.05] = np.nan
+        values[300:340] = np.nan
+        df[spec['column']] = values
+    return df
+
+
+def assert_matches(streamed, expected):
+    for spec in ROLLING_WINDOWS:
+        for stat in ('mean', 'max'):
+            col = rolling_column(spec, stat)
+            # Both are stored as float32; the running sum and pandas accumulate differently
+            np.testing.assert_allclose(streamed[col], expected[col], rtol=1e-5, equal_nan=True, err_msg=col)
+        col = rolling_column(spec, 'exceedances')
+        np.testing.assert_array_equal(streamed[col], expected[col], err_msg=col)
+
+
+@pytest.mark.parametrize('batch_rows', [1, 37, 500])
+def test_streaming_matches_batch(batch_rows):
+    df = readings()
+    expected = batch_rolling(df)
+    engine = RollingEngine()
+    head = 900
+    loaded = engine.load('city', df.iloc[:head])
+    parts = {col: [values] for col, values in loaded.items()}
+    for start in range(head, len(df), batch_rows):
+        for col, values in engine.push_frame('city', df.iloc[start:start + batch_rows]).items():
+            parts[col].append(values)
+    streamed = {col: np.concatenate(values) for col, values in parts.items()}
+    assert_matches(streamed, expected)
+
+
+def test_attach_seeds_streaming_from_loaded_columns():
+    df = readings(seed=1)
+    expected = batch_rolling(df)
+    head = 1500
+    engine = RollingEngine()
+    attached = engine.attach('city', df.iloc[:head].assign(**batch_rolling(df.iloc[:head])))
+    pushed = engine.push_frame('city', df.iloc[head:])
+    streamed = {col: np.concatenate([attached[col].to_numpy(), pushed[col]]) for col in expected}
+    assert_matches(streamed, expected)
@@ -0,0 +1,174 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_store import POLLUTANTS, DataStore, prepare_city_frame
+from shared_data import attach_frames, publish_frames, published_sources, republish, unlink_frames
+from storage import PandasStorage
+
+CITIES = ['Kandy', 'Colombo', 'Galle']
+START = pd.Timestamp('2024-09-01')
+
+
+def raw_readings(start, periods, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'time': pd.date_range(start, periods=periods, freq='h').strftime('%Y-%m-%dT%H:%M')})
+    for i, col in enumerate(POLLUTANTS):
+        df[col] = np.round(rng.gamma(1.5, 10 * (i + 1), periods), 1)
+    return df
+
+
+def write_csv(data_dir, city, seed, periods=24 * 40):
+    raw_readings(START, periods, seed).to_csv(data_dir / f"{city}.csv", index=False)
+
+
+def load(data_dir):
+    for seed, city in enumerate(CITIES):
+        write_csv(data_dir, city, seed)
+    return DataStore(cities=CITIES, data_dir=str(data_dir), workers=1, pool='thread',
+                     storage=PandasStorage(POLLUTANTS))
+
+
+def next_rows(store, city, periods=30, seed=99):
+    return raw_readings(store.last_time(city) + pd.Timedelta(hours=1), periods, seed)
+
+
+def reload_and_wait(store):
+    assert store.reload()
+    store._reloading.join()
+
+
+def test_pinned_snapshot_is_unchanged_by_appends_and_reloads(tmp_path):
+    store = load(tmp_path)
+    pinned = store.pin()
+    frames = {city: pinned.query(city) for city in CITIES}
+    daily = {city: pinned.query_daily(city) for city in CITIES}
+
+    store.append('Kandy', next_rows(store, 'Kandy'))
+    # A different number of rows, so the CSV's size changes too
+    write_csv(tmp_path, 'Galle', seed=7, periods=24 * 41)
+    reload_and_wait(store)
+
+    assert store.snapshot() is pinned
+    for city in CITIES:
+        pd.testing.assert_frame_equal(pinned.query(city), frames[city])
+        pd.testing.assert_frame_equal(pinned.query_daily(city), daily[city])
+    store.unpin()
+    latest = store.snapshot()
+    assert latest.version > pinned.version
+    assert len(latest.query('Kandy')) == len(frames['Kandy']) + 30
+    assert len(latest.query('Galle')) == 24 * 41
+    pd.testing.assert_frame_equal(latest.query('Colombo'), frames['Colombo'])
+
+
+def test_results_carry_over_only_for_unchanged_stations(tmp_path, monkeypatch):
+    store = load(tmp_path)
+    first = store.latest()
+    weekly = {city: first.weekly_uv(city) for city in CITIES}
+    flagged = first.outliers()
+
+    scored, extended = [], []
+    detect, extend = store.outlier_detector.detect, store.outlier_detector.extend
+    monkeypatch.setattr(store.outlier_detector, 'detect',
+                        lambda frames, pool=None: scored.extend(frames) or detect(frames, pool))
+    monkeypatch.setattr(store.outlier_detector, 'extend',
+                        lambda result, tail, rows: extended.append(rows) or extend(result, tail, rows))
+
+    store.append('Kandy', next_rows(store, 'Kandy'))
+    second = store.latest()
+    assert second.stamp('Kandy') == second.version > first.stamp('Kandy')
+    assert [second.stamp(city) for city in ['Colombo', 'Galle']] == [first.stamp(city) for city in ['Colombo', 'Galle']]
+    assert second.weekly_uv('Kandy') is not weekly['Kandy']
+    assert all(second.weekly_uv(city) is weekly[city] for city in ['Colombo', 'Galle'])
+    # Only the appended rows are scored, against Kandy's stored statistics
+    outliers = second.outliers()
+    assert scored == [] and extended == [30]
+    for city in ['Colombo', 'Galle']:
+        pd.testing.assert_frame_equal(outliers[outliers['City'] == city].reset_index(drop=True),
+                                      flagged[flagged['City'] == city].reset_index(drop=True))
+
+    write_csv(tmp_path, 'Galle', seed=7, periods=24 * 41)
+    reload_and_wait(store)
+    third = store.latest()
+    assert scored == ['Galle']
+    assert third.weekly_uv('Galle') is not weekly['Galle']
+    assert third.weekly_uv('Colombo') is weekly['Colombo']
+    assert third.stamp('Colombo') == first.stamp('Colombo')
+
+
+def chunks(periods, sizes, seed=0):
+    df = prepare_city_frame('Kandy', raw_readings(START, periods + sum(sizes), seed))
+    bounds = np.cumsum([0, periods] + list(sizes))
+    return df, [df.iloc[lo:hi].reset_index(drop=True) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def test_lazily_joined_chunks_match_an_eager_concat():
+    whole, (base, *appended) = chunks(24 * 20, [5, 1, 48, 7])
+    storage = PandasStorage(POLLUTANTS)
+    storage.add('Kandy', base)
+    storage.append('Kandy', appended[0])
+    storage.append('Kandy', appended[1])
+    early = storage.snapshot()
+    for rows in appended[2:]:
+        storage.append('Kandy', rows)
+    late = storage.snapshot()
+
+    # Snapshots share the chunks, but only see those appended before them
+    pd.testing.assert_frame_equal(early.frame('Kandy'), whole.iloc[:len(base) + 6])
+    pd.testing.assert_frame_equal(late.frame('Kandy'), whole)
+    assert late.last_time('Kandy') == whole['time'].iloc[-1]
+    pd.testing.assert_frame_equal(late.tail('Kandy', 60), whole.iloc[-60:].reset_index(drop=True))
+    start, end = whole['time'].iloc[len(base) - 3], whole['time'].iloc[len(base) + 10]
+    pd.testing.assert_frame_equal(late.query('Kandy', start, end), whole.iloc[len(base) - 3:len(base) + 10])
+    assert late.rows('Kandy', start, end) == 13
+    # The early join was handed back to the store; the late one started from
+    # the older base, so it is not
+    joined, pending = storage._parts('Kandy')
+    assert len(joined) == len(base) + 6 and len(pending) == 2
+    # A later reader starts from the handed-back join, and hands back its own
+    pd.testing.assert_frame_equal(storage.snapshot().frame('Kandy'), whole)
+    joined, pending = storage._parts('Kandy')
+    pd.testing.assert_frame_equal(joined, whole)
+    assert pending == []
+
+
+def test_tail_does_not_join_chunks():
+    whole, (base, *appended) = chunks(24 * 5, [4, 4])
+    storage = PandasStorage(POLLUTANTS)
+    storage.add('Kandy', base)
+    for rows in appended:
+        storage.append('Kandy', rows)
+    pd.testing.assert_frame_equal(storage.tail('Kandy', 6), whole.iloc[-6:].reset_index(drop=True))
+    assert len(storage._parts('Kandy')[1]) == 2
+
+
+@pytest.fixture
+def segment_names():
+    names = []
+    yield names
+    for name in names:
+        unlink_frames(name)
+
+
+def test_republish_replaces_only_the_changed_stations(tmp_path, segment_names):
+    frames = {city: prepare_city_frame(city, raw_readings(START, 48, seed)) for seed, city in enumerate(CITIES)}
+    old, new = f"aq-test-{os.getpid()}", f"aq-test-{os.getpid()}-1"
+    segment_names.extend([old, new])
+    publish_frames(old, frames, {city: (seed, 100 + seed) for seed, city in enumerate(CITIES)})
+
+    galle = prepare_city_frame('Galle', raw_readings(START, 60, 7))
+    republish(old, new, {'Galle': galle}, {'Galle': (9, 900)})
+    attached = attach_frames(new)
+    assert list(attached) == CITIES
+    columns = [col for col in galle.columns if col != 'City']
+    for city in ['Kandy', 'Colombo']:
+        pd.testing.assert_frame_equal(attached[city][columns], frames[city][columns])
+    pd.testing.assert_frame_equal(attached['Galle'][columns], galle[columns])
+    assert published_sources(new) == {'Kandy': (0, 100), 'Colombo': (1, 101), 'Galle': (9, 900)}
+
+    # Workers attaching to the new segment know which CSVs they are current with
+    store = DataStore.from_frames(attached, data_dir=str(tmp_path), read_only=True, sources=published_sources(new))
+    assert store.storage.source('Galle') == (9, 900)
+    assert store.read_only
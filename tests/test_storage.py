@@ -0,0 +1,121 @@
+"""Database backends must answer every query the way the in-memory one does.
+
+Tolerated differences: aggregates are summed in a different order (and
+SQLite returns floats as float64), so floating-point results are compared
+with rtol=1e-6; dtypes, index types and categorical categories are not
+compared. Everything else, row order included, must match exactly.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from alerts import ALERT_RULES
+from data_store import POLLUTANTS, DataStore
+from pyramid import PYRAMID_LEVELS
+from storage import open_storage
+
+CITIES = ['Kandy', 'Colombo', 'Galle']
+RTOL = 1e-6
+START = pd.Timestamp('2024-09-01')
+
+
+def write_csv(data_dir, city, seed, periods=24 * 75, start=START):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'time': pd.date_range(start, periods=periods, freq='h').strftime('%Y-%m-%dT%H:%M')})
+    for i, col in enumerate(POLLUTANTS):
+        # Long tails, so every alert rule is broken now and then
+        values = np.round(rng.gamma(1.5, 15 * (i + 1), periods), 1)
+        values[rng.random(periods) < 0.03] = np.nan
+        df[col] = values
+    df.to_csv(data_dir / f"{city}.csv", index=False)
+    return df
+
+
+def load(data_dir, backend):
+    storage = open_storage(POLLUTANTS, str(data_dir), backend, str(data_dir / f"readings.{backend}"))
+    return DataStore(cities=CITIES, data_dir=str(data_dir), workers=1, pool='thread', storage=storage)
+
+
+def make_stores(data_dir, backend):
+    # The same CSVs loaded in memory and into `backend`
+    if backend == 'duckdb':
+        pytest.importorskip('duckdb')
+    for seed, city in enumerate(CITIES):
+        write_csv(data_dir, city, seed)
+    return load(data_dir, 'pandas'), load(data_dir, backend)
+
+
+@pytest.fixture(scope='module', params=['sqlite', 'duckdb'])
+def stores(request, tmp_path_factory):
+    return make_stores(tmp_path_factory.mktemp(request.param), request.param)
+
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def fresh_stores(request, tmp_path):
+    # For tests that write
+    return make_stores(tmp_path, request.param)
+
+
+def assert_same(expected, actual):
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_index_type=False,
+                                  check_column_type=False, check_categorical=False, check_freq=False, rtol=RTOL)
+
+
+RANGES = [(None, None), (pd.Timestamp('2024-09-03 05:00'), pd.Timestamp('2024-10-20')),
+          (pd.Timestamp('2024-10-01'), pd.Timestamp('2024-10-01 12:00')), (pd.Timestamp('2030-01-01'), None)]
+
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_ranges(stores, start, end):
+    memory, database = stores
+    for city in CITIES:
+        rows = memory.query(city, start, end)
+        assert_same(rows.reset_index(drop=True), database.query(city, start, end)[rows.columns])
+        assert memory.resolution(city, start, end) == database.resolution(city, start, end)
+
+
+@pytest.mark.parametrize('stat', ['mean', 'max', 'sum', 'count'])
+def test_daily_and_monthly(stores, stat):
+    memory, database = stores
+    start, end = RANGES[1]
+    for city in CITIES:
+        assert_same(memory.query_daily(city, stat=stat), database.query_daily(city, stat=stat))
+        assert_same(memory.query_daily(city, start, end, stat), database.query_daily(city, start, end, stat))
+        assert_same(memory.monthly(city, stat), database.monthly(city, stat))
+    assert_same(memory.city_means(), database.city_means())
+    assert memory.months() == database.months()
+
+
+# The readings are hourly, so there is no 1h level: it would be no coarser than the data
+@pytest.mark.parametrize('level', [name for name, width in PYRAMID_LEVELS if width > pd.Timedelta(hours=1)])
+def test_pyramid_levels(stores, level):
+    memory, database = stores
+    for start, end in RANGES[:3]:
+        assert_same(memory.query_level('Colombo', level, start, end), database.query_level('Colombo', level, start, end))
+
+
+def assert_same_alerts(memory, database):
+    every = [rule['column'] for rule in ALERT_RULES]
+    for columns in (every, ['pm2_5 (μg/m³)'], ['pm10 (μg/m³)', 'nitrogen_dioxide (μg/m³)'], []):
+        a, b = memory.alerts(), database.alerts()
+        assert_same(a.exceedance_counts(columns), b.exceedance_counts(columns))
+        assert_same(a.normal_summary(columns), b.normal_summary(columns))
+        assert_same(a.alerting_rows(columns), b.alerting_rows(columns))
+    assert len(memory.alerts().alerting_rows(every)) > 0
+
+
+def test_alerts(stores):
+    assert_same_alerts(*stores)
+
+
+def test_alerts_and_ranges_after_append(fresh_stores, tmp_path):
+    memory, database = fresh_stores
+    last = memory.last_time('Colombo')
+    (tmp_path / 'new').mkdir()
+    new = write_csv(tmp_path / 'new', 'Colombo', 7, periods=48, start=last + pd.Timedelta(hours=1))
+    assert memory.append('Colombo', new) == database.append('Colombo', new) == 48
+    start = last - pd.Timedelta(days=1)
+    rows = memory.query('Colombo', start)
+    assert_same(rows.reset_index(drop=True), database.query('Colombo', start)[rows.columns])
+    assert_same(memory.query_daily('Colombo', start), database.query_daily('Colombo', start))
+    assert_same_alerts(memory, database)
@@ -0,0 +1,58 @@
+# AQ_LAZY_LOAD=1 python wsgi.py
+#
+# Accepts connections before the dashboard is imported. Importing Dash,
+# pandas and plotly takes well over a second, most of the start-up with
+# AQ_LAZY_LOAD=1, so the server binds first and the dashboard is imported in
+# the background. Until then every request, /ready included, gets a 503 with
+# Retry-After; after that requests go straight to the Dash app.
+#
+# Under gunicorn the master binds before any worker imports the app, and
+# requests wait in the listen queue rather than being turned away, so
+# gunicorn.conf.py serves airquality_dashboard:server directly.
+import json
+import os
+import threading
+import traceback
+
+_server = None
+_error = None
+
+
+def _load():
+    global _server, _error
+    try:
+        from airquality_dashboard import server
+        _server = server
+    except Exception:
+        _error = traceback.format_exc()
+        print(f"Could not import the dashboard:\n{_error}")
+
+
+def _load_in_background():
+    threading.Thread(target=_load, name='dashboard-import', daemon=True).start()
+
+
+def application(environ, start_response):
+    if _server is not None:
+        return _server(environ, start_response)
+    if _error is None:
+        status, body = '503 Service Unavailable', {'ready': False, 'starting': True}
+    else:
+        status, body = '500 Internal Server Error', {'ready': False, 'error': _error.splitlines()[-1]}
+    payload = json.dumps(body).encode()
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(payload))),
+                            ('Retry-After', '1')])
+    return [payload]
+
+
+if __name__ == '__main__':
+    # Imported before the dashboard, which needs it too: a package imported
+    # from two threads at once can fail half-way
+    from werkzeug.serving import run_simple
+
+    _load_in_background()
+    host, port = os.environ.get('AQ_BIND', '127.0.0.1:8865').rsplit(':', 1)
+    # Callbacks only read immutable snapshots, so requests can be served concurrently
+    run_simple(host, int(port), application, threaded=True)
+else:
+    _load_in_background()